@@ -44,6 +44,26 @@ class ConfigurationManager(object):
         Max upload size
     valid_upload_extension : str
         The extensions that are valid to upload, comma separated
+    mountpoint_placement : {'free_space', 'round_robin'}
+        How the new files are distributed when there are several active
+        mountpoints for the same type of data
+    memoize_jobs : bool
+        Whether the jobs reuse the outputs of a previous job with the same
+        command, parameters and input contents instead of running
+    max_running_jobs : int or None
+        The maximum number of jobs that can be submitted to the cluster at
+        the same time, None if there is no limit
+    use_private_workers : bool
+        Whether the private jobs are run by the qiita-private-worker pool
+        instead of through the plugin launcher
+    job_submission_workers : int
+        The number of processes submitting the jobs in each Qiita process
+    job_submission_queue_size : int
+        The maximum number of jobs waiting to be submitted or being submitted
+        by each Qiita process
+    job_submission_plugin_limits : dict of {str: int}
+        The maximum number of concurrent submissions of the jobs of each
+        plugin, keyed by plugin name
     user : str
         The postgres user
     password : str
@@ -221,6 +241,83 @@ class ConfigurationManager(object):
             self.key_file = join(install_dir, 'qiita_core', 'support_files',
                                  'server.key')
 
+        try:
+            self.mountpoint_placement = config.get(
+                'main', 'MOUNTPOINT_PLACEMENT')
+        except NoOptionError:
+            self.mountpoint_placement = None
+        if not self.mountpoint_placement:
+            self.mountpoint_placement = 'free_space'
+        elif self.mountpoint_placement not in ('free_space', 'round_robin'):
+            raise ValueError("The MOUNTPOINT_PLACEMENT (%s) option should be "
+                             "'free_space' or 'round_robin'"
+                             % self.mountpoint_placement)
+
+        try:
+            memoize_jobs = config.get('main', 'MEMOIZE_JOBS')
+        except NoOptionError:
+            memoize_jobs = None
+        self.memoize_jobs = (config.getboolean('main', 'MEMOIZE_JOBS')
+                             if memoize_jobs else False)
+
+        try:
+            max_running_jobs = config.get('main', 'MAX_RUNNING_JOBS')
+        except NoOptionError:
+            max_running_jobs = None
+        self.max_running_jobs = (config.getint('main', 'MAX_RUNNING_JOBS')
+                                 if max_running_jobs else None)
+        if self.max_running_jobs is not None and self.max_running_jobs < 1:
+            raise ValueError("The MAX_RUNNING_JOBS option should be a "
+                             "positive integer")
+
+        try:
+            use_private_workers = config.get('main', 'USE_PRIVATE_WORKERS')
+        except NoOptionError:
+            use_private_workers = None
+        self.use_private_workers = (
+            config.getboolean('main', 'USE_PRIVATE_WORKERS')
+            if use_private_workers else False)
+
+        try:
+            workers = config.get('main', 'JOB_SUBMISSION_WORKERS')
+        except NoOptionError:
+            workers = None
+        self.job_submission_workers = (
+            config.getint('main', 'JOB_SUBMISSION_WORKERS') if workers else 4)
+        if self.job_submission_workers < 1:
+            raise ValueError("The JOB_SUBMISSION_WORKERS option should be a "
+                             "positive integer")
+
+        try:
+            queue_size = config.get('main', 'JOB_SUBMISSION_QUEUE_SIZE')
+        except NoOptionError:
+            queue_size = None
+        self.job_submission_queue_size = (
+            config.getint('main', 'JOB_SUBMISSION_QUEUE_SIZE')
+            if queue_size else 1000)
+        if self.job_submission_queue_size < 1:
+            raise ValueError("The JOB_SUBMISSION_QUEUE_SIZE option should be "
+                             "a positive integer")
+
+        try:
+            plugin_limits = config.get('main', 'JOB_SUBMISSION_PLUGIN_LIMITS')
+        except NoOptionError:
+            plugin_limits = None
+        self.job_submission_plugin_limits = {}
+        for limit in (plugin_limits or '').split(','):
+            if not limit.strip():
+                continue
+            plugin, _, value = limit.rpartition(':')
+            try:
+                value = int(value)
+            except ValueError:
+                value = 0
+            if not plugin.strip() or value < 1:
+                raise ValueError("The JOB_SUBMISSION_PLUGIN_LIMITS option "
+                                 "should be a list of plugin:limit, with a "
+                                 "positive integer limit (%s)" % limit)
+            self.job_submission_plugin_limits[plugin.strip()] = value
+
     def _get_postgres(self, config):
         """Get the configuration of the postgres section"""
         self.user = config.get('postgres', 'USER')
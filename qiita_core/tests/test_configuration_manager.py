@@ -60,6 +60,14 @@ class ConfigurationManagerTests(TestCase):
         self.assertEqual(obs.certificate_file, "/tmp/server.cert")
         self.assertEqual(obs.cookie_secret, "SECRET")
         self.assertEqual(obs.key_file, "/tmp/server.key")
+        self.assertEqual(obs.mountpoint_placement, "round_robin")
+        self.assertTrue(obs.memoize_jobs)
+        self.assertEqual(obs.max_running_jobs, 50)
+        self.assertTrue(obs.use_private_workers)
+        self.assertEqual(obs.job_submission_workers, 2)
+        self.assertEqual(obs.job_submission_queue_size, 100)
+        self.assertEqual(obs.job_submission_plugin_limits,
+                         {'QIIME': 2, 'Qiita': 1})
 
         # Postgres section
         self.assertEqual(obs.user, "postgres")
@@ -122,6 +130,13 @@ class ConfigurationManagerTests(TestCase):
         conf_setter('CERTIFICATE_FILE', '')
         conf_setter('KEY_FILE', '')
         conf_setter('QIITA_ENV', '')
+        conf_setter('MOUNTPOINT_PLACEMENT', '')
+        conf_setter('MEMOIZE_JOBS', '')
+        conf_setter('MAX_RUNNING_JOBS', '')
+        conf_setter('USE_PRIVATE_WORKERS', '')
+        conf_setter('JOB_SUBMISSION_WORKERS', '')
+        conf_setter('JOB_SUBMISSION_QUEUE_SIZE', '')
+        conf_setter('JOB_SUBMISSION_PLUGIN_LIMITS', '')
 
         # Warning raised if No files will be allowed to be uploaded
         # Warning raised if no cookie_secret
@@ -145,6 +160,18 @@ class ConfigurationManagerTests(TestCase):
         # Default key_file
         self.assertTrue(
             obs.key_file.endswith("/qiita_core/support_files/server.key"))
+        # Default mountpoint_placement
+        self.assertEqual(obs.mountpoint_placement, 'free_space')
+        # Default memoize_jobs
+        self.assertFalse(obs.memoize_jobs)
+        # Default max_running_jobs
+        self.assertIsNone(obs.max_running_jobs)
+        # Default use_private_workers
+        self.assertFalse(obs.use_private_workers)
+        # Default job submission options
+        self.assertEqual(obs.job_submission_workers, 4)
+        self.assertEqual(obs.job_submission_queue_size, 1000)
+        self.assertEqual(obs.job_submission_plugin_limits, {})
 
         # BASE_DATA_DIR does not exist
         conf_setter('BASE_DATA_DIR', '/surprised/if/this/dir/exists')
@@ -163,8 +190,41 @@ class ConfigurationManagerTests(TestCase):
         with self.assertRaises(ValueError):
             obs._get_main(self.conf)
 
-        # No files can be uploaded
+        # Unknown mountpoint placement
         conf_setter('PLUGIN_DIR', '/tmp')
+        conf_setter('MOUNTPOINT_PLACEMENT', 'random')
+        with self.assertRaises(ValueError):
+            obs._get_main(self.conf)
+
+        # Non positive maximum number of running jobs
+        conf_setter('MOUNTPOINT_PLACEMENT', '')
+        conf_setter('MAX_RUNNING_JOBS', '0')
+        with self.assertRaises(ValueError):
+            obs._get_main(self.conf)
+
+        # Non positive number of job submission workers
+        conf_setter('MAX_RUNNING_JOBS', '')
+        conf_setter('JOB_SUBMISSION_WORKERS', '0')
+        with self.assertRaises(ValueError):
+            obs._get_main(self.conf)
+
+        # Non positive job submission queue size
+        conf_setter('JOB_SUBMISSION_WORKERS', '')
+        conf_setter('JOB_SUBMISSION_QUEUE_SIZE', '-1')
+        with self.assertRaises(ValueError):
+            obs._get_main(self.conf)
+
+        # Wrong job submission plugin limits
+        conf_setter('JOB_SUBMISSION_QUEUE_SIZE', '')
+        conf_setter('JOB_SUBMISSION_PLUGIN_LIMITS', 'QIIME')
+        with self.assertRaises(ValueError):
+            obs._get_main(self.conf)
+        conf_setter('JOB_SUBMISSION_PLUGIN_LIMITS', 'QIIME:0')
+        with self.assertRaises(ValueError):
+            obs._get_main(self.conf)
+
+        # No files can be uploaded
+        conf_setter('JOB_SUBMISSION_PLUGIN_LIMITS', '')
         conf_setter('VALID_UPLOAD_EXTENSION', '')
         with self.assertRaises(ValueError):
             obs._get_main(self.conf)
@@ -245,6 +305,40 @@ PLUGIN_DIR = /tmp/
 CERTIFICATE_FILE = /tmp/server.cert
 KEY_FILE = /tmp/server.key
 
+# How new files are distributed when several mountpoints of the same type are
+# active: free_space (chosen at random, weighted by their free space) or
+# round_robin. Default: free_space
+MOUNTPOINT_PLACEMENT = round_robin
+
+# Whether a job reuses the outputs of a previous successful job with the same
+# command, parameters and input contents instead of running. Default: False
+MEMOIZE_JOBS = True
+
+# Maximum number of jobs submitted to the cluster at the same time. Jobs over
+# this limit wait in the job scheduler. Validators, HTML summaries and private
+# jobs are not limited. Default: no limit
+MAX_RUNNING_JOBS = 50
+
+# Whether the private jobs are sent through redis to the workers started with
+# qiita-private-worker, which avoids starting a new python interpreter for each
+# of them. The release_validators jobs are always submitted through the
+# launcher. Default: False
+USE_PRIVATE_WORKERS = True
+
+# Number of processes submitting the jobs to the cluster in each Qiita
+# process. Default: 4
+JOB_SUBMISSION_WORKERS = 2
+
+# Maximum number of jobs waiting to be submitted or being submitted by each
+# Qiita process. Once reached, the jobs wait in the job scheduler.
+# Default: 1000
+JOB_SUBMISSION_QUEUE_SIZE = 100
+
+# Maximum number of concurrent submissions of the jobs of a plugin, as a comma
+# separated list of plugin name:limit (e.g. QIIME:2, Qiita:1). The plugins not
+# listed can use all the submission processes. Default: no limits
+JOB_SUBMISSION_PLUGIN_LIMITS = QIIME:2, Qiita:1
+
 # The value used to secure cookies used for user sessions. A suitable value can
 # be generated with:
 #
@@ -7,24 +7,30 @@
 # -----------------------------------------------------------------------------
 
 from __future__ import division
-from future.utils import viewitems
+from future.utils import viewitems, viewvalues
 from itertools import chain
 from datetime import datetime
 from os import remove, makedirs
 from os.path import isfile, exists, relpath
 from shutil import rmtree
 from functools import partial
-from collections import namedtuple
+from collections import namedtuple, defaultdict
+from json import dumps, loads
 
 import networkx as nx
 
 import qiita_db as qdb
 
-from qiita_core.qiita_settings import qiita_config
+from qiita_core.qiita_settings import qiita_config, r_client
 
 
 TypeNode = namedtuple('TypeNode', ['id', 'job_id', 'name', 'type'])
 
+# Seconds that the lineage of a study/analysis is kept in redis. The entries
+# are removed every time the lineage changes, this only bounds for how long
+# an entry could outlive an out-of-band modification of the database
+LINEAGE_CACHE_TTL = 86400
+
 
 class Artifact(qdb.base.QiitaObject):
     r"""Any kind of file (or group of files) stored in the system and its
@@ -92,6 +98,164 @@ class Artifact(qdb.base.QiitaObject):
         """
         return cls.iter_by_visibility('public')
 
+    # The SQL expressions used to retrieve each of the get_info fields. The
+    # filepaths are retrieved with a separate query
+    _INFO_FIELDS = {
+        'name': 'a.name',
+        'timestamp': 'a.generated_timestamp',
+        'artifact_type': 'at.artifact_type',
+        'data_type': 'dt.data_type',
+        'visibility': 'v.visibility',
+        'study_id': 'sa.study_id',
+        'analysis_id': 'aa.analysis_id',
+        'command_id': 'a.command_id',
+        'command_name': 'sc.name',
+        'command_parameters': 'a.command_parameters',
+        'parent_ids': """(SELECT array_agg(pa.parent_id ORDER BY pa.parent_id)
+                          FROM qiita.parent_artifact pa
+                          WHERE pa.artifact_id = a.artifact_id)""",
+        'prep_template_ids': """(
+            SELECT array_agg(pt.prep_template_id
+                             ORDER BY pt.prep_template_id)
+            FROM qiita.prep_template pt
+            WHERE pt.artifact_id IN (
+                SELECT * FROM qiita.find_artifact_roots(a.artifact_id)))"""}
+
+    @classmethod
+    def get_info(cls, artifact_ids, fields=None):
+        """Returns the information of several artifacts at once
+
+        Parameters
+        ----------
+        artifact_ids : iterable of int
+            The ids of the artifacts
+        fields : list of str, optional
+            The information to retrieve. Any of 'name', 'timestamp',
+            'artifact_type', 'data_type', 'visibility', 'study_id',
+            'analysis_id', 'command_id', 'command_name', 'command_parameters',
+            'parent_ids', 'prep_template_ids' and 'filepaths'. Default: all
+
+        Returns
+        -------
+        dict of {int: dict of {str: object}}
+            The requested information keyed by artifact id. 'parent_ids' and
+            'prep_template_ids' are lists of ids and 'filepaths' is a list of
+            (filepath_id, path, filepath_type), as in Artifact.filepaths
+
+        Raises
+        ------
+        ValueError
+            If any of the fields is not known
+        qiita_db.exceptions.QiitaDBUnknownIDError
+            If any of the artifacts doesn't exist
+
+        Notes
+        -----
+        The information is retrieved with at most two queries, regardless of
+        the number of artifacts
+        """
+        if fields is None:
+            fields = sorted(cls._INFO_FIELDS) + ['filepaths']
+        unknown = set(fields) - set(cls._INFO_FIELDS) - {'filepaths'}
+        if unknown:
+            raise ValueError(
+                "Unknown artifact fields: %s" % ', '.join(sorted(unknown)))
+        artifact_ids = tuple(set(artifact_ids))
+        if not artifact_ids:
+            return {}
+        columns = [f for f in fields if f != 'filepaths']
+
+        with qdb.sql_connection.TRN:
+            sql = """SELECT {0}
+                     FROM qiita.artifact a
+                        JOIN qiita.artifact_type at
+                            ON (at.artifact_type_id = a.artifact_type_id)
+                        JOIN qiita.data_type dt
+                            ON (dt.data_type_id = a.data_type_id)
+                        JOIN qiita.visibility v
+                            ON (v.visibility_id = a.visibility_id)
+                        LEFT JOIN qiita.study_artifact sa
+                            ON (sa.artifact_id = a.artifact_id)
+                        LEFT JOIN qiita.analysis_artifact aa
+                            ON (aa.artifact_id = a.artifact_id)
+                        LEFT JOIN qiita.software_command sc
+                            ON (sc.command_id = a.command_id)
+                     WHERE a.artifact_id IN %s""".format(', '.join(
+                ['a.artifact_id'] + [cls._INFO_FIELDS[c] for c in columns]))
+            qdb.sql_connection.TRN.add(sql, [artifact_ids])
+            info = {}
+            for row in qdb.sql_connection.TRN.execute_fetchindex():
+                values = dict(zip(columns, row[1:]))
+                for c in ('parent_ids', 'prep_template_ids'):
+                    if c in values and values[c] is None:
+                        values[c] = []
+                info[row[0]] = values
+
+            missing = set(artifact_ids) - set(info)
+            if missing:
+                raise qdb.exceptions.QiitaDBUnknownIDError(
+                    ', '.join(map(str, sorted(missing))), cls._table)
+
+            if 'filepaths' in fields:
+                for values in viewvalues(info):
+                    values['filepaths'] = []
+                sql = """SELECT artifact_id, filepath_id, filepath,
+                                filepath_type, mountpoint, subdirectory
+                         FROM qiita.filepath
+                            JOIN qiita.filepath_type USING (filepath_type_id)
+                            JOIN qiita.data_directory
+                                USING (data_directory_id)
+                            JOIN qiita.artifact_filepath USING (filepath_id)
+                         WHERE artifact_id IN %s
+                         ORDER BY artifact_id, filepath_id"""
+                qdb.sql_connection.TRN.add(sql, [artifact_ids])
+                db_dir = qdb.util.get_db_files_base_dir()
+                for a_id, fp_id, fp, fp_type, mp, subdir in \
+                        qdb.sql_connection.TRN.execute_fetchindex():
+                    info[a_id]['filepaths'].append(
+                        (fp_id, qdb.util._path_builder(
+                            db_dir, fp, mp, subdir, a_id), fp_type))
+
+        return info
+
+    @classmethod
+    def get_study_artifact_ids(cls, study_ids, artifact_type=None):
+        """Returns the ids of the artifacts of several studies at once
+
+        Parameters
+        ----------
+        study_ids : iterable of int
+            The ids of the studies
+        artifact_type : str, optional
+            If given, retrieve only artifacts of the given type
+
+        Returns
+        -------
+        dict of {int: list of int}
+            The sorted artifact ids keyed by study id. Studies without
+            artifacts are keyed to an empty list
+        """
+        study_ids = tuple(set(study_ids))
+        result = {sid: [] for sid in study_ids}
+        if not study_ids:
+            return result
+        with qdb.sql_connection.TRN:
+            sql_args = [study_ids]
+            sql_where = ""
+            if artifact_type:
+                sql_where = " AND artifact_type = %s"
+                sql_args.append(artifact_type)
+            sql = """SELECT study_id, artifact_id
+                     FROM qiita.study_artifact
+                        JOIN qiita.artifact USING (artifact_id)
+                        JOIN qiita.artifact_type USING (artifact_type_id)
+                     WHERE study_id IN %s{0}
+                     ORDER BY study_id, artifact_id""".format(sql_where)
+            qdb.sql_connection.TRN.add(sql, sql_args)
+            for sid, aid in qdb.sql_connection.TRN.execute_fetchindex():
+                result[sid].append(aid)
+        return result
+
     @staticmethod
     def types():
         """Returns list of all artifact types available and their descriptions
@@ -227,10 +391,22 @@ class Artifact(qdb.base.QiitaObject):
             sql_args = [prep_template.study_id, a_id]
             qdb.sql_connection.TRN.add(sql, sql_args)
 
-            # Associate the artifact with its filepaths
-            filepaths = [(fp, f_type) for _, fp, f_type in artifact.filepaths]
+            # Associate the artifact with its filepaths. The files are exact
+            # copies, so the checksums of the original files are reused
+            # instead of reading the files again
+            original = artifact.filepaths
+            filepaths = [(fp, f_type) for _, fp, f_type in original]
+            checksums = {}
+            if original:
+                sql = """SELECT filepath_id, checksum
+                         FROM qiita.filepath
+                         WHERE filepath_id IN %s"""
+                qdb.sql_connection.TRN.add(
+                    sql, [tuple(fp_id for fp_id, _, _ in original)])
+                checksums = dict(qdb.sql_connection.TRN.execute_fetchindex())
             fp_ids = qdb.util.insert_filepaths(
-                filepaths, a_id, atype, copy=True)
+                filepaths, a_id, atype, copy=True,
+                checksums=[checksums[fp_id] for fp_id, _, _ in original])
             sql = """INSERT INTO qiita.artifact_filepath
                         (artifact_id, filepath_id)
                      VALUES (%s, %s)"""
@@ -238,12 +414,16 @@ class Artifact(qdb.base.QiitaObject):
             qdb.sql_connection.TRN.add(sql, sql_args, many=True)
             qdb.sql_connection.TRN.execute()
 
+            qdb.util.update_study_listing_summary([prep_template.study_id])
+            instance._invalidate_lineage()
+
         return instance
 
     @classmethod
     def create(cls, filepaths, artifact_type, name=None, prep_template=None,
                parents=None, processing_parameters=None, move_files=True,
-               analysis=None, data_type=None):
+               analysis=None, data_type=None, copy_files=False,
+               checksums=None):
         r"""Creates a new artifact in the system
 
         The parameters depend on how the artifact was generated:
@@ -290,6 +470,12 @@ class Artifact(qdb.base.QiitaObject):
             The data_type of the artifact in the `analysis`. It is required if
             `analysis` is provided. It should not be provided if `analysis` is
             not provided.
+        copy_files : bool, optional
+            If True the files are copied into the DB directory instead of
+            moved. Default: False
+        checksums : list of str, optional
+            The already known checksums of `filepaths`, in the same order. If
+            not provided, the checksums are computed
 
         Returns
         -------
@@ -373,6 +559,7 @@ class Artifact(qdb.base.QiitaObject):
             sql_args = [study_id, instance.id]
             qdb.sql_connection.TRN.add(sql, sql_args)
             qdb.sql_connection.TRN.execute()
+            qdb.util.update_study_listing_summary([study_id])
 
         def _associate_with_analysis(instance, analysis_id):
             # Associate the artifact with the analysis
@@ -443,6 +630,7 @@ class Artifact(qdb.base.QiitaObject):
                          VALUES (%s, %s)"""
                 sql_args = [(instance.id, p.id) for p in parents]
                 qdb.sql_connection.TRN.add(sql, sql_args, many=True)
+                instance._invalidate_lineage()
 
                 # inheriting visibility
                 visibilities = {a.visibility for a in instance.parents}
@@ -473,7 +661,8 @@ class Artifact(qdb.base.QiitaObject):
             # Associate the artifact with its filepaths
             fp_ids = qdb.util.insert_filepaths(
                 filepaths, instance.id, artifact_type,
-                move_files=move_files, copy=(not move_files))
+                move_files=move_files,
+                copy=(copy_files or not move_files), checksums=checksums)
             sql = """INSERT INTO qiita.artifact_filepath
                         (artifact_id, filepath_id)
                      VALUES (%s, %s)"""
@@ -569,6 +758,7 @@ class Artifact(qdb.base.QiitaObject):
             # We can now remove the artifact
             filepaths = instance.filepaths
             study = instance.study
+            instance._invalidate_lineage()
 
             # Delete any failed/successful job that had the artifact as input
             sql = """SELECT processing_job_id
@@ -621,6 +811,9 @@ class Artifact(qdb.base.QiitaObject):
             sql = "DELETE FROM qiita.artifact WHERE artifact_id = %s"
             qdb.sql_connection.TRN.add(sql, [artifact_id])
 
+            if study is not None:
+                qdb.util.update_study_listing_summary([study.id])
+
     @property
     def name(self):
         """The name of the artifact
@@ -729,20 +922,27 @@ class Artifact(qdb.base.QiitaObject):
         """
         with qdb.sql_connection.TRN:
             # In order to correctly propagate the visibility we need to find
-            # the root of this artifact and then propagate to all the artifacts
-            sql = "SELECT * FROM qiita.find_artifact_roots(%s)"
-            qdb.sql_connection.TRN.add(sql, [self.id])
-            root_id = qdb.sql_connection.TRN.execute_fetchlast()
-            root = qdb.artifact.Artifact(root_id)
-            # these are the ids of all the children from the root
-            ids = [a.id for a in root.descendants.nodes()]
-
-            sql = """UPDATE qiita.artifact
+            # the roots of this artifact and then propagate to all their
+            # descendants. This is done in a single statement so we don't need
+            # to load the lineage of the artifact
+            sql = """WITH roots AS (
+                        SELECT root_id
+                        FROM qiita.find_artifact_roots(%s) AS root_id)
+                     UPDATE qiita.artifact
                      SET visibility_id = %s
-                     WHERE artifact_id IN %s"""
+                     WHERE artifact_id IN (
+                        SELECT root_id FROM roots
+                        UNION
+                        SELECT d.artifact_id
+                        FROM roots,
+                            qiita.artifact_descendants(roots.root_id) d)"""
             vis_id = qdb.util.convert_to_id(value, "visibility")
-            qdb.sql_connection.TRN.add(sql, [vis_id, tuple(ids)])
+            qdb.sql_connection.TRN.add(sql, [self.id, vis_id])
             qdb.sql_connection.TRN.execute()
+            # the study access depends on the visibility of its artifacts. The
+            # lineage and study listing caches don't hold the visibility of
+            # the artifacts so they are still valid
+            qdb.sql_connection.TRN.cache.pop('study_access', None)
 
     @property
     def artifact_type(self):
@@ -1077,6 +1277,156 @@ class Artifact(qdb.base.QiitaObject):
 
         return lineage
 
+    def _lineage_scope(self):
+        """Returns the study or analysis that holds the artifact's lineage
+
+        Returns
+        -------
+        (str, int) or None
+            ('study', study_id) or ('analysis', analysis_id) to which the
+            artifact belongs to, or None if it belongs to neither of them
+        """
+        with qdb.sql_connection.TRN:
+            sql = """SELECT study_id, analysis_id
+                     FROM qiita.artifact
+                        LEFT JOIN qiita.study_artifact USING (artifact_id)
+                        LEFT JOIN qiita.analysis_artifact USING (artifact_id)
+                     WHERE artifact_id = %s"""
+            qdb.sql_connection.TRN.add(sql, [self.id])
+            study_id, analysis_id = \
+                qdb.sql_connection.TRN.execute_fetchindex()[0]
+        if study_id is not None:
+            return ('study', study_id)
+        if analysis_id is not None:
+            return ('analysis', analysis_id)
+        return None
+
+    def _invalidate_lineage(self):
+        """Invalidates the lineage cache of the artifact's study/analysis
+
+        Notes
+        -----
+        The cache entry is removed now and once the transaction commits. Until
+        then, the lineage of the study/analysis is read from the database and
+        not cached, so the cache never holds uncommitted edges.
+        """
+        scope = self._lineage_scope()
+        if scope is None:
+            return
+        key = 'lineage:%s:%d' % scope
+        with qdb.sql_connection.TRN:
+            qdb.sql_connection.TRN.cache.setdefault(
+                'lineage_modified', set()).add(key)
+            r_client.delete(key)
+            qdb.sql_connection.TRN.add_post_commit_func(r_client.delete, key)
+
+    def _lineage_adjacency(self, direction):
+        """Returns the adjacency lists of the artifact's study/analysis
+
+        Parameters
+        ----------
+        direction : {'ancestors', 'descendants'}
+            'descendants' returns the children of each artifact and
+            'ancestors' returns the parents of each artifact
+
+        Returns
+        -------
+        dict of {int: list of int}
+            The adjacency lists, keyed by artifact id
+
+        Notes
+        -----
+        All the (parent, child) edges of a study/analysis are cached in redis
+        as an id list, as the parents of an artifact always belong to the
+        same study/analysis as the artifact.
+        """
+        scope = self._lineage_scope()
+        key = 'lineage:%s:%d' % scope if scope is not None else None
+        with qdb.sql_connection.TRN:
+            cacheable = key is not None and key not in \
+                qdb.sql_connection.TRN.cache.get('lineage_modified', set())
+            edges = r_client.get(key) if cacheable else None
+            if edges is not None:
+                edges = loads(edges)
+            else:
+                if scope is None:
+                    sql = """SELECT parent_id, artifact_id
+                             FROM qiita.artifact_ancestry(%s)
+                             UNION
+                             SELECT parent_id, artifact_id
+                             FROM qiita.artifact_descendants(%s)"""
+                    sql_args = [self.id, self.id]
+                else:
+                    sql = """SELECT parent_id, artifact_id
+                             FROM qiita.parent_artifact
+                                JOIN qiita.{0}_artifact USING (artifact_id)
+                             WHERE {0}_id = %s""".format(scope[0])
+                    sql_args = [scope[1]]
+                qdb.sql_connection.TRN.add(sql, sql_args)
+                edges = [[p, c] for p, c in
+                         qdb.sql_connection.TRN.execute_fetchindex()]
+                if cacheable:
+                    r_client.set(key, dumps(edges), ex=LINEAGE_CACHE_TTL)
+
+        adjacency = defaultdict(list)
+        for parent, child in edges:
+            if direction == 'descendants':
+                adjacency[parent].append(child)
+            else:
+                adjacency[child].append(parent)
+        return adjacency
+
+    def _lineage_edges(self, direction):
+        """Returns the edges of the ancestors or descendants of the artifact
+
+        Parameters
+        ----------
+        direction : {'ancestors', 'descendants'}
+            Which side of the lineage to return
+
+        Returns
+        -------
+        list of (int, int)
+            List of (parent_artifact_id, artifact_id)
+        """
+        adjacency = self._lineage_adjacency(direction)
+        edges = set()
+        visited = {self.id}
+        to_visit = [self.id]
+        while to_visit:
+            current = to_visit.pop()
+            for neighbor in adjacency.get(current, []):
+                edges.add((neighbor, current) if direction == 'ancestors'
+                          else (current, neighbor))
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    to_visit.append(neighbor)
+        return sorted(edges)
+
+    @property
+    def ancestor_ids(self):
+        """Returns the ids of the ancestors of the artifact
+
+        Returns
+        -------
+        set of int
+            The ids of all the ancestors of the artifact, not including the
+            artifact itself
+        """
+        return {p for p, _ in self._lineage_edges('ancestors')}
+
+    @property
+    def descendant_ids(self):
+        """Returns the ids of the descendants of the artifact
+
+        Returns
+        -------
+        set of int
+            The ids of all the descendants of the artifact, not including the
+            artifact itself
+        """
+        return {c for _, c in self._lineage_edges('descendants')}
+
     @property
     def ancestors(self):
         """Returns the ancestors of the artifact
@@ -1086,12 +1436,8 @@ class Artifact(qdb.base.QiitaObject):
         networkx.DiGraph
             The ancestors of the artifact
         """
-        with qdb.sql_connection.TRN:
-            sql = """SELECT parent_id, artifact_id
-                     FROM qiita.artifact_ancestry(%s)"""
-            qdb.sql_connection.TRN.add(sql, [self.id])
-            edges = qdb.sql_connection.TRN.execute_fetchindex()
-        return self._create_lineage_graph_from_edge_list(edges)
+        return self._create_lineage_graph_from_edge_list(
+            self._lineage_edges('ancestors'))
 
     @property
     def descendants(self):
@@ -1102,12 +1448,8 @@ class Artifact(qdb.base.QiitaObject):
         networkx.DiGraph
             The descendants of the artifact
         """
-        with qdb.sql_connection.TRN:
-            sql = """SELECT parent_id, artifact_id
-                     FROM qiita.artifact_descendants(%s)"""
-            qdb.sql_connection.TRN.add(sql, [self.id])
-            edges = qdb.sql_connection.TRN.execute_fetchindex()
-        return self._create_lineage_graph_from_edge_list(edges)
+        return self._create_lineage_graph_from_edge_list(
+            self._lineage_edges('descendants'))
 
     @property
     def descendants_with_jobs(self):
@@ -1117,105 +1459,166 @@ class Artifact(qdb.base.QiitaObject):
         -------
         networkx.DiGraph
             The descendants of the artifact
-        """
-        def _add_edge(edges, src, dest):
-            """Aux function to add the edge (src, dest) to edges"""
-            edge = (src, dest)
-            if edge not in edges:
-                edges.add(edge)
 
+        Notes
+        -----
+        The whole graph is retrieved with a fixed number of queries: the jobs
+        are collected with a single recursive query and their inputs, outputs
+        and command outputs are retrieved in bulk.
+        """
         with qdb.sql_connection.TRN:
-            sql = """SELECT processing_job_id, input_id, output_id
-                     FROM qiita.artifact_descendants_with_jobs(%s)"""
+            # The jobs in the graph are (1) the jobs that generated any of the
+            # descendants, (2) the visible jobs that used any of the
+            # descendants as input and (3) the children of the jobs that have
+            # not finished yet, except for the HTML summary jobs
+            sql = """WITH RECURSIVE artifacts AS (
+                        SELECT %s::bigint AS artifact_id
+                      UNION
+                        SELECT aopj.artifact_id
+                        FROM qiita.artifact_processing_job apj
+                            JOIN qiita.artifact_output_processing_job aopj
+                                USING (processing_job_id)
+                            JOIN artifacts a
+                                ON (a.artifact_id = apj.artifact_id)
+                     ), jobs AS (
+                        SELECT apj.processing_job_id
+                        FROM qiita.artifact_processing_job apj
+                            JOIN qiita.processing_job pj
+                                USING (processing_job_id)
+                        WHERE apj.artifact_id IN (
+                                SELECT artifact_id FROM artifacts)
+                            AND (pj.hidden = false OR EXISTS (
+                                SELECT 1
+                                FROM qiita.artifact_output_processing_job aopj
+                                WHERE aopj.processing_job_id =
+                                    apj.processing_job_id))
+                      UNION
+                        SELECT ppj.child_id
+                        FROM qiita.parent_processing_job ppj
+                            JOIN jobs j
+                                ON (j.processing_job_id = ppj.parent_id)
+                            JOIN qiita.processing_job pj
+                                ON (pj.processing_job_id = ppj.parent_id)
+                            JOIN qiita.processing_job_status pjs
+                                ON (pjs.processing_job_status_id =
+                                    pj.processing_job_status_id)
+                            JOIN qiita.software_command sc
+                                ON (sc.command_id = pj.command_id)
+                        WHERE pjs.processing_job_status NOT IN (
+                                'success', 'error')
+                            AND sc.name != 'Generate HTML summary'
+                     )
+                     SELECT processing_job_id, processing_job_status,
+                            command_id, name, pending
+                     FROM jobs
+                        JOIN qiita.processing_job USING (processing_job_id)
+                        JOIN qiita.processing_job_status
+                            USING (processing_job_status_id)
+                        JOIN qiita.software_command USING (command_id)"""
             qdb.sql_connection.TRN.add(sql, [self.id])
-            sql_edges = qdb.sql_connection.TRN.execute_fetchindex()
+            jobs = qdb.sql_connection.TRN.execute_fetchindex()
 
             lineage = nx.DiGraph()
+            lineage.add_node(('artifact', self))
+            if not jobs:
+                return lineage
+
+            job_ids = tuple(j[0] for j in jobs)
+            inputs = defaultdict(list)
+            sql = """SELECT processing_job_id, artifact_id
+                     FROM qiita.artifact_processing_job
+                     WHERE processing_job_id IN %s"""
+            qdb.sql_connection.TRN.add(sql, [job_ids])
+            for jid, aid in qdb.sql_connection.TRN.execute_fetchindex():
+                inputs[jid].append(aid)
+
+            outputs = defaultdict(list)
+            sql = """SELECT processing_job_id, artifact_id
+                     FROM qiita.artifact_output_processing_job
+                     WHERE processing_job_id IN %s"""
+            qdb.sql_connection.TRN.add(sql, [job_ids])
+            for jid, aid in qdb.sql_connection.TRN.execute_fetchindex():
+                outputs[jid].append(aid)
+
+            cmd_outputs = defaultdict(list)
+            sql = """SELECT command_id, name, artifact_type
+                     FROM qiita.command_output
+                        JOIN qiita.artifact_type USING (artifact_type_id)
+                     WHERE command_id IN %s"""
+            qdb.sql_connection.TRN.add(
+                sql, [tuple({j[2] for j in jobs})])
+            for cmd_id, o_name, o_type in \
+                    qdb.sql_connection.TRN.execute_fetchindex():
+                cmd_outputs[cmd_id].append((o_name, o_type))
+
+            # Nodes are created only once, so each artifact or job is only
+            # instantiated once
+            nodes = {self.id: ('artifact', self)}
+
+            def _artifact_node(a_id):
+                if a_id not in nodes:
+                    nodes[a_id] = ('artifact', Artifact(a_id))
+                return nodes[a_id]
+
+            def _job_node(j_id):
+                if j_id not in nodes:
+                    nodes[j_id] = (
+                        'job', qdb.processing_job.ProcessingJob(j_id))
+                return nodes[j_id]
+
+            # The descendants are the artifacts generated from the artifact
+            descendants = {self.id}
+            grown = True
+            while grown:
+                grown = False
+                for jid, _, _, _, _ in jobs:
+                    if (descendants.intersection(inputs[jid]) and
+                            not descendants.issuperset(outputs[jid])):
+                        descendants.update(outputs[jid])
+                        grown = True
+
             edges = set()
-            nodes = {}
-            if sql_edges:
-                for jid, pid, cid in sql_edges:
-                    if jid not in nodes:
-                        nodes[jid] = ('job',
-                                      qdb.processing_job.ProcessingJob(jid))
-                    if pid not in nodes:
-                        nodes[pid] = ('artifact', qdb.artifact.Artifact(pid))
-                    if cid not in nodes:
-                        nodes[cid] = ('artifact', qdb.artifact.Artifact(cid))
-                    edges.add((nodes[pid], nodes[jid]))
-                    edges.add((nodes[jid], nodes[cid]))
-            else:
-                nodes[self.id] = ('artifact', self)
-                lineage.add_node(nodes[self.id])
-
-            # The code above returns all the jobs that have been successfully
-            # executed. We need to add all the jobs that are in all the other
-            # status. Approach: Loop over all the artifacts and add all the
-            # jobs that have been attached to them.
-            visited = set()
-            queue = nodes.keys()
-            while queue:
-                current = queue.pop(0)
-                if current not in visited:
-                    visited.add(current)
-                    n_type, n_obj = nodes[current]
-                    if n_type == 'artifact':
-                        # Add all the jobs to the queue
-                        for job in n_obj.jobs():
-                            queue.append(job.id)
-                            if job.id not in nodes:
-                                nodes[job.id] = ('job', job)
-
-                    elif n_type == 'job':
-                        # Ignore the generate summary jobs
-                        if n_obj.command.name == 'Generate HTML summary':
-                            continue
-                        jstatus = n_obj.status
-                        # If the job is in success we don't need to do anything
-                        # else since it would've been added by the code above
-                        if jstatus != 'success':
-                            # Connect the job with his input artifacts, the
-                            # input artifacts may or may not exist yet, so we
-                            # need to check both the input_artifacts and the
-                            # pending properties
-                            for in_art in n_obj.input_artifacts:
-                                _add_edge(edges, nodes[in_art.id],
-                                          nodes[n_obj.id])
-
-                            pending = n_obj.pending
-                            for pred_id in pending:
-                                for pname in pending[pred_id]:
-                                    in_node_id = '%s:%s' % (
-                                        pred_id, pending[pred_id][pname])
-                                    _add_edge(edges, nodes[in_node_id],
-                                              nodes[n_obj.id])
-
-                            if jstatus != 'error':
-                                # If the job is not errored, we can add the
-                                # future outputs and the children jobs to
-                                # the graph.
-
-                                # Add all the job outputs as new nodes
-                                for o_name, o_type in n_obj.command.outputs:
-                                    node_id = '%s:%s' % (n_obj.id, o_name)
-                                    node = TypeNode(
-                                        id=node_id, job_id=n_obj.id,
-                                        name=o_name, type=o_type)
-                                    queue.append(node_id)
-                                    if node_id not in nodes:
-                                        nodes[node_id] = ('type', node)
-
-                                # Add all his children jobs to the queue
-                                for cjob in n_obj.children:
-                                    queue.append(cjob.id)
-                                    if cjob.id not in nodes:
-                                        nodes[cjob.id] = ('job', cjob)
-                    elif n_type == 'type':
-                        # Connect this 'future artifact' with the job that will
-                        # generate it
-                        _add_edge(edges, nodes[n_obj.job_id], nodes[current])
-                    else:
-                        raise ValueError('Unrecognized type: %s' % n_type)
+            pending_jobs = []
+            for jid, jstatus, cmd_id, cmd_name, pending in jobs:
+                # Connect the jobs that generated any descendant with their
+                # inputs and outputs
+                for in_id in inputs[jid]:
+                    if in_id in descendants:
+                        for out_id in outputs[jid]:
+                            edges.add((_artifact_node(in_id), _job_node(jid)))
+                            edges.add((_job_node(jid), _artifact_node(out_id)))
+
+                # Ignore the generate summary jobs. If the job is in success
+                # we don't need to do anything else since it has been added
+                # above
+                if cmd_name == 'Generate HTML summary' or \
+                        jstatus == 'success':
+                    continue
+
+                # Connect the job with his input artifacts, the input
+                # artifacts may or may not exist yet, so we need to check
+                # both the inputs and the pending information
+                for in_id in inputs[jid]:
+                    edges.add((_artifact_node(in_id), _job_node(jid)))
+                if pending:
+                    pending_jobs.append((jid, pending))
+
+                if jstatus != 'error':
+                    # If the job is not errored, we can add the future
+                    # outputs to the graph
+                    for o_name, o_type in cmd_outputs[cmd_id]:
+                        node_id = '%s:%s' % (jid, o_name)
+                        nodes[node_id] = ('type', TypeNode(
+                            id=node_id, job_id=jid, name=o_name, type=o_type))
+                        edges.add((_job_node(jid), nodes[node_id]))
+
+            for jid, pending in pending_jobs:
+                for pred_id in pending:
+                    for pname in pending[pred_id]:
+                        in_node_id = '%s:%s' % (
+                            pred_id, pending[pred_id][pname])
+                        if in_node_id in nodes:
+                            edges.add((nodes[in_node_id], _job_node(jid)))
 
         # Add all edges to the lineage graph - adding the edges creates the
         # nodes in networkx
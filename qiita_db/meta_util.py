@@ -14,6 +14,8 @@ Methods
     :toctree: generated/
 
     get_lat_longs
+    verify_filepaths
+    get_filepaths_integrity_report
 """
 # -----------------------------------------------------------------------------
 # Copyright (c) 2014--, The Qiita Development Team.
@@ -25,17 +27,19 @@ Methods
 from __future__ import division
 
 from os import stat, makedirs, rename
-from os.path import join, relpath, exists
+from os.path import join, relpath, exists, getsize
 from time import strftime, localtime
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 from base64 import b64encode
 from urllib import quote
 from StringIO import StringIO
-from future.utils import viewitems
+from future.utils import viewitems, viewvalues
 from datetime import datetime
 from tarfile import open as topen, TarInfo
 from hashlib import md5
+from itertools import chain
+from json import dumps
 
 from qiita_core.qiita_settings import qiita_config, r_client
 from qiita_core.configuration_manager import ConfigurationManager
@@ -140,7 +144,8 @@ def validate_filepath_access_by_user(user, filepath_id):
                 if (a.visibility == 'public' or a.study.has_access(user)):
                     return True
                 else:
-                    for c in a.descendants.nodes():
+                    for c_id in a.descendant_ids:
+                        c = qdb.artifact.Artifact(c_id)
                         if ((c.visibility == 'public' or
                              c.study.has_access(user))):
                             return True
@@ -164,33 +169,46 @@ def update_redis_stats():
         artifact filepaths that are not present in the file system
     """
     STUDY = qdb.study.Study
-    studies = {'public': STUDY.get_by_status('public'),
-               'private': STUDY.get_by_status('private'),
-               'sandbox': STUDY.get_by_status('sandbox')}
+    studies = {'public': STUDY.get_ids_by_status('public'),
+               'private': STUDY.get_ids_by_status('private'),
+               'sandbox': STUDY.get_ids_by_status('sandbox')}
     number_studies = {k: len(v) for k, v in viewitems(studies)}
+    all_study_ids = tuple(set().union(*studies.values()))
+
+    # per study number of samples and of samples/prep samples with EBI
+    # accessions, computed for all the studies at once
+    study_samples = {}
+    study_samples_ebi = {}
+    ebi_samples_prep = {sid: 0 for sid in all_study_ids}
+    if all_study_ids:
+        with qdb.sql_connection.TRN:
+            sql = """SELECT study_id, COUNT(sample_id),
+                        COUNT(NULLIF(ebi_sample_accession, ''))
+                     FROM qiita.study_sample
+                     WHERE study_id IN %s
+                     GROUP BY study_id"""
+            qdb.sql_connection.TRN.add(sql, [all_study_ids])
+            for sid, n_samples, n_ebi in \
+                    qdb.sql_connection.TRN.execute_fetchindex():
+                study_samples[sid] = n_samples
+                study_samples_ebi[sid] = n_ebi
+
+            sql = """SELECT study_id, COUNT(NULLIF(ebi_experiment_accession,
+                                                   ''))
+                     FROM qiita.prep_template_sample
+                        JOIN qiita.study_prep_template
+                            USING (prep_template_id)
+                     WHERE study_id IN %s
+                     GROUP BY study_id"""
+            qdb.sql_connection.TRN.add(sql, [all_study_ids])
+            ebi_samples_prep.update(
+                dict(qdb.sql_connection.TRN.execute_fetchindex()))
 
     number_of_samples = {}
-    ebi_samples_prep = {}
     num_samples_ebi = 0
     for k, sts in viewitems(studies):
-        number_of_samples[k] = 0
-        for s in sts:
-            st = s.sample_template
-            if st is not None:
-                number_of_samples[k] += len(list(st.keys()))
-
-            ebi_samples_prep_count = 0
-            for pt in s.prep_templates():
-                ebi_samples_prep_count += len([
-                    1 for _, v in viewitems(pt.ebi_experiment_accessions)
-                    if v is not None and v != ''])
-            ebi_samples_prep[s.id] = ebi_samples_prep_count
-
-            if s.sample_template is not None:
-                num_samples_ebi += len([
-                    1 for _, v in viewitems(
-                        s.sample_template.ebi_sample_accessions)
-                    if v is not None and v != ''])
+        number_of_samples[k] = sum(study_samples.get(s, 0) for s in sts)
+        num_samples_ebi += sum(study_samples_ebi.get(s, 0) for s in sts)
 
     num_users = qdb.util.get_count('qiita.qiita_user')
 
@@ -203,16 +221,17 @@ def update_redis_stats():
     # generating file size stats
     stats = []
     missing_files = []
-    for k, sts in viewitems(studies):
-        for s in sts:
-            for a in s.artifacts():
-                for _, fp, dt in a.filepaths:
-                    try:
-                        s = stat(fp)
-                        stats.append((dt, s.st_size, strftime('%Y-%m',
-                                      localtime(s.st_ctime))))
-                    except OSError:
-                        missing_files.append(fp)
+    artifact_ids = chain.from_iterable(viewvalues(
+        qdb.artifact.Artifact.get_study_artifact_ids(all_study_ids)))
+    artifacts = qdb.artifact.Artifact.get_info(artifact_ids, ['filepaths'])
+    for a_id in sorted(artifacts):
+        for _, fp, dt in artifacts[a_id]['filepaths']:
+            try:
+                s = stat(fp)
+                stats.append((dt, s.st_size, strftime('%Y-%m',
+                              localtime(s.st_ctime))))
+            except OSError:
+                missing_files.append(fp)
 
     summary = {}
     all_dates = []
@@ -277,6 +296,9 @@ def update_redis_stats():
 
     time = datetime.now().strftime('%m-%d-%y %H:%M:%S')
 
+    # the submissions of the jobs of each plugin in all the Qiita processes
+    job_submission = dumps(qdb.processing_job.submission_stats())
+
     portal = qiita_config.portal
     vals = [
         ('number_studies', number_studies, r_client.hmset),
@@ -287,7 +309,8 @@ def update_redis_stats():
         ('num_samples_ebi', num_samples_ebi, r_client.set),
         ('number_samples_ebi_prep', number_samples_ebi_prep, r_client.set),
         ('img', img, r_client.set),
-        ('time', time, r_client.set)]
+        ('time', time, r_client.set),
+        ('job_submission', job_submission, r_client.set)]
     for k, v, f in vals:
         redis_key = '%s:stats:%s' % (portal, k)
         # important to "flush" variables to avoid errors
@@ -342,49 +365,67 @@ def generate_biom_and_metadata_release(study_status='public'):
         to 'public' but having this exposed helps with testing. The other
         options are 'private' and 'sandbox'
     """
-    studies = qdb.study.Study.get_by_status(study_status)
+    study_ids = qdb.study.Study.get_ids_by_status(study_status)
     qiita_config = ConfigurationManager()
     working_dir = qiita_config.working_dir
     portal = qiita_config.portal
     bdir = qdb.util.get_db_files_base_dir()
     time = datetime.now().strftime('%m-%d-%y %H:%M:%S')
 
+    ARTIFACT = qdb.artifact.Artifact
+    study_artifacts = ARTIFACT.get_study_artifact_ids(
+        study_ids, artifact_type='BIOM')
+    artifacts = ARTIFACT.get_info(
+        chain.from_iterable(viewvalues(study_artifacts)),
+        ['command_name', 'parent_ids', 'filepaths', 'prep_template_ids'])
+    parents = ARTIFACT.get_info(
+        chain.from_iterable(a['parent_ids'] for a in viewvalues(artifacts)),
+        ['command_name', 'command_parameters'])
+    # the same prep information file is usually shared by several artifacts
+    prep_fps = {}
+
     data = []
-    for s in studies:
+    for sid in sorted(study_ids):
+        s = qdb.study.Study(sid)
         # [0] latest is first, [1] only getting the filepath
         sample_fp = relpath(s.sample_template.get_filepaths()[0][1], bdir)
 
-        for a in s.artifacts(artifact_type='BIOM'):
-            if a.processing_parameters is None:
+        for a_id in study_artifacts[sid]:
+            a = artifacts[a_id]
+            if a['command_name'] is None:
                 continue
 
-            cmd_name = a.processing_parameters.command.name
+            cmd_name = a['command_name']
 
             # this loop is necessary as in theory an artifact can be
             # generated from multiple prep info files
             human_cmd = []
-            for p in a.parents:
-                pp = p.processing_parameters
-                pp_cmd_name = pp.command.name
+            for p_id in a['parent_ids']:
+                pp = parents[p_id]
+                pp_cmd_name = pp['command_name']
                 if pp_cmd_name == 'Trimming':
                     human_cmd.append('%s @ %s' % (
-                        cmd_name, str(pp.values['length'])))
+                        cmd_name, str(pp['command_parameters']['length'])))
                 else:
                     human_cmd.append('%s, %s' % (cmd_name, pp_cmd_name))
             human_cmd = ', '.join(human_cmd)
 
-            for _, fp, fp_type in a.filepaths:
+            for _, fp, fp_type in a['filepaths']:
                 if fp_type != 'biom' or 'only-16s' in fp:
                     continue
                 fp = relpath(fp, bdir)
                 # format: (biom_fp, sample_fp, prep_fp, qiita_artifact_id,
                 #          human readable name)
-                for pt in a.prep_templates:
-                    for _, prep_fp in pt.get_filepaths():
-                        if 'qiime' not in prep_fp:
-                            break
-                    prep_fp = relpath(prep_fp, bdir)
-                    data.append((fp, sample_fp, prep_fp, a.id, human_cmd))
+                for pt_id in a['prep_template_ids']:
+                    if pt_id not in prep_fps:
+                        pt = qdb.metadata_template.prep_template.PrepTemplate(
+                            pt_id)
+                        for _, prep_fp in pt.get_filepaths():
+                            if 'qiime' not in prep_fp:
+                                break
+                        prep_fps[pt_id] = relpath(prep_fp, bdir)
+                    data.append((fp, sample_fp, prep_fps[pt_id], a_id,
+                                 human_cmd))
 
     # writing text and tgz file
     ts = datetime.now().strftime('%m%d%y-%H%M%S')
@@ -426,3 +467,151 @@ def generate_biom_and_metadata_release(study_status='public'):
         # important to "flush" variables to avoid errors
         r_client.delete(redis_key)
         f(redis_key, v)
+
+
+def verify_filepaths(batch_size=100, max_bytes=None, max_seconds=None):
+    """Verifies the checksums of the files stored in the system
+
+    Parameters
+    ----------
+    batch_size : int, optional
+        Number of files verified, and recorded, at once. Default: 100
+    max_bytes : int, optional
+        Do not read more than (about) this number of bytes. Default: no limit
+    max_seconds : int, optional
+        Do not start a new batch after this number of seconds. Default: no
+        limit
+
+    Returns
+    -------
+    dict of {str: list of int}
+        The ids of the filepaths verified in this call keyed by the result of
+        the verification: 'ok', 'missing' or 'mismatch'
+
+    Notes
+    -----
+    The files that were never verified go first, followed by the ones that
+    were verified longest ago, so consecutive calls resume where the previous
+    one stopped. At least one file is read on each call, even if it is larger
+    than `max_bytes`.
+    """
+    start = datetime.now()
+    results = {'ok': [], 'missing': [], 'mismatch': []}
+    bytes_read = 0
+    exhausted = False
+    db_dir = qdb.util.get_db_files_base_dir()
+    sql = """SELECT filepath_id, filepath, checksum, mountpoint,
+                    subdirectory, artifact_id
+             FROM qiita.filepath
+                JOIN qiita.data_directory USING (data_directory_id)
+                LEFT JOIN qiita.artifact_filepath USING (filepath_id)
+                LEFT JOIN qiita.filepath_verification USING (filepath_id)
+             WHERE last_verified IS NULL OR last_verified < %s
+             ORDER BY last_verified NULLS FIRST, filepath_id
+             LIMIT %s"""
+    while not exhausted:
+        if max_seconds is not None and \
+                (datetime.now() - start).total_seconds() >= max_seconds:
+            break
+        with qdb.sql_connection.TRN:
+            qdb.sql_connection.TRN.add(sql, [start, batch_size])
+            rows = qdb.sql_connection.TRN.execute_fetchindex()
+        if not rows:
+            break
+
+        verified = []
+        to_hash = []
+        for fp_id, fp, checksum, mp, subdir, obj_id in rows:
+            path = qdb.util._path_builder(db_dir, fp, mp, subdir, obj_id)
+            if not exists(path):
+                verified.append((fp_id, 'missing', None))
+                continue
+            size = sum(getsize(f) for f in qdb.util._checksum_files(path))
+            if max_bytes is not None and bytes_read + size > max_bytes \
+                    and (bytes_read or to_hash):
+                exhausted = True
+                break
+            bytes_read += size
+            to_hash.append((fp_id, path, checksum))
+
+        # The files are hashed outside of any transaction, so reading them
+        # doesn't keep a database connection (and its locks) open
+        observed = qdb.util.compute_checksums(
+            [path for _, path, _ in to_hash], use_cache=False)
+        for (fp_id, _, checksum), obs in zip(to_hash, observed):
+            status = 'ok' if str(obs) == checksum else 'mismatch'
+            verified.append((fp_id, status, str(obs)))
+
+        if not verified:
+            break
+        with qdb.sql_connection.TRN:
+            now = datetime.now()
+            sql_del = """DELETE FROM qiita.filepath_verification
+                         WHERE filepath_id IN %s"""
+            qdb.sql_connection.TRN.add(
+                sql_del, [tuple(fp_id for fp_id, _, _ in verified)])
+            sql_ins = """INSERT INTO qiita.filepath_verification
+                            (filepath_id, last_verified, status,
+                             observed_checksum)
+                         VALUES (%s, %s, %s, %s)"""
+            qdb.sql_connection.TRN.add(
+                sql_ins, [[fp_id, now, status, obs]
+                          for fp_id, status, obs in verified], many=True)
+            qdb.sql_connection.TRN.execute()
+
+        for fp_id, status, _ in verified:
+            results[status].append(fp_id)
+
+    return results
+
+
+def get_filepaths_integrity_report():
+    """Returns the results of the last verification of the stored files
+
+    Returns
+    -------
+    dict
+        {'summary': {status: number of files}, 'oldest_verification':
+        datetime or None, 'problems': list of dict}. The summary counts the
+        files that were never verified under 'never_verified' and problems
+        holds the filepath_id, path, status, checksum, observed_checksum
+        and last_verified of the missing and mismatched files
+
+    See Also
+    --------
+    verify_filepaths
+    """
+    with qdb.sql_connection.TRN:
+        sql = """SELECT COALESCE(status, 'never_verified'), COUNT(*)
+                 FROM qiita.filepath
+                    LEFT JOIN qiita.filepath_verification USING (filepath_id)
+                 GROUP BY 1"""
+        qdb.sql_connection.TRN.add(sql)
+        summary = {'ok': 0, 'missing': 0, 'mismatch': 0, 'never_verified': 0}
+        summary.update(dict(qdb.sql_connection.TRN.execute_fetchindex()))
+
+        sql = "SELECT MIN(last_verified) FROM qiita.filepath_verification"
+        qdb.sql_connection.TRN.add(sql)
+        oldest = qdb.sql_connection.TRN.execute_fetchlast()
+
+        sql = """SELECT filepath_id, filepath, mountpoint, subdirectory,
+                        artifact_id, status, checksum, observed_checksum,
+                        last_verified
+                 FROM qiita.filepath_verification
+                    JOIN qiita.filepath USING (filepath_id)
+                    JOIN qiita.data_directory USING (data_directory_id)
+                    LEFT JOIN qiita.artifact_filepath USING (filepath_id)
+                 WHERE status != 'ok'
+                 ORDER BY filepath_id"""
+        qdb.sql_connection.TRN.add(sql)
+        db_dir = qdb.util.get_db_files_base_dir()
+        problems = [
+            {'filepath_id': fp_id,
+             'path': qdb.util._path_builder(db_dir, fp, mp, subdir, obj_id),
+             'status': status, 'checksum': checksum,
+             'observed_checksum': observed, 'last_verified': last_verified}
+            for fp_id, fp, mp, subdir, obj_id, status, checksum, observed,
+            last_verified in qdb.sql_connection.TRN.execute_fetchindex()]
+
+    return {'summary': summary, 'oldest_verification': oldest,
+            'problems': problems}
@@ -84,6 +84,7 @@ class SampleTemplate(MetadataTemplate):
             md_template = cls._clean_validate_template(md_template, study.id)
 
             cls._common_creation_steps(md_template, study.id)
+            qdb.util.update_study_listing_summary([study.id])
 
             st = cls(study.id)
             st.validate(
@@ -141,6 +142,8 @@ class SampleTemplate(MetadataTemplate):
 
             qdb.sql_connection.TRN.execute()
 
+            qdb.util.update_study_listing_summary([id_])
+
     @property
     def study_id(self):
         """Gets the study id with which this sample template is associated
@@ -184,7 +187,21 @@ class SampleTemplate(MetadataTemplate):
                 "'%s' has been linked in a prep template(s): %s" % (
                     sample_name, pts))
 
-        self._common_delete_sample_steps(sample_name)
+        with qdb.sql_connection.TRN:
+            self._common_delete_sample_steps(sample_name)
+            qdb.util.update_study_listing_summary([self.study_id])
+
+    def _common_extend_steps(self, md_template):
+        r"""executes the common extend steps and updates the study listing
+
+        Parameters
+        ----------
+        md_template : DataFrame
+            The metadata template file contents indexed by sample ids
+        """
+        with qdb.sql_connection.TRN:
+            super(SampleTemplate, self)._common_extend_steps(md_template)
+            qdb.util.update_study_listing_summary([self.study_id])
 
     def can_be_updated(self, **kwargs):
         """Whether the template can be updated or not
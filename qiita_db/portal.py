@@ -258,6 +258,7 @@ class Portal(qdb.base.QiitaObject):
                 qdb.sql_connection.TRN.add(
                     sql, [[s, self._id] for s in clean_studies], many=True)
             qdb.sql_connection.TRN.execute()
+            qdb.sql_connection.TRN.cache.pop('study_access', None)
 
     def remove_studies(self, studies):
         """Removes studies from given portal
@@ -316,6 +317,7 @@ class Portal(qdb.base.QiitaObject):
             if len(clean_studies) != 0:
                 qdb.sql_connection.TRN.add(sql, [tuple(studies), self._id])
             qdb.sql_connection.TRN.execute()
+            qdb.sql_connection.TRN.cache.pop('study_access', None)
 
     def get_analyses(self):
         """Returns all analyses belonging to a portal
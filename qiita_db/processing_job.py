@@ -7,29 +7,141 @@
 # -----------------------------------------------------------------------------
 
 from uuid import UUID
+from atexit import register as atexit_register
 from datetime import datetime
 from subprocess import Popen, PIPE
-from multiprocessing import Process
-from os.path import join
-from itertools import chain
-from collections import defaultdict, Iterable
+from multiprocessing import Pool
+from threading import Lock, BoundedSemaphore, Thread, Timer
+from os import getpid, read, remove, rename, setsid, killpg
+from os.path import join, exists, getsize
+from signal import SIGKILL
+from itertools import chain, groupby
+from operator import itemgetter
+from collections import defaultdict, deque, Iterable, OrderedDict
+from functools import partial
 from json import dumps, loads
-from time import sleep
+from traceback import format_exc
+from hashlib import md5
+from socket import gethostname
 
 from future.utils import viewitems, viewvalues
 import networkx as nx
 
-from qiita_core.qiita_settings import qiita_config
+from qiita_core.qiita_settings import qiita_config, r_client
 import qiita_db as qdb
 
 
-def _system_call(cmd):
+# Bytes read at once from the output of a command
+SYSTEM_CALL_CHUNK_SIZE = 64 * 1024
+# Bytes of stdout and stderr kept in memory when the output of a command is
+# written to a log file
+SYSTEM_CALL_TAIL_SIZE = 64 * 1024
+# Size at which the log file of a command is rotated, and number of rotated
+# files kept (log_fp.1 is the newest)
+SYSTEM_CALL_LOG_SIZE = 10 * 1024 * 1024
+SYSTEM_CALL_LOG_BACKUPS = 5
+
+
+class _RotatingLog(object):
+    """Thread safe file that is rotated once it reaches a size
+
+    Parameters
+    ----------
+    fp : str
+        The path to the file, the output is appended if it exists
+    max_size : int
+        The size in bytes at which the file is rotated
+    backups : int
+        The number of rotated files kept
+    """
+    def __init__(self, fp, max_size, backups):
+        self._fp = fp
+        self._max_size = max_size
+        self._backups = backups
+        self._lock = Lock()
+        self._size = getsize(fp) if exists(fp) else 0
+        self._fh = open(fp, 'a')
+
+    def write(self, data):
+        with self._lock:
+            if self._size and self._size + len(data) > self._max_size:
+                self._rotate()
+            self._fh.write(data)
+            self._fh.flush()
+            self._size += len(data)
+
+    def _rotate(self):
+        self._fh.close()
+        for i in range(self._backups - 1, 0, -1):
+            src = '%s.%d' % (self._fp, i)
+            if exists(src):
+                rename(src, '%s.%d' % (self._fp, i + 1))
+        if self._backups > 0:
+            rename(self._fp, '%s.1' % self._fp)
+            self._fh = open(self._fp, 'a')
+        else:
+            self._fh = open(self._fp, 'w')
+        self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._fh.close()
+
+
+def _read_output(stream, output, log=None, tail_size=None):
+    """Reads `stream` until it is closed
+
+    Parameters
+    ----------
+    stream : file
+        The stream to read
+    output : list of str
+        The list in which the output is stored, in chunks
+    log : _RotatingLog, optional
+        The log to which the output is also written
+    tail_size : int, optional
+        The maximum number of bytes of the output to keep in memory, the last
+        ones. By default the whole output is kept
+    """
+    size = 0
+    while True:
+        chunk = read(stream.fileno(), SYSTEM_CALL_CHUNK_SIZE)
+        if not chunk:
+            break
+        if log is not None:
+            log.write(chunk)
+        output.append(chunk)
+        size += len(chunk)
+        # Only whole chunks are dropped, the excess is trimmed at the end
+        while tail_size is not None and size - len(output[0]) >= tail_size:
+            size -= len(output.pop(0))
+    stream.close()
+
+
+def _kill_process_group(proc):
+    try:
+        killpg(proc.pid, SIGKILL)
+    except OSError:
+        # The process already finished
+        pass
+
+
+def _system_call(cmd, log_fp=None, timeout=None):
     """Execute the command `cmd`
 
     Parameters
     ----------
-    cmd : str
-        The string containing the command to be run.
+    cmd : str or list of str
+        The command to be run. A string is executed through the shell, while
+        a list of arguments is executed directly, without the shell
+    log_fp : str, optional
+        If given, the output of the command is written to this file while the
+        command runs. The file is rotated every SYSTEM_CALL_LOG_SIZE bytes,
+        and only the last SYSTEM_CALL_TAIL_SIZE bytes of the standard output
+        and error are returned
+    timeout : int, optional
+        The maximum number of seconds that the command can run. After it, the
+        command and its subprocesses are killed. By default, no limit
 
     Returns
     -------
@@ -44,15 +156,72 @@ def _system_call(cmd):
     the authors of this function to port it to Qiita and keep it under BSD
     license.
     """
-    proc = Popen(cmd, universal_newlines=True, shell=True, stdout=PIPE,
-                 stderr=PIPE)
-    # Communicate pulls all stdout/stderr from the PIPEs
-    # This call blocks until the command is done
-    stdout, stderr = proc.communicate()
-    return_value = proc.returncode
+    shell = not isinstance(cmd, (list, tuple))
+    log = None
+    tail_size = None
+    if log_fp is not None:
+        # The log is opened before starting the command, so the command is
+        # never left running if the log can't be opened
+        log = _RotatingLog(
+            log_fp, SYSTEM_CALL_LOG_SIZE, SYSTEM_CALL_LOG_BACKUPS)
+        tail_size = SYSTEM_CALL_TAIL_SIZE
+    stdout = []
+    stderr = []
+    timer = None
+    try:
+        # The command gets its own process group when it can time out, so
+        # its subprocesses can be killed too
+        proc = Popen(cmd, shell=shell, stdout=PIPE, stderr=PIPE,
+                     preexec_fn=setsid if timeout is not None else None)
+        # Reading both pipes at the same time, so the command is never
+        # blocked writing to one of them
+        readers = [Thread(target=_read_output, args=(stream, output, log,
+                                                     tail_size))
+                   for stream, output in ((proc.stdout, stdout),
+                                          (proc.stderr, stderr))]
+        for reader in readers:
+            reader.start()
+        if timeout is not None:
+            timer = Timer(timeout, _kill_process_group, [proc])
+            timer.start()
+        return_value = proc.wait()
+        for reader in readers:
+            reader.join()
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if log is not None:
+            log.close()
+
+    outputs = []
+    for output in (stdout, stderr):
+        output = ''.join(output)
+        if tail_size is not None:
+            output = output[-tail_size:]
+        # The same newlines that universal_newlines=True would return
+        outputs.append(output.replace('\r\n', '\n').replace('\r', '\n'))
+    stdout, stderr = outputs
+    if timer is not None and return_value == -SIGKILL:
+        stderr += "\nThe command timed out after %s seconds" % timeout
     return stdout, stderr, return_value
 
 
+def _job_submission_log_fp(job_id):
+    """Returns the path to the log file of the submission of a job
+
+    Parameters
+    ----------
+    job_id : str
+        The job id
+
+    Returns
+    -------
+    str
+        The path to the log file
+    """
+    return join(qdb.util.get_work_base_dir(), '%s.log' % job_id)
+
+
 def _job_submitter(job_id, cmd):
     """Executes the commands `cmd` and updates the job in case of failure
 
@@ -62,14 +231,548 @@ def _job_submitter(job_id, cmd):
         The job id that is executed by cmd
     cmd : str
         The command to execute the job
+
+    Returns
+    -------
+    bool
+        Whether the job was successfully submitted
+
+    Notes
+    -----
+    The output of `cmd` is written to the log file of the job submission (see
+    `_job_submission_log_fp`), only its last lines are kept in the job error.
+    The log files are removed if the job is successfully submitted
     """
-    std_out, std_err, return_value = _system_call(cmd)
+    log_fp = _job_submission_log_fp(job_id)
+    std_out, std_err, return_value = _system_call(cmd, log_fp=log_fp)
     if return_value != 0:
         error = ("Error submitting job:\nStd output:%s\nStd error:%s"
-                 % (std_out, std_err))
+                 "\nComplete output: %s" % (std_out, std_err, log_fp))
         # Forcing the creation of a new connection
         qdb.sql_connection.create_new_transaction()
         ProcessingJob(job_id).complete(False, error=error)
+    else:
+        for fp in [log_fp] + ['%s.%d' % (log_fp, i) for i in
+                              range(1, SYSTEM_CALL_LOG_BACKUPS + 1)]:
+            if exists(fp):
+                remove(fp)
+    return return_value == 0
+
+
+# Redis channel in which the validators of a job announce that they are done
+VALIDATORS_CHANNEL = 'validators:%s'
+# Maximum number of seconds that release_validators waits for a message
+# before checking the status of the validators in the DB again
+VALIDATORS_WAIT_TIMEOUT = 60
+
+# Redis key holding the last heartbeat of a job that has not been written to
+# the DB yet, and the key of the set of jobs with such heartbeats
+HEARTBEAT_KEY = 'heartbeat:%s'
+HEARTBEAT_PENDING_KEY = 'heartbeat:pending'
+# Seconds that a buffered heartbeat is kept in redis
+HEARTBEAT_TTL = 60 * 60
+HEARTBEAT_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Redis hash with the submission metrics of each process submitting jobs
+# (see JobSubmissionExecutor.stats), keyed by host and process id
+JOB_SUBMISSION_STATS_KEY = 'job_submission_stats'
+
+
+def _submission_worker_init():
+    # The workers are forked from the process submitting the jobs, so they
+    # can't share its connection to the DB
+    qdb.sql_connection.create_new_transaction()
+
+
+def _submission_task(job_id, cmd):
+    """Runs _job_submitter, making sure that the result reaches the executor
+
+    Returns
+    -------
+    bool
+        Whether the job was successfully submitted
+    """
+    try:
+        return _job_submitter(job_id, cmd)
+    except Exception:
+        try:
+            qdb.logger.LogEntry.create(
+                'Runtime', 'Error submitting job %s:\n%s'
+                % (job_id, format_exc()), info={'job_id': job_id})
+        except Exception:
+            pass
+        return False
+
+
+class JobSubmissionExecutor(object):
+    """Submits jobs through a bounded pool of worker processes
+
+    Parameters
+    ----------
+    workers : int
+        The number of worker processes
+    queue_size : int
+        The maximum number of submissions that can be waiting or running at
+        the same time
+    plugin_limits : dict of {str: int}, optional
+        The maximum number of concurrent submissions per plugin name. By
+        default a plugin can use all the workers
+
+    Notes
+    -----
+    The submissions wait in a queue per plugin and are dispatched to the
+    pool as long as the plugin is under its limit. Once `queue_size`
+    submissions are waiting or running, `submit` refuses new ones, which
+    stay in the job scheduler (see `schedule_jobs`). The worker processes are
+    only started on the first submission and, at exit, the process waits for
+    all its queued submissions (see `shutdown`). The metrics of the executor
+    are published in redis after each submission (see `submission_stats`)
+    """
+    def __init__(self, workers, queue_size, plugin_limits=None):
+        self._workers = workers
+        self._queue_size = queue_size
+        self._plugin_limits = plugin_limits or {}
+        self._lock = Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pool = None
+        self._pid = getpid()
+        self._slots = BoundedSemaphore(self._queue_size)
+        self._pending = defaultdict(deque)
+        self._running = defaultdict(int)
+        self._submitted = defaultdict(int)
+        self._failed = defaultdict(int)
+
+    def submit(self, job_id, cmd, plugin):
+        """Queues the submission of a job
+
+        Parameters
+        ----------
+        job_id : str
+            The id of the job
+        cmd : str
+            The command that submits the job
+        plugin : str
+            The name of the plugin of the job
+
+        Returns
+        -------
+        bool
+            Whether the submission was queued. It is not queued if there are
+            already `queue_size` submissions waiting or running
+        """
+        if self._pid != getpid():
+            # We are in a process forked from the one that created the pool,
+            # which can't be used from here
+            with self._lock:
+                self._reset()
+        # Never blocking, as this runs in the IOLoop of the server
+        if not self._slots.acquire(False):
+            return False
+        with self._lock:
+            if self._pool is None:
+                self._pool = Pool(self._workers,
+                                  initializer=_submission_worker_init)
+                atexit_register(self.shutdown)
+            self._pending[plugin].append((job_id, cmd))
+            self._dispatch(plugin)
+        return True
+
+    def _dispatch(self, plugin):
+        # Must be called holding self._lock
+        limit = self._plugin_limits.get(plugin, self._workers)
+        pending = self._pending[plugin]
+        while pending and self._running[plugin] < limit:
+            job_id, cmd = pending.popleft()
+            self._running[plugin] += 1
+            self._pool.apply_async(
+                _submission_task, (job_id, cmd),
+                callback=partial(self._done, plugin))
+
+    def _done(self, plugin, success):
+        with self._lock:
+            self._running[plugin] -= 1
+            if success:
+                self._submitted[plugin] += 1
+            else:
+                self._failed[plugin] += 1
+            self._dispatch(plugin)
+        self._slots.release()
+        self._publish()
+
+    def _stats_field(self):
+        return '%s:%s' % (gethostname(), self._pid)
+
+    def _publish(self):
+        # This runs in the thread handling the results of the pool, which
+        # must not be stopped by an error
+        try:
+            r_client.hset(JOB_SUBMISSION_STATS_KEY, self._stats_field(),
+                          dumps(self.stats()))
+        except Exception:
+            pass
+
+    def shutdown(self):
+        """Waits for all the queued submissions and stops the workers
+
+        Notes
+        -----
+        The workers are daemonic, so they would be terminated with the
+        process, losing the submissions still queued. This is executed at exit
+        to avoid it, e.g. when the children of a job are submitted from a
+        private task
+        """
+        with self._lock:
+            if self._pool is None or self._pid != getpid():
+                return
+        # Every finished submission releases its slot, so once all the slots
+        # are acquired there is nothing left to submit
+        for _ in range(self._queue_size):
+            self._slots.acquire()
+        with self._lock:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        for _ in range(self._queue_size):
+            self._slots.release()
+        r_client.hdel(JOB_SUBMISSION_STATS_KEY, self._stats_field())
+
+    def stats(self):
+        """Returns the submission metrics of each plugin
+
+        Returns
+        -------
+        dict of {str: dict of {str: int}}
+            The number of 'pending', 'running', 'submitted' and 'failed'
+            submissions, keyed by plugin name
+        """
+        with self._lock:
+            plugins = (set(self._pending) | set(self._running) |
+                       set(self._submitted) | set(self._failed))
+            return {plugin: {'pending': len(self._pending[plugin]),
+                             'running': self._running[plugin],
+                             'submitted': self._submitted[plugin],
+                             'failed': self._failed[plugin]}
+                    for plugin in plugins}
+
+
+_SUBMISSION_EXECUTOR = None
+
+
+def get_submission_executor():
+    """Returns the executor used to submit the jobs
+
+    Returns
+    -------
+    JobSubmissionExecutor
+        The executor, created with the JOB_SUBMISSION_* options of the
+        configuration
+    """
+    global _SUBMISSION_EXECUTOR
+    if _SUBMISSION_EXECUTOR is None:
+        _SUBMISSION_EXECUTOR = JobSubmissionExecutor(
+            qiita_config.job_submission_workers,
+            qiita_config.job_submission_queue_size,
+            qiita_config.job_submission_plugin_limits)
+    return _SUBMISSION_EXECUTOR
+
+
+def submission_stats():
+    """Returns the submission metrics of all the processes submitting jobs
+
+    Returns
+    -------
+    dict of {str: dict of {str: int}}
+        The number of 'pending', 'running', 'submitted' and 'failed'
+        submissions, keyed by plugin name
+
+    Notes
+    -----
+    Each process publishes the metrics of its own executor in redis, which
+    are added up here
+    """
+    stats = defaultdict(lambda: defaultdict(int))
+    for value in r_client.hvals(JOB_SUBMISSION_STATS_KEY):
+        for plugin, metrics in viewitems(loads(value)):
+            for metric, count in viewitems(metrics):
+                stats[plugin][metric] += count
+    return {plugin: dict(metrics) for plugin, metrics in viewitems(stats)}
+
+
+# Priority classes of the jobs in the scheduler, the lower classes are
+# submitted first. Private jobs perform maintenance tasks, and the validators
+# and HTML summaries are short and their parent job is already running, so
+# these classes are not limited by qiita_config.max_running_jobs
+JOB_PRIORITY_PRIVATE = 0
+JOB_PRIORITY_SUPPORT = 1
+JOB_PRIORITY_DEFAULT = 2
+SUPPORT_COMMANDS = ('Validate', 'Generate HTML summary')
+
+# Redis list in which the private jobs wait for the private workers, when
+# qiita_config.use_private_workers is set, and the list holding the job being
+# run by each worker (see qiita_ware.private_plugin.private_worker)
+PRIVATE_TASK_QUEUE = 'private_tasks'
+PRIVATE_WORKER_KEY = 'private_worker:%s'
+# Private commands that can wait for other private jobs to finish, so they
+# are always submitted through the launcher. If they took a private worker,
+# the workers could all end up waiting for jobs that no worker is left to run.
+# The release_validators jobs are only queued once their validators are done
+# (see ProcessingJob._trigger_release), but the ones queued by other means
+# (e.g. when recovering jobs) still wait
+LAUNCHER_PRIVATE_COMMANDS = ('release_validators',)
+
+
+def _job_priority(software_type, command_name):
+    """Returns the priority class of a job in the scheduler
+
+    Parameters
+    ----------
+    software_type : str
+        The type of the software of the command of the job
+    command_name : str
+        The name of the command of the job
+
+    Returns
+    -------
+    int
+        One of the JOB_PRIORITY_* values
+    """
+    if software_type == 'private':
+        return JOB_PRIORITY_PRIVATE
+    if command_name in SUPPORT_COMMANDS:
+        return JOB_PRIORITY_SUPPORT
+    return JOB_PRIORITY_DEFAULT
+
+
+def schedule_jobs():
+    """Submits the jobs waiting in the scheduler that fit in the limits
+
+    Returns
+    -------
+    list of str
+        The ids of the submitted jobs
+
+    Notes
+    -----
+    The waiting jobs are submitted by priority class. Within a class, the
+    next job submitted belongs to the user with the fewest jobs currently
+    queued or running in the cluster (the one waiting for longer on ties), so
+    a single user can't take all the capacity. The jobs of the default class
+    are limited by qiita_config.max_running_jobs, and the jobs of all the
+    classes by the `max_running_jobs` of their command. The jobs that don't
+    fit in the queue of the submission executor go back to the scheduler,
+    and are submitted on a later call.
+    """
+    with qdb.sql_connection.TRN:
+        # Only one scheduler can take decisions at a time, or the limits
+        # could be exceeded
+        sql = """LOCK TABLE qiita.processing_job_schedule
+                 IN SHARE ROW EXCLUSIVE MODE"""
+        qdb.sql_connection.TRN.add(sql)
+        sql = """SELECT processing_job_id, priority, email, command_id,
+                        enqueued
+                 FROM qiita.processing_job_schedule
+                    JOIN qiita.processing_job USING (processing_job_id)
+                    JOIN qiita.processing_job_status
+                        USING (processing_job_status_id)
+                 WHERE dispatched IS NULL
+                    AND processing_job_status = 'queued'
+                 ORDER BY priority, enqueued"""
+        qdb.sql_connection.TRN.add(sql)
+        waiting = qdb.sql_connection.TRN.execute_fetchindex()
+        if not waiting:
+            # Releasing the lock, even if called within another transaction
+            qdb.sql_connection.TRN.commit()
+            return []
+
+        # The jobs in the cluster, including the ones submitted before the
+        # scheduler existed
+        sql = """SELECT COALESCE(priority, %s), email, command_id
+                 FROM qiita.processing_job
+                    JOIN qiita.processing_job_status
+                        USING (processing_job_status_id)
+                    LEFT JOIN qiita.processing_job_schedule
+                        USING (processing_job_id)
+                 WHERE processing_job_status IN ('queued', 'running')
+                    AND (enqueued IS NULL OR dispatched IS NOT NULL)"""
+        qdb.sql_connection.TRN.add(sql, [JOB_PRIORITY_DEFAULT])
+        user_jobs = defaultdict(int)
+        command_jobs = defaultdict(int)
+        limited_jobs = 0
+        for priority, email, command_id in \
+                qdb.sql_connection.TRN.execute_fetchindex():
+            user_jobs[email] += 1
+            command_jobs[command_id] += 1
+            if priority >= JOB_PRIORITY_DEFAULT:
+                limited_jobs += 1
+
+        sql = """SELECT command_id, max_running_jobs
+                 FROM qiita.software_command
+                 WHERE max_running_jobs IS NOT NULL"""
+        qdb.sql_connection.TRN.add(sql)
+        command_limits = dict(qdb.sql_connection.TRN.execute_fetchindex())
+        max_running_jobs = qiita_config.max_running_jobs
+
+        dispatched = []
+        private_jobs = []
+        for priority, jobs in groupby(waiting, itemgetter(1)):
+            limited = priority >= JOB_PRIORITY_DEFAULT
+            # The waiting jobs of each user, in arrival order
+            queues = OrderedDict()
+            for job_id, _, email, command_id, enqueued in jobs:
+                queues.setdefault(email, deque()).append(
+                    (job_id, command_id, enqueued))
+            while queues:
+                if (limited and max_running_jobs is not None and
+                        limited_jobs >= max_running_jobs):
+                    break
+                email = min(queues, key=lambda e: (user_jobs[e],
+                                                   queues[e][0][2]))
+                queue = queues[email]
+                for job in queue:
+                    limit = command_limits.get(job[1])
+                    if limit is None or command_jobs[job[1]] < limit:
+                        break
+                else:
+                    # All the jobs of this user are over their command limit
+                    del queues[email]
+                    continue
+                queue.remove(job)
+                if not queue:
+                    del queues[email]
+                user_jobs[email] += 1
+                command_jobs[job[1]] += 1
+                if limited:
+                    limited_jobs += 1
+                dispatched.append(job[0])
+                if priority == JOB_PRIORITY_PRIVATE:
+                    private_jobs.append(job[0])
+
+        if not dispatched:
+            qdb.sql_connection.TRN.commit()
+            return []
+
+        sql = """UPDATE qiita.processing_job_schedule
+                 SET dispatched = current_timestamp
+                 WHERE processing_job_id IN %s"""
+        qdb.sql_connection.TRN.add(sql, [tuple(dispatched)])
+        qdb.sql_connection.TRN.execute()
+        if private_jobs and qiita_config.use_private_workers:
+            sql = """SELECT processing_job_id
+                     FROM qiita.processing_job
+                        JOIN qiita.software_command USING (command_id)
+                     WHERE processing_job_id IN %s AND name IN %s"""
+            qdb.sql_connection.TRN.add(
+                sql, [tuple(private_jobs), LAUNCHER_PRIVATE_COMMANDS])
+            blocking = set(qdb.sql_connection.TRN.execute_fetchflatten())
+            private_jobs = [job_id for job_id in private_jobs
+                            if job_id not in blocking]
+        else:
+            private_jobs = []
+        cmds = []
+        for job_id in dispatched:
+            if job_id in private_jobs:
+                continue
+            job = ProcessingJob(job_id)
+            cmds.append((job_id, job._generate_cmd(),
+                         job.command.software.name))
+        # At this point we are going to involve other processes. We need
+        # to commit the changes to the DB or the other processes will not
+        # see these changes
+        qdb.sql_connection.TRN.commit()
+
+    executor = get_submission_executor()
+    rejected = [job_id for job_id, cmd, plugin in cmds
+                if not executor.submit(job_id, cmd, plugin)]
+    if rejected:
+        with qdb.sql_connection.TRN:
+            sql = """UPDATE qiita.processing_job_schedule
+                     SET dispatched = NULL
+                     WHERE processing_job_id IN %s"""
+            qdb.sql_connection.TRN.add(sql, [tuple(rejected)])
+            qdb.sql_connection.TRN.execute()
+            qdb.sql_connection.TRN.commit()
+    # The private workers take the jobs from the other end of the list
+    for job_id in private_jobs:
+        r_client.lpush(PRIVATE_TASK_QUEUE, job_id)
+    return [job_id for job_id in dispatched if job_id not in rejected]
+
+
+def _parameters_fingerprint(values):
+    """Computes the fingerprint used to find jobs with the same parameters
+
+    Parameters
+    ----------
+    values : dict of {str: object}
+        The parameter values of the job
+
+    Returns
+    -------
+    str or None
+        The fingerprint, or None if the parameters can't be compared
+
+    Notes
+    -----
+    Two jobs of the same command are duplicates if, for every parameter, the
+    values as text are the same ignoring case (e.g. True, true and 'TRUE' are
+    the same). Parameters with null or list values (e.g. the inputs of jobs
+    in a workflow that have not been created yet) are never considered to be
+    the same, so those jobs don't have a fingerprint.
+    """
+    normalized = {}
+    for k, v in viewitems(values):
+        if v is None:
+            return None
+        elif isinstance(v, bool):
+            v = 'true' if v else 'false'
+        elif isinstance(v, (str, unicode)):
+            v = v.lower()
+        elif isinstance(v, Iterable):
+            return None
+        else:
+            v = dumps(v)
+        normalized[k] = v
+    return md5(dumps(normalized, sort_keys=True,
+                     separators=(',', ':'))).hexdigest()
+
+
+def flush_heartbeats():
+    """Writes the heartbeats buffered in redis to the DB
+
+    Returns
+    -------
+    int
+        The number of heartbeats written
+
+    See Also
+    --------
+    ProcessingJob.update_heartbeat_state
+    """
+    pipe = r_client.pipeline()
+    pipe.smembers(HEARTBEAT_PENDING_KEY)
+    pipe.delete(HEARTBEAT_PENDING_KEY)
+    job_ids = list(pipe.execute()[0])
+    if not job_ids:
+        return 0
+
+    values = []
+    for job_id, hb in zip(job_ids, r_client.mget(
+            [HEARTBEAT_KEY % jid for jid in job_ids])):
+        # The heartbeat could have expired
+        if hb is not None:
+            hb = datetime.strptime(hb, HEARTBEAT_FORMAT)
+            values.append([hb, job_id, hb])
+
+    if values:
+        with qdb.sql_connection.TRN:
+            sql = """UPDATE qiita.processing_job
+                     SET heartbeat = %s
+                     WHERE processing_job_id = %s
+                        AND (heartbeat IS NULL OR heartbeat < %s)"""
+            qdb.sql_connection.TRN.add(sql, values, many=True)
+            qdb.sql_connection.TRN.execute()
+    return len(values)
 
 
 class ProcessingJob(qdb.base.QiitaObject):
@@ -146,46 +849,29 @@ class ProcessingJob(qdb.base.QiitaObject):
             command = parameters.command
 
             # check if a job with the same parameters already exists
-            sql = """SELECT processing_job_id, email, processing_job_status,
-                        COUNT(aopj.artifact_id)
-                     FROM qiita.processing_job
-                     LEFT JOIN qiita.processing_job_status
-                        USING (processing_job_status_id)
-                     LEFT JOIN qiita.artifact_output_processing_job aopj
-                        USING (processing_job_id)
-                     WHERE command_id = %s AND processing_job_status IN (
-                        'success', 'waiting', 'running', 'in_construction') {0}
-                     GROUP BY processing_job_id, email,
-                        processing_job_status"""
-
-            # we need to use ILIKE because of booleans as they can be
-            # false or False
-            params = []
-            for k, v in viewitems(parameters.values):
-                # this is necessary in case we have an Iterable as a value
-                # but that is not unicode or string
-                if isinstance(v, Iterable) and not isinstance(v, (str,
-                                                                  unicode)):
-                    for vv in v:
-                        params.extend([k, str(vv)])
-                else:
-                    params.extend([k, str(v)])
-
-            if params:
-                # divided by 2 as we have key-value pairs
-                len_params = len(params)/2
-                sql = sql.format(' AND ' + ' AND '.join(
-                    ["command_parameters->>%s ILIKE %s"] * len_params))
-                params = [command.id] + params
-                TTRN.add(sql, params)
-            else:
-                # the sql variable expects the list of parameters but if there
-                # is no param we need to replace the {0} with an empty string
-                TTRN.add(sql.format(""), [command.id])
+            fingerprint = _parameters_fingerprint(parameters.values)
+            existing_jobs = []
+            if fingerprint is not None:
+                sql = """SELECT processing_job_id, email,
+                            processing_job_status, COUNT(aopj.artifact_id)
+                         FROM qiita.processing_job
+                         LEFT JOIN qiita.processing_job_status
+                            USING (processing_job_status_id)
+                         LEFT JOIN qiita.artifact_output_processing_job aopj
+                            USING (processing_job_id)
+                         WHERE command_id = %s
+                            AND parameters_fingerprint = %s
+                            AND processing_job_status IN (
+                                'success', 'waiting', 'running',
+                                'in_construction')
+                         GROUP BY processing_job_id, email,
+                            processing_job_status"""
+                TTRN.add(sql, [command.id, fingerprint])
+                existing_jobs = TTRN.execute_fetchindex()
 
             # checking that if the job status is success, it has children
             # [2] status, [3] children count
-            existing_jobs = [r for r in TTRN.execute_fetchindex()
+            existing_jobs = [r for r in existing_jobs
                              if r[2] != 'success' or r[3] > 0]
             if existing_jobs and not force:
                 raise ValueError(
@@ -197,13 +883,13 @@ class ProcessingJob(qdb.base.QiitaObject):
 
             sql = """INSERT INTO qiita.processing_job
                         (email, command_id, command_parameters,
-                         processing_job_status_id)
-                     VALUES (%s, %s, %s, %s)
+                         processing_job_status_id, parameters_fingerprint)
+                     VALUES (%s, %s, %s, %s, %s)
                      RETURNING processing_job_id"""
             status = qdb.util.convert_to_id(
                 "in_construction", "processing_job_status")
             sql_args = [user.id, command.id,
-                        parameters.dump(), status]
+                        parameters.dump(), status, fingerprint]
             TTRN.add(sql, sql_args)
             job_id = TTRN.execute_fetchlast()
 
@@ -353,8 +1039,67 @@ class ProcessingJob(qdb.base.QiitaObject):
                      SET processing_job_status_id = %s
                      WHERE processing_job_id = %s"""
             qdb.sql_connection.TRN.add(sql, [new_status, self.id])
+
+            if value in ('waiting', 'error'):
+                # If this is a validator, it is done: let the job waiting
+                # for it know, once the new status is visible
+                sql = """SELECT processing_job_id
+                         FROM qiita.processing_job_validator
+                         WHERE validator_id = %s"""
+                qdb.sql_connection.TRN.add(sql, [self.id])
+                for job_id in qdb.sql_connection.TRN.execute_fetchflatten():
+                    qdb.sql_connection.TRN.add_post_commit_func(
+                        r_client.publish, VALIDATORS_CHANNEL % job_id,
+                        self.id)
+                    ProcessingJob(job_id)._trigger_release()
+
             qdb.sql_connection.TRN.execute()
 
+    def _trigger_release(self):
+        """Queues the job releasing the validators once all of them are done
+
+        Notes
+        -----
+        The release_validators job is created with the validators (see
+        `_complete_artifact_transformation`), but it is only queued by the
+        last validator to finish, so it never has to wait for them. The row
+        of this job is locked, so the validators finishing at the same time
+        are checked one after the other and the last one sees all the others
+        done. The scheduler picks the job on its next pass.
+        """
+        with qdb.sql_connection.TRN:
+            sql = """SELECT processing_job_id
+                     FROM qiita.processing_job
+                     WHERE processing_job_id = %s
+                     FOR UPDATE"""
+            qdb.sql_connection.TRN.add(sql, [self.id])
+            sql = """SELECT COUNT(*)
+                     FROM qiita.processing_job_validator pjv
+                        JOIN qiita.processing_job pj
+                            ON pjv.validator_id = pj.processing_job_id
+                        JOIN qiita.processing_job_status
+                            USING (processing_job_status_id)
+                     WHERE pjv.processing_job_id = %s
+                        AND processing_job_status NOT IN %s"""
+            qdb.sql_connection.TRN.add(sql, [self.id, ('waiting', 'error')])
+            if qdb.sql_connection.TRN.execute_fetchlast():
+                return
+            sql = """SELECT processing_job_id
+                     FROM qiita.processing_job
+                        JOIN qiita.software_command sc USING (command_id)
+                        JOIN qiita.software s USING (software_id)
+                        JOIN qiita.processing_job_status
+                            USING (processing_job_status_id)
+                     WHERE s.name = 'Qiita'
+                        AND sc.name = 'release_validators'
+                        AND command_parameters->>'job' = %s
+                        AND processing_job_status = 'in_construction'"""
+            qdb.sql_connection.TRN.add(sql, [self.id])
+            priority = _job_priority('private', 'release_validators')
+            ProcessingJob._enqueue(
+                {jid: priority for jid in
+                 qdb.sql_connection.TRN.execute_fetchflatten()})
+
     def _generate_cmd(self):
         """Generates the command to submit the job
 
@@ -378,25 +1123,299 @@ class ProcessingJob(qdb.base.QiitaObject):
     def submit(self):
         """Submits the job to execution
 
+        The job is queued in the scheduler, which submits it as soon as it
+        fits in the limits (see `schedule_jobs`)
+
         Raises
         ------
         QiitaDBOperationNotPermittedError
             If the job is not in 'waiting' or 'in_construction' status
         """
+        ProcessingJob.batch_submit([self])
+
+    @classmethod
+    def batch_submit(cls, jobs):
+        """Submits several jobs to execution with a single commit
+
+        Parameters
+        ----------
+        jobs : iterable of qiita_db.processing_job.ProcessingJob
+            The jobs to submit
+
+        Raises
+        ------
+        QiitaDBOperationNotPermittedError
+            If any of the jobs is not in 'waiting' or 'in_construction'
+            status. In this case none of the jobs is submitted
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return
         with qdb.sql_connection.TRN:
-            status = self.status
-            if status not in {'in_construction', 'waiting'}:
-                raise qdb.exceptions.QiitaDBOperationNotPermittedError(
-                    "Can't submit job, not in 'in_construction' or "
-                    "'waiting' status. Current status: %s" % status)
-            self._set_status('queued')
-            # At this point we are going to involve other processes. We need
-            # to commit the changes to the DB or the other processes will not
-            # see these changes
+            sql = """SELECT processing_job_id, processing_job_status,
+                            software_type, sc.name
+                     FROM qiita.processing_job
+                        JOIN qiita.processing_job_status
+                            USING (processing_job_status_id)
+                        JOIN qiita.software_command sc USING (command_id)
+                        JOIN qiita.software USING (software_id)
+                        JOIN qiita.software_type USING (software_type_id)
+                     WHERE processing_job_id IN %s"""
+            qdb.sql_connection.TRN.add(sql, [tuple(j.id for j in jobs)])
+            info = {jid: (status, stype, cname) for jid, status, stype, cname
+                    in qdb.sql_connection.TRN.execute_fetchindex()}
+            for job in jobs:
+                status = info[job.id][0]
+                if status not in {'in_construction', 'waiting'}:
+                    raise qdb.exceptions.QiitaDBOperationNotPermittedError(
+                        "Can't submit job, not in 'in_construction' or "
+                        "'waiting' status. Current status: %s" % status)
+
+            priorities = {}
+            for job in jobs:
+                if (qiita_config.memoize_jobs and
+                        info[job.id][1] == 'artifact transformation'):
+                    previous = job._find_memoized_job()
+                    if previous is not None:
+                        # The outputs are copied by a private job, so the
+                        # files are not copied while submitting the job
+                        reuse = job._create_reuse_job(previous)
+                        priorities[reuse.id] = _job_priority(
+                            'private', 'reuse_memoized_job')
+                        continue
+                priorities[job.id] = _job_priority(*info[job.id][1:])
+
+            cls._enqueue(priorities)
+            # The scheduler may submit the jobs from other processes, which
+            # need to see these changes
             qdb.sql_connection.TRN.commit()
-        cmd = self._generate_cmd()
-        p = Process(target=_job_submitter, args=(self.id, cmd))
-        p.start()
+        schedule_jobs()
+
+    @staticmethod
+    def _enqueue(priorities):
+        """Queues jobs in the scheduler, without committing the transaction
+
+        Parameters
+        ----------
+        priorities : dict of {str: int}
+            The priority class of each job, keyed by job id
+        """
+        if not priorities:
+            return
+        with qdb.sql_connection.TRN:
+            job_ids = tuple(priorities)
+            sql = """UPDATE qiita.processing_job
+                     SET processing_job_status_id = %s
+                     WHERE processing_job_id IN %s"""
+            qdb.sql_connection.TRN.add(
+                sql, [qdb.util.convert_to_id(
+                    'queued', "processing_job_status"), job_ids])
+            # The jobs may have been in the scheduler before, e.g. if they
+            # are being recovered
+            sql = """DELETE FROM qiita.processing_job_schedule
+                     WHERE processing_job_id IN %s"""
+            qdb.sql_connection.TRN.add(sql, [job_ids])
+            sql = """INSERT INTO qiita.processing_job_schedule
+                        (processing_job_id, priority)
+                     VALUES (%s, %s)"""
+            qdb.sql_connection.TRN.add(
+                sql, [[jid, p] for jid, p in viewitems(priorities)],
+                many=True)
+            qdb.sql_connection.TRN.execute()
+
+    def _priority(self):
+        """Returns the priority class of the job in the scheduler
+
+        Returns
+        -------
+        int
+            One of the JOB_PRIORITY_* values
+        """
+        with qdb.sql_connection.TRN:
+            command = self.command
+            return _job_priority(command.software.type, command.name)
+
+    def _memoization_key(self):
+        """Computes the key identifying the results of the job
+
+        Returns
+        -------
+        str or None
+            The key, None if the results of the job can't be reused
+
+        Notes
+        -----
+        The key depends on the command, the parameter values and the contents
+        of the input artifacts, but not on their ids. The contents of an
+        artifact are the checksums of its files and of the last files of its
+        prep templates. Jobs whose inputs don't have prep templates (i.e. in
+        the analysis pipeline) can't be memoized, since their results also
+        depend on the metadata of the analysis.
+        """
+        with qdb.sql_connection.TRN:
+            values = dict(self.parameters.values)
+            sql_files = """SELECT filepath_type, checksum
+                           FROM qiita.artifact_filepath
+                            JOIN qiita.filepath USING (filepath_id)
+                            JOIN qiita.filepath_type USING (filepath_type_id)
+                           WHERE artifact_id = %s
+                            AND filepath_type NOT IN (
+                                'html_summary', 'html_summary_dir')"""
+            sql_templates = """SELECT DISTINCT ON (
+                                    prep_template_id, filepath_type)
+                                filepath_type, checksum
+                               FROM qiita.prep_template_filepath
+                                JOIN qiita.filepath USING (filepath_id)
+                                JOIN qiita.filepath_type
+                                    USING (filepath_type_id)
+                               WHERE prep_template_id IN %s
+                               ORDER BY prep_template_id, filepath_type,
+                                filepath_id DESC"""
+            for pname, (ptype, _) in viewitems(self.command.parameters):
+                if ptype != 'artifact':
+                    continue
+                artifact = values.get(pname)
+                if artifact is None or isinstance(artifact, list):
+                    # The input doesn't exist yet
+                    return None
+                artifact = qdb.artifact.Artifact(artifact)
+                templates = tuple(pt.id for pt in artifact.prep_templates)
+                if not templates:
+                    return None
+                qdb.sql_connection.TRN.add(sql_files, [artifact.id])
+                contents = qdb.sql_connection.TRN.execute_fetchindex()
+                qdb.sql_connection.TRN.add(sql_templates, [templates])
+                contents.extend(qdb.sql_connection.TRN.execute_fetchindex())
+                contents = sorted(contents)
+                values[pname] = md5(dumps(
+                    [artifact.artifact_type] + contents)).hexdigest()
+
+            fingerprint = _parameters_fingerprint(values)
+            if fingerprint is None:
+                return None
+            return md5('%s:%s' % (self.command.id, fingerprint)).hexdigest()
+
+    def _find_memoized_job(self):
+        """Finds a previous job whose outputs can be reused by this job
+
+        Returns
+        -------
+        qiita_db.processing_job.ProcessingJob or None
+            The previous job, if any
+
+        Notes
+        -----
+        The memoization key of the job is stored, so this job can be reused
+        once it succeeds
+        """
+        with qdb.sql_connection.TRN:
+            key = self._memoization_key()
+            sql = """UPDATE qiita.processing_job
+                     SET memoization_key = %s
+                     WHERE processing_job_id = %s"""
+            qdb.sql_connection.TRN.add(sql, [key, self.id])
+            if key is None:
+                qdb.sql_connection.TRN.execute()
+                return None
+
+            # Only the jobs with all their outputs still available
+            sql = """SELECT processing_job_id
+                     FROM qiita.processing_job
+                        JOIN qiita.processing_job_status
+                            USING (processing_job_status_id)
+                        JOIN qiita.artifact_output_processing_job aopj
+                            USING (processing_job_id)
+                     WHERE memoization_key = %s
+                        AND processing_job_id != %s
+                        AND processing_job_status = 'success'
+                     GROUP BY processing_job_id, command_id
+                     HAVING COUNT(aopj.artifact_id) = (
+                        SELECT COUNT(*)
+                        FROM qiita.command_output co
+                        WHERE co.command_id = processing_job.command_id)
+                     LIMIT 1"""
+            qdb.sql_connection.TRN.add(sql, [key, self.id])
+            res = qdb.sql_connection.TRN.execute_fetchflatten()
+            return ProcessingJob(res[0]) if res else None
+
+    def _create_reuse_job(self, previous):
+        """Creates the private job that reuses the outputs of `previous`
+
+        Parameters
+        ----------
+        previous : qiita_db.processing_job.ProcessingJob
+            A successful job with the same memoization key
+
+        Returns
+        -------
+        qiita_db.processing_job.ProcessingJob
+            The private job, which is not submitted
+
+        Notes
+        -----
+        The job is set to 'running' until the private job completes it
+        """
+        with qdb.sql_connection.TRN:
+            self._set_status('running')
+            self.step = 'Reusing the outputs of job %s' % previous.id
+            qiita_plugin = qdb.software.Software.from_name_and_version(
+                'Qiita', 'alpha')
+            cmd = qiita_plugin.get_command('reuse_memoized_job')
+            params = qdb.software.Parameters.load(
+                cmd, values_dict={'job': self.id, 'previous': previous.id})
+            return ProcessingJob.create(self.user, params, True)
+
+    def _complete_from_memoized_job(self, previous):
+        """Completes the job using the outputs of `previous`
+
+        The output files of `previous`, including their HTML summaries, are
+        copied into new artifacts generated by this job. This is run by the
+        private job created in `_create_reuse_job`.
+
+        Parameters
+        ----------
+        previous : qiita_db.processing_job.ProcessingJob
+            A successful job with the same memoization key
+
+        Notes
+        -----
+        The files are copied straight from the artifacts of `previous` into
+        the DB directory (as done by qiita_db.artifact.Artifact.copy), and the
+        files are exact copies, so their checksums are reused instead of
+        reading the files again
+        """
+        with qdb.sql_connection.TRN:
+            sql = """SELECT command_output_id, artifact_id
+                     FROM qiita.artifact_output_processing_job
+                     WHERE processing_job_id = %s"""
+            qdb.sql_connection.TRN.add(sql, [previous.id])
+            outputs = qdb.sql_connection.TRN.execute_fetchindex()
+            mapping = {}
+            for out_id, a_id in outputs:
+                artifact = qdb.artifact.Artifact(a_id)
+                original = artifact.filepaths
+                sql = """SELECT filepath_id, checksum
+                         FROM qiita.filepath
+                         WHERE filepath_id IN %s"""
+                qdb.sql_connection.TRN.add(
+                    sql, [tuple(fp_id for fp_id, _, _ in original)])
+                checksums = dict(qdb.sql_connection.TRN.execute_fetchindex())
+                new = qdb.artifact.Artifact.create(
+                    [(fp, fp_type) for _, fp, fp_type in original],
+                    artifact.artifact_type, name=artifact.name,
+                    parents=self.input_artifacts,
+                    processing_parameters=self.parameters, copy_files=True,
+                    checksums=[checksums[fp_id] for fp_id, _, _ in original])
+                mapping[out_id] = new.id
+
+            sql = """INSERT INTO qiita.artifact_output_processing_job
+                        (artifact_id, processing_job_id, command_output_id)
+                     VALUES (%s, %s, %s)"""
+            qdb.sql_connection.TRN.add(
+                sql, [[aid, self.id, outid]
+                      for outid, aid in viewitems(mapping)], many=True)
+            self._update_and_launch_children(mapping)
+            self._set_status('success')
 
     def release(self):
         """Releases the job from the waiting status and creates the artifact
@@ -456,7 +1475,19 @@ class ProcessingJob(qdb.base.QiitaObject):
             return mapping
 
     def release_validators(self):
-        """Allows all the validator job spawned by this job to complete"""
+        """Allows all the validator job spawned by this job to complete
+
+        Notes
+        -----
+        The release_validators job is queued by the last validator to finish
+        (see `_trigger_release`), so usually there is nothing to wait for.
+        Otherwise, the validators announce that they are done in redis (see
+        `_set_status`), so this waits for those messages instead of polling
+        the DB. The status of the validators is still checked at least every
+        VALIDATORS_WAIT_TIMEOUT seconds, in case a message is missed. Each
+        check runs in its own transaction, so this must not be called within
+        a transaction, or it would be kept open while waiting.
+        """
         with qdb.sql_connection.TRN:
             if self.command.software.type not in ('artifact transformation',
                                                   'private'):
@@ -464,30 +1495,41 @@ class ProcessingJob(qdb.base.QiitaObject):
                     "Only artifact transformation and private jobs can "
                     "release validators")
 
-            # Check if all the validators are completed. Validator jobs can be
-            # in two states when completed: 'waiting' in case of success
-            # or 'error' otherwise
-            sql = """SELECT pjv.validator_id
-                     FROM qiita.processing_job_validator pjv
-                        JOIN qiita.processing_job pj ON
-                            pjv.validator_id = pj.processing_job_id
-                        JOIN qiita.processing_job_status USING
-                            (processing_job_status_id)
-                     WHERE pjv.processing_job_id = %s
-                        AND processing_job_status NOT IN %s"""
-            sql_args = [self.id, ('waiting', 'error')]
-            qdb.sql_connection.TRN.add(sql, sql_args)
-            validator_ids = qdb.sql_connection.TRN.execute_fetchindex()
-
-            # Active polling - wait until all validator jobs are completed
-            while validator_ids:
-                jids = ', '.join([j[0] for j in validator_ids])
-                self.step = ("Validating outputs (%d remaining) via "
-                             "job(s) %s" % (len(validator_ids), jids))
-                sleep(10)
-                qdb.sql_connection.TRN.add(sql, sql_args)
-                validator_ids = qdb.sql_connection.TRN.execute_fetchindex()
+        # Check if all the validators are completed. Validator jobs can be
+        # in two states when completed: 'waiting' in case of success
+        # or 'error' otherwise
+        sql = """SELECT pjv.validator_id
+                 FROM qiita.processing_job_validator pjv
+                    JOIN qiita.processing_job pj ON
+                        pjv.validator_id = pj.processing_job_id
+                    JOIN qiita.processing_job_status USING
+                        (processing_job_status_id)
+                 WHERE pjv.processing_job_id = %s
+                    AND processing_job_status NOT IN %s"""
+        sql_args = [self.id, ('waiting', 'error')]
+        # Subscribing before checking the DB, so no message can be missed
+        # between the check and the wait
+        pubsub = r_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(VALIDATORS_CHANNEL % self.id)
+        try:
+            remaining = None
+            while True:
+                with qdb.sql_connection.TRN:
+                    qdb.sql_connection.TRN.add(sql, sql_args)
+                    validator_ids = \
+                        qdb.sql_connection.TRN.execute_fetchflatten()
+                if not validator_ids:
+                    break
+                if len(validator_ids) != remaining:
+                    remaining = len(validator_ids)
+                    self.step = ("Validating outputs (%d remaining) via "
+                                 "job(s) %s"
+                                 % (remaining, ', '.join(validator_ids)))
+                pubsub.get_message(timeout=VALIDATORS_WAIT_TIMEOUT)
+        finally:
+            pubsub.close()
 
+        with qdb.sql_connection.TRN:
             # Check if any of the validators errored
             sql = """SELECT validator_id
                      FROM qiita.processing_job_validator pjv
@@ -711,19 +1753,19 @@ class ProcessingJob(qdb.base.QiitaObject):
 
             # Link all the validator jobs with the current job
             self._set_validator_jobs(validator_jobs)
-            # Submit all the validator jobs
-            for j in validator_jobs:
-                j.submit()
 
-            # Submit the job that will release all the validators
+            # Create the job that will release all the validators. It is
+            # queued by the last validator to finish (see `_trigger_release`)
             plugin = qdb.software.Software.from_name_and_version(
                 'Qiita', 'alpha')
             cmd = plugin.get_command('release_validators')
             params = qdb.software.Parameters.load(
                 cmd, values_dict={'job': self.id})
             job = ProcessingJob.create(self.user, params)
-        # Doing the submission outside of the transaction
-        job.submit()
+
+            # Submit all the validator jobs, or the release job if there is
+            # nothing to validate
+            ProcessingJob.batch_submit(validator_jobs or [job])
 
     def _set_validator_jobs(self, validator_jobs):
         """Sets the validator jobs for the current job
@@ -842,6 +1884,11 @@ class ProcessingJob(qdb.base.QiitaObject):
         datetime
             The last heartbeat timestamp
         """
+        # The last heartbeats are buffered in redis
+        hb = r_client.get(HEARTBEAT_KEY % self.id)
+        if hb is not None:
+            return datetime.strptime(hb, HEARTBEAT_FORMAT)
+
         with qdb.sql_connection.TRN:
             sql = """SELECT heartbeat
                      FROM qiita.processing_job
@@ -859,19 +1906,35 @@ class ProcessingJob(qdb.base.QiitaObject):
         ------
         QiitaDBOperationNotPermittedError
             If the job is already completed
+
+        Notes
+        -----
+        Only the heartbeat that moves the job to `running` is written to the
+        DB right away. The following ones are buffered in redis and written
+        to the DB in batches by `flush_heartbeats`
         """
         with qdb.sql_connection.TRN:
             status = self.status
             if status == 'queued':
                 self._set_status('running')
+                sql = """UPDATE qiita.processing_job
+                         SET heartbeat = %s
+                         WHERE processing_job_id = %s"""
+                qdb.sql_connection.TRN.add(sql, [datetime.now(), self.id])
+                # Any buffered heartbeat is older than this one
+                qdb.sql_connection.TRN.add_post_commit_func(
+                    r_client.delete, HEARTBEAT_KEY % self.id)
+                qdb.sql_connection.TRN.execute()
             elif status != 'running':
                 raise qdb.exceptions.QiitaDBOperationNotPermittedError(
                     "Can't execute heartbeat on job: already completed")
-            sql = """UPDATE qiita.processing_job
-                     SET heartbeat = %s
-                     WHERE processing_job_id = %s"""
-            qdb.sql_connection.TRN.add(sql, [datetime.now(), self.id])
-            qdb.sql_connection.TRN.execute()
+            else:
+                pipe = r_client.pipeline()
+                pipe.set(HEARTBEAT_KEY % self.id,
+                         datetime.now().strftime(HEARTBEAT_FORMAT),
+                         ex=HEARTBEAT_TTL)
+                pipe.sadd(HEARTBEAT_PENDING_KEY, self.id)
+                pipe.execute()
 
     @property
     def step(self):
@@ -954,36 +2017,50 @@ class ProcessingJob(qdb.base.QiitaObject):
             res = qdb.sql_connection.TRN.execute_fetchindex()
             new_map = {name: mapping[oid] for oid, name in res}
 
-            sql = """SELECT command_parameters, pending
-                     FROM qiita.processing_job
-                     WHERE processing_job_id = %s"""
-            sql_update = """UPDATE qiita.processing_job
-                            SET command_parameters = %s,
-                                pending = %s
-                            WHERE processing_job_id = %s"""
-            sql_link = """INSERT INTO qiita.artifact_processing_job
-                            (artifact_id, processing_job_id)
-                          VALUES (%s, %s)"""
-            for c in self.children:
-                qdb.sql_connection.TRN.add(sql, [c.id])
-                params, pending = qdb.sql_connection.TRN.execute_fetchflatten()
+            sql = """SELECT processing_job_id, command_parameters, pending
+                     FROM qiita.parent_processing_job
+                        JOIN qiita.processing_job
+                            ON child_id = processing_job_id
+                     WHERE parent_id = %s"""
+            qdb.sql_connection.TRN.add(sql, [self.id])
+            children = qdb.sql_connection.TRN.execute_fetchindex()
+            if not children:
+                return ready
+
+            update_args = []
+            link_args = []
+            for c_id, params, pending in children:
                 for pname, out_name in viewitems(pending[self.id]):
                     a_id = new_map[out_name]
                     params[pname] = a_id
-                    del pending[self.id]
                     # Link the input artifact with the child job
-                    qdb.sql_connection.TRN.add(sql_link, [a_id, c.id])
+                    link_args.append([a_id, c_id])
+                del pending[self.id]
 
                 # Force to insert a NULL in the DB if pending is empty
                 pending = pending if pending else None
-                qdb.sql_connection.TRN.add(sql_update,
-                                           [dumps(params), pending, c.id])
-                qdb.sql_connection.TRN.execute()
+                # The fingerprint changes now that the child has (some of)
+                # its actual input artifacts
+                update_args.append([dumps(params), pending,
+                                    _parameters_fingerprint(params), c_id])
 
                 if pending is None:
                     # The child already has all the parameters
                     # Add it to the ready list
-                    ready.append(c)
+                    ready.append(ProcessingJob(c_id))
+
+            sql = """UPDATE qiita.processing_job
+                     SET command_parameters = %s,
+                         pending = %s,
+                         parameters_fingerprint = %s
+                     WHERE processing_job_id = %s"""
+            qdb.sql_connection.TRN.add(sql, update_args, many=True)
+            if link_args:
+                sql = """INSERT INTO qiita.artifact_processing_job
+                            (artifact_id, processing_job_id)
+                         VALUES (%s, %s)"""
+                qdb.sql_connection.TRN.add(sql, link_args, many=True)
+            qdb.sql_connection.TRN.execute()
         return ready
 
     def _update_and_launch_children(self, mapping):
@@ -996,8 +2073,7 @@ class ProcessingJob(qdb.base.QiitaObject):
         """
         ready = self._update_children(mapping)
         # Submit all the children that already have all the input parameters
-        for c in ready:
-            c.submit()
+        ProcessingJob.batch_submit(ready)
 
     @property
     def outputs(self):
@@ -1521,11 +2597,21 @@ class ProcessingWorkflow(qdb.base.QiitaObject):
             # the root nodes
             in_degrees = g.in_degree()
             roots = []
+            children = []
             for job, degree in viewitems(in_degrees):
                 if degree == 0:
                     roots.append(job)
                 else:
-                    job._set_status('waiting')
+                    children.append(job.id)
+
+            if children:
+                sql = """UPDATE qiita.processing_job
+                         SET processing_job_status_id = %s
+                         WHERE processing_job_id IN %s"""
+                qdb.sql_connection.TRN.add(
+                    sql, [qdb.util.convert_to_id(
+                        'waiting', "processing_job_status"), tuple(children)])
 
-            for job in roots:
-                job.submit()
+            # The children are updated in the same commit that queues the
+            # roots, and all the roots are given to the scheduler at once
+            ProcessingJob.batch_submit(roots)
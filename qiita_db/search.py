@@ -28,9 +28,10 @@ from pyparsing import (alphas, nums, Word, dblQuotedString, oneOf, Optional,
                        opAssoc, CaselessLiteral, removeQuotes, Group,
                        operatorPrecedence, stringEnd)
 from collections import defaultdict
+from itertools import chain
 
 import pandas as pd
-from future.utils import viewitems
+from future.utils import viewitems, viewvalues
 from future.builtins import str
 
 from qiita_core.qiita_settings import qiita_config
@@ -167,9 +168,9 @@ class QiitaStudySearch(object):
             study_ids = set([int(sid[7:]) for sid in res])
             # strip to only studies user has access to
             if user.level not in {'admin', 'dev', 'superuser'}:
-                studies = qdb.study.Study.get_by_status('public') | \
-                    user.user_studies | user.shared_studies
-                study_ids = study_ids.intersection([s.id for s in studies])
+                study_ids = study_ids.intersection(
+                    qdb.study.Study.get_ids_by_status('public') |
+                    user.user_study_ids | user.shared_study_ids)
 
             results = {}
             # run search on each study to get out the matching samples
@@ -350,6 +351,14 @@ class QiitaStudySearch(object):
             proc_data_samples = {}
             samples_meta = {}
             headers = {c: val for c, val in enumerate(self.meta_headers)}
+            study_artifacts = qdb.artifact.Artifact.get_study_artifact_ids(
+                self.results, artifact_type='BIOM')
+            artifacts = qdb.artifact.Artifact.get_info(
+                chain.from_iterable(viewvalues(study_artifacts)),
+                ['data_type', 'prep_template_ids'])
+            # the samples of each prep template, shared across artifacts
+            PT = qdb.metadata_template.prep_template.PrepTemplate
+            pt_samples = {}
             for study_id, study_meta in viewitems(self.results):
                 # add metadata to dataframe and dict
                 # use from_dict because pandas doesn't like cursor objects
@@ -357,23 +366,22 @@ class QiitaStudySearch(object):
                     {s[0]: s[1:] for s in study_meta}, orient='index')
                 samples_meta[study_id].rename(columns=headers, inplace=True)
                 # set up study-based data needed
-                study = qdb.study.Study(study_id)
                 study_sample_ids = {s[0] for s in study_meta}
                 study_proc_ids[study_id] = defaultdict(list)
-                for artifact in study.artifacts():
-                    if artifact.artifact_type != 'BIOM':
-                        continue
-                    datatype = artifact.data_type
+                for a_id in study_artifacts[study_id]:
+                    datatype = artifacts[a_id]['data_type']
                     # skip processed data if it doesn't fit the given datatypes
                     if datatypes is not None and datatype not in datatypes:
                         continue
                     artifact_samples = set()
-                    for pt in artifact.prep_templates:
-                        artifact_samples.update(pt.keys())
+                    for pt_id in artifacts[a_id]['prep_template_ids']:
+                        if pt_id not in pt_samples:
+                            pt_samples[pt_id] = set(PT(pt_id).keys())
+                        artifact_samples.update(pt_samples[pt_id])
                     filter_samps = artifact_samples.intersection(
                         study_sample_ids)
                     if filter_samps:
-                        proc_data_samples[artifact.id] = sorted(filter_samps)
-                        study_proc_ids[study_id][datatype].append(artifact.id)
+                        proc_data_samples[a_id] = sorted(filter_samps)
+                        study_proc_ids[study_id][datatype].append(a_id)
 
             return study_proc_ids, proc_data_samples, samples_meta
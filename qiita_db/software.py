@@ -606,6 +606,47 @@ class Command(qdb.base.QiitaObject):
             qdb.sql_connection.TRN.add(sql, [self.id])
             return qdb.sql_connection.TRN.execute_fetchlast()
 
+    @property
+    def max_running_jobs(self):
+        """The maximum number of jobs of the command submitted at once
+
+        Returns
+        -------
+        int or None
+            The maximum number of jobs, None if there is no limit
+        """
+        with qdb.sql_connection.TRN:
+            sql = """SELECT max_running_jobs
+                     FROM qiita.software_command
+                     WHERE command_id = %s"""
+            qdb.sql_connection.TRN.add(sql, [self.id])
+            return qdb.sql_connection.TRN.execute_fetchlast()
+
+    @max_running_jobs.setter
+    def max_running_jobs(self, value):
+        """Sets the maximum number of jobs of the command submitted at once
+
+        Parameters
+        ----------
+        value : int or None
+            The maximum number of jobs, None to remove the limit
+
+        Raises
+        ------
+        ValueError
+            If `value` is not a positive integer
+        """
+        if value is not None and value < 1:
+            raise ValueError(
+                "The maximum number of running jobs should be a positive "
+                "integer: %s" % value)
+        with qdb.sql_connection.TRN:
+            sql = """UPDATE qiita.software_command
+                     SET max_running_jobs = %s
+                     WHERE command_id = %s"""
+            qdb.sql_connection.TRN.add(sql, [value, self.id])
+            qdb.sql_connection.TRN.execute()
+
     @property
     def naming_order(self):
         """The ordered list of parameters to use to name the output artifacts
@@ -435,6 +435,7 @@ class Transaction(object):
         self._connection = None
         self._post_commit_funcs = []
         self._post_rollback_funcs = []
+        self._cache = {}
 
     def _open_connection(self):
         # If the connection already exists and is not closed, don't do anything
@@ -763,9 +764,10 @@ class Transaction(object):
         RuntimeError
             If invoked outside a context
         """
-        # Reset the queries, the results and the index
+        # Reset the queries, the results, the index and the cache
         self._queries = []
         self._results = []
+        self._cache = {}
         try:
             self._connection.commit()
         except Exception:
@@ -783,9 +785,10 @@ class Transaction(object):
         RuntimeError
             If invoked outside a context
         """
-        # Reset the queries, the results and the index
+        # Reset the queries, the results, the index and the cache
         self._queries = []
         self._results = []
+        self._cache = {}
 
         if self._connection is not None and self._connection.closed == 0:
             try:
@@ -800,6 +803,28 @@ class Transaction(object):
     def index(self):
         return len(self._queries) + len(self._results)
 
+    @property
+    @_checker
+    def cache(self):
+        """Dictionary to memoize values during the current transaction
+
+        The cache is emptied on commit and rollback, so the values stored in
+        it are only visible while the transaction is alive. Code that
+        modifies the values used to compute a cached entry is responsible
+        of removing that entry.
+
+        Returns
+        -------
+        dict
+            The transaction cache
+
+        Raises
+        ------
+        RuntimeError
+            If invoked outside a context
+        """
+        return self._cache
+
     @_checker
     def add_post_commit_func(self, func, *args, **kwargs):
         """Adds a post commit function
@@ -119,8 +119,8 @@ class Study(qdb.base.QiitaObject):
             return qdb.sql_connection.TRN.execute_fetchflatten()
 
     @classmethod
-    def get_by_status(cls, status):
-        """Returns study id for all Studies with given status
+    def get_ids_by_status(cls, status):
+        """Returns the ids of all the studies with the given status
 
         Parameters
         ----------
@@ -129,8 +129,9 @@ class Study(qdb.base.QiitaObject):
 
         Returns
         -------
-        set of qiita_db.study.Study
-            All studies in the database that match the given status
+        set of int
+            The ids of all the studies in the current portal that match the
+            given status
         """
         with qdb.sql_connection.TRN:
             sql = """SELECT DISTINCT study_id
@@ -156,7 +157,28 @@ class Study(qdb.base.QiitaObject):
                 studies = studies.union(
                     qdb.sql_connection.TRN.execute_fetchflatten())
 
-            return set(cls(sid) for sid in studies)
+            return studies
+
+    @classmethod
+    def get_by_status(cls, status):
+        """Returns study id for all Studies with given status
+
+        Parameters
+        ----------
+        status : str
+            Status setting to search for
+
+        Returns
+        -------
+        set of qiita_db.study.Study
+            All studies in the database that match the given status
+
+        See Also
+        --------
+        get_ids_by_status
+        """
+        with qdb.sql_connection.TRN:
+            return set(cls(sid) for sid in cls.get_ids_by_status(status))
 
     @classmethod
     def get_info(cls, study_ids=None, info_cols=None):
@@ -340,6 +362,8 @@ class Study(qdb.base.QiitaObject):
 
             qdb.sql_connection.TRN.execute()
 
+            qdb.util.update_study_listing_summary([study_id])
+
             return cls(study_id)
 
     @classmethod
@@ -386,10 +410,15 @@ class Study(qdb.base.QiitaObject):
             sql = "DELETE FROM qiita.per_study_tags WHERE study_id = %s"
             qdb.sql_connection.TRN.add(sql, args)
 
+            sql = """DELETE FROM qiita.study_listing_summary
+                     WHERE study_id = %s"""
+            qdb.sql_connection.TRN.add(sql, args)
+
             sql = "DELETE FROM qiita.study WHERE study_id = %s"
             qdb.sql_connection.TRN.add(sql, args)
 
             qdb.sql_connection.TRN.execute()
+            qdb.sql_connection.TRN.cache.pop('study_access', None)
 
     @classmethod
     def get_tags(cls):
@@ -621,6 +650,8 @@ class Study(qdb.base.QiitaObject):
             qdb.sql_connection.TRN.add(sql, sql_args, many=True)
             qdb.sql_connection.TRN.execute()
 
+            qdb.util.update_study_listing_summary([self._id])
+
     @property
     def investigation(self):
         """ Returns Investigation this study is part of
@@ -981,19 +1012,49 @@ class Study(qdb.base.QiitaObject):
         -------
         bool
             Whether user has access to study or not
+
+        Notes
+        -----
+        The decision is memoized in the transaction cache, under
+        'study_access'. Any method that changes who can see a study must
+        remove that entry from the cache.
         """
         with qdb.sql_connection.TRN:
             # if admin or superuser, just return true
             if user.level in {'superuser', 'admin'}:
                 return True
 
-            if no_public:
-                study_set = user.user_studies | user.shared_studies
-            else:
-                study_set = user.user_studies | user.shared_studies | \
-                    self.get_by_status('public')
-
-            return self in study_set
+            access = qdb.sql_connection.TRN.cache.setdefault(
+                'study_access', {})
+            key = (self._id, user.id, no_public)
+            if key not in access:
+                # The user has access if it is the owner, the study is shared
+                # with the user or, if no_public is false, the study is public
+                sql = """SELECT EXISTS(
+                            SELECT *
+                            FROM qiita.study
+                                JOIN qiita.study_portal USING (study_id)
+                                JOIN qiita.portal_type USING (portal_type_id)
+                            WHERE study_id = %s AND portal = %s AND (
+                                email = %s OR study_id IN (
+                                    SELECT study_id
+                                    FROM qiita.study_users
+                                    WHERE email = %s){0}))"""
+                sql_args = [self._id, qiita_config.portal, user.id, user.id]
+                public_sql = ""
+                if not no_public:
+                    public_sql = """ OR study_id IN (
+                                    SELECT study_id
+                                    FROM qiita.study_artifact
+                                        JOIN qiita.artifact
+                                            USING (artifact_id)
+                                        JOIN qiita.visibility
+                                            USING (visibility_id)
+                                    WHERE visibility = 'public')"""
+                qdb.sql_connection.TRN.add(sql.format(public_sql), sql_args)
+                access[key] = qdb.sql_connection.TRN.execute_fetchlast()
+
+            return access[key]
 
     def can_edit(self, user):
         """Returns whether the given user can edit the study
@@ -1033,6 +1094,9 @@ class Study(qdb.base.QiitaObject):
                      VALUES (%s, %s)"""
             qdb.sql_connection.TRN.add(sql, [self._id, user.id])
             qdb.sql_connection.TRN.execute()
+            qdb.sql_connection.TRN.cache.pop('study_access', None)
+
+            qdb.util.update_study_listing_summary([self._id])
 
     def unshare(self, user):
         """Unshare the study with another user
@@ -1047,6 +1111,9 @@ class Study(qdb.base.QiitaObject):
                      WHERE study_id = %s AND email = %s"""
             qdb.sql_connection.TRN.add(sql, [self._id, user.id])
             qdb.sql_connection.TRN.execute()
+            qdb.sql_connection.TRN.cache.pop('study_access', None)
+
+            qdb.util.update_study_listing_summary([self._id])
 
     def update_tags(self, user, tags):
         """Sets the tags of the study
@@ -1112,6 +1179,7 @@ class Study(qdb.base.QiitaObject):
                         qdb.sql_connection.TRN.add(sql, sql_args, many=True)
 
                 qdb.sql_connection.TRN.execute()
+                qdb.util.update_study_listing_summary([self._id])
         else:
             message = 'No changes in the tags.'
 
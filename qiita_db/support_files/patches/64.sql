@@ -0,0 +1,22 @@
+-- October 19th, 2026
+-- Adding a per-study summary table used to list the studies. It holds the
+-- values that were computed with correlated subqueries on every listing and
+-- it is kept up to date by the methods that modify those values (see
+-- qiita_db.util.update_study_listing_summary). The table is populated in the
+-- python patch.
+
+CREATE TABLE qiita.study_listing_summary (
+	study_id             bigint  NOT NULL,
+	number_samples_collected bigint DEFAULT 0 NOT NULL,
+	artifact_biom_ids    bigint[]  ,
+	publications         json[]  ,
+	shared_with_name     varchar[]  ,
+	shared_with_email    varchar[]  ,
+	study_tags           varchar[]  ,
+	owner                varchar  ,
+	CONSTRAINT pk_study_listing_summary PRIMARY KEY ( study_id )
+ ) ;
+
+ALTER TABLE qiita.study_listing_summary ADD CONSTRAINT fk_study_listing_summary_study FOREIGN KEY ( study_id ) REFERENCES qiita.study( study_id );
+
+COMMENT ON TABLE qiita.study_listing_summary IS 'Per study values shown in the study listing, refreshed every time they change';
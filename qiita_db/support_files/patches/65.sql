@@ -0,0 +1,20 @@
+-- October 19th, 2026
+-- Keeping track of the verification of the checksums of the stored files
+-- (see qiita_db.meta_util.verify_filepaths). Files that have never been
+-- verified don't have a row in this table.
+
+CREATE TABLE qiita.filepath_verification (
+	filepath_id          bigint  NOT NULL,
+	last_verified        timestamp  NOT NULL,
+	status               varchar  NOT NULL,
+	observed_checksum    varchar  ,
+	CONSTRAINT pk_filepath_verification PRIMARY KEY ( filepath_id ),
+	CONSTRAINT chk_filepath_verification_status CHECK ( status IN ('ok', 'missing', 'mismatch') )
+ ) ;
+
+CREATE INDEX idx_filepath_verification_last_verified ON qiita.filepath_verification ( last_verified ) ;
+
+ALTER TABLE qiita.filepath_verification ADD CONSTRAINT fk_filepath_verification_filepath FOREIGN KEY ( filepath_id ) REFERENCES qiita.filepath( filepath_id ) ON DELETE CASCADE;
+
+COMMENT ON TABLE qiita.filepath_verification IS 'Result of the last checksum verification of each stored file';
+COMMENT ON COLUMN qiita.filepath_verification.observed_checksum IS 'The checksum computed in the last verification, NULL if the file is missing';
@@ -0,0 +1,52 @@
+-- October 19th, 2026
+-- Content-addressed storage of the files in the mountpoints flagged as
+-- content_addressed: the contents of each file are stored once as a blob
+-- (mountpoint/blobs/...) and the files of the objects are hard links to the
+-- blobs (see qiita_db.util.insert_filepaths). The reference count of each
+-- blob is kept up to date by a trigger on qiita.filepath and the blobs with
+-- no references are removed by qiita_db.util.purge_filepaths.
+
+ALTER TABLE qiita.data_directory ADD content_addressed bool DEFAULT FALSE NOT NULL;
+
+CREATE TABLE qiita.filepath_blob (
+	blob_id              bigserial  NOT NULL,
+	data_directory_id    bigint  NOT NULL,
+	checksum             varchar  NOT NULL,
+	size                 bigint  NOT NULL,
+	reference_count      integer DEFAULT 0 NOT NULL,
+	CONSTRAINT pk_filepath_blob PRIMARY KEY ( blob_id )
+ ) ;
+
+CREATE INDEX idx_filepath_blob_checksum ON qiita.filepath_blob ( data_directory_id, checksum, size ) ;
+
+CREATE INDEX idx_filepath_blob_reference_count ON qiita.filepath_blob ( reference_count ) ;
+
+ALTER TABLE qiita.filepath_blob ADD CONSTRAINT fk_filepath_blob_data_directory FOREIGN KEY ( data_directory_id ) REFERENCES qiita.data_directory( data_directory_id ) ON DELETE RESTRICT ON UPDATE RESTRICT;
+
+ALTER TABLE qiita.filepath ADD blob_id bigint ;
+
+CREATE INDEX idx_filepath_blob_id ON qiita.filepath ( blob_id ) ;
+
+ALTER TABLE qiita.filepath ADD CONSTRAINT fk_filepath_blob FOREIGN KEY ( blob_id ) REFERENCES qiita.filepath_blob( blob_id ) ON DELETE RESTRICT ON UPDATE RESTRICT;
+
+COMMENT ON COLUMN qiita.data_directory.content_addressed IS 'Whether the files of this mountpoint are stored as deduplicated blobs';
+COMMENT ON TABLE qiita.filepath_blob IS 'The contents of the files stored in the content addressed mountpoints';
+COMMENT ON COLUMN qiita.filepath_blob.reference_count IS 'Number of rows of qiita.filepath using this blob';
+
+CREATE OR REPLACE FUNCTION qiita.update_blob_reference_count() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.blob_id IS NOT NULL THEN
+        UPDATE qiita.filepath_blob SET reference_count = reference_count + 1
+            WHERE blob_id = NEW.blob_id;
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.blob_id IS NOT NULL THEN
+        UPDATE qiita.filepath_blob SET reference_count = reference_count - 1
+            WHERE blob_id = OLD.blob_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER filepath_blob_reference_count
+    AFTER INSERT OR DELETE OR UPDATE OF blob_id ON qiita.filepath
+    FOR EACH ROW EXECUTE PROCEDURE qiita.update_blob_reference_count();
@@ -0,0 +1,11 @@
+-- October 19th, 2026
+-- Adding a fingerprint of the parameters of the jobs, so the duplicated jobs
+-- can be found with an index lookup (see
+-- qiita_db.processing_job.ProcessingJob.create). The fingerprint of the
+-- existing jobs is computed in python_patches/67.py
+
+ALTER TABLE qiita.processing_job ADD parameters_fingerprint varchar ;
+
+CREATE INDEX idx_processing_job_parameters_fingerprint ON qiita.processing_job ( command_id, parameters_fingerprint ) ;
+
+COMMENT ON COLUMN qiita.processing_job.parameters_fingerprint IS 'Hash of the normalized parameters of the job, NULL if the job can not be a duplicate';
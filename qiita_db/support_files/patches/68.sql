@@ -0,0 +1,10 @@
+-- October 19th, 2026
+-- Adding the key used to find previous jobs with the same command, parameters
+-- and input contents, whose outputs can be reused (see
+-- qiita_db.processing_job.ProcessingJob.submit)
+
+ALTER TABLE qiita.processing_job ADD memoization_key varchar ;
+
+CREATE INDEX idx_processing_job_memoization_key ON qiita.processing_job ( memoization_key ) ;
+
+COMMENT ON COLUMN qiita.processing_job.memoization_key IS 'Hash of the command, parameters and contents of the inputs of the job. NULL if the outputs of the job can not be reused';
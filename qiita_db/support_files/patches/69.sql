@@ -0,0 +1,27 @@
+-- October 19th, 2026
+-- Adding the queue of the job scheduler (see
+-- qiita_db.processing_job.schedule_jobs). A queued job stays in this table
+-- without a dispatched timestamp until the scheduler submits it, so the jobs
+-- waiting in the scheduler can be told apart from the jobs lost by the
+-- cluster. Also adding the maximum number of jobs of each command that can be
+-- submitted at the same time
+
+CREATE TABLE qiita.processing_job_schedule (
+	processing_job_id    uuid  NOT NULL,
+	priority             integer  NOT NULL,
+	enqueued             timestamp DEFAULT current_timestamp NOT NULL,
+	dispatched           timestamp  ,
+	CONSTRAINT pk_processing_job_schedule PRIMARY KEY ( processing_job_id )
+ ) ;
+
+CREATE INDEX idx_processing_job_schedule_dispatched ON qiita.processing_job_schedule ( dispatched ) ;
+
+ALTER TABLE qiita.processing_job_schedule ADD CONSTRAINT fk_processing_job_schedule_job FOREIGN KEY ( processing_job_id ) REFERENCES qiita.processing_job( processing_job_id )    ;
+
+COMMENT ON COLUMN qiita.processing_job_schedule.priority IS 'Priority class of the job, lower values are submitted first';
+
+COMMENT ON COLUMN qiita.processing_job_schedule.dispatched IS 'When the job was submitted by the scheduler, NULL while it is waiting';
+
+ALTER TABLE qiita.software_command ADD max_running_jobs integer ;
+
+COMMENT ON COLUMN qiita.software_command.max_running_jobs IS 'Maximum number of jobs of the command submitted at the same time, NULL if there is no limit';
@@ -0,0 +1,22 @@
+-- October 19th, 2026
+-- Add the reuse_memoized_job internal Qiita command, which copies the outputs
+-- of a previous job into a memoized job (see
+-- qiita_db.processing_job.ProcessingJob.batch_submit)
+
+DO $do$
+DECLARE
+    qiita_sw_id     bigint;
+    rm_cmd_id       bigint;
+BEGIN
+    SELECT software_id INTO qiita_sw_id
+        FROM qiita.software
+        WHERE name = 'Qiita' AND version = 'alpha';
+
+    INSERT INTO qiita.software_command (software_id, name, description)
+        VALUES (qiita_sw_id, 'reuse_memoized_job', 'Reuses the outputs of a previous job')
+        RETURNING command_id INTO rm_cmd_id;
+
+    INSERT INTO qiita.command_parameter (command_id, parameter_name, parameter_type, required, default_value)
+        VALUES (rm_cmd_id, 'job', 'string', True, NULL),
+               (rm_cmd_id, 'previous', 'string', True, NULL);
+END $do$;
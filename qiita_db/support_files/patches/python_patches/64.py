@@ -0,0 +1,11 @@
+# October 19th, 2026
+# Populating the study listing summary table for all the existing studies
+
+from qiita_db.sql_connection import TRN
+from qiita_db.util import update_study_listing_summary
+
+with TRN:
+    TRN.add("SELECT study_id FROM qiita.study")
+    study_ids = TRN.execute_fetchflatten()
+    if study_ids:
+        update_study_listing_summary(study_ids)
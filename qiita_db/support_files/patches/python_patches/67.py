@@ -0,0 +1,16 @@
+# October 19th, 2026
+# Computing the parameters fingerprint of the existing jobs
+
+from qiita_db.sql_connection import TRN
+from qiita_db.processing_job import _parameters_fingerprint
+
+with TRN:
+    TRN.add("""SELECT processing_job_id, command_parameters
+               FROM qiita.processing_job""")
+    sql_args = [[_parameters_fingerprint(params), job_id]
+                for job_id, params in TRN.execute_fetchindex()]
+    if sql_args:
+        TRN.add("""UPDATE qiita.processing_job
+                   SET parameters_fingerprint = %s
+                   WHERE processing_job_id = %s""", sql_args, many=True)
+        TRN.execute()
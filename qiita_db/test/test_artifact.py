@@ -20,6 +20,7 @@ from biom import example_table as et
 from biom.util import biom_open
 
 from qiita_core.util import qiita_test_checker
+from qiita_core.qiita_settings import r_client
 import qiita_db as qdb
 
 
@@ -43,6 +44,43 @@ class ArtifactTestsReadOnly(TestCase):
         exp = []
         self.assertEqual(obs, exp)
 
+    def test_get_info(self):
+        obs = qdb.artifact.Artifact.get_info(
+            [1, 4], ['artifact_type', 'visibility', 'study_id', 'parent_ids',
+                     'prep_template_ids', 'command_name'])
+        exp = {1: {'artifact_type': 'FASTQ', 'visibility': 'private',
+                   'study_id': 1, 'parent_ids': [], 'prep_template_ids': [1],
+                   'command_name': None},
+               4: {'artifact_type': 'BIOM', 'visibility': 'private',
+                   'study_id': 1, 'parent_ids': [2], 'prep_template_ids': [1],
+                   'command_name': 'Pick closed-reference OTUs'}}
+        self.assertEqual(obs, exp)
+
+        obs = qdb.artifact.Artifact.get_info([1], ['filepaths'])
+        exp = {1: {'filepaths': qdb.artifact.Artifact(1).filepaths}}
+        self.assertEqual(obs, exp)
+
+        obs = qdb.artifact.Artifact.get_info([2])[2]
+        self.assertEqual(obs['data_type'], '18S')
+        self.assertEqual(obs['parent_ids'], [1])
+        self.assertIsNone(obs['analysis_id'])
+        self.assertEqual(obs['command_parameters']['input_data'], 1)
+
+        self.assertEqual(qdb.artifact.Artifact.get_info([]), {})
+
+    def test_get_info_error(self):
+        with self.assertRaises(ValueError):
+            qdb.artifact.Artifact.get_info([1], ['not_a_field'])
+        with self.assertRaises(qdb.exceptions.QiitaDBUnknownIDError):
+            qdb.artifact.Artifact.get_info([1, 1000], ['name'])
+
+    def test_get_study_artifact_ids(self):
+        obs = qdb.artifact.Artifact.get_study_artifact_ids([1, 1000])
+        self.assertEqual(obs, {1: [1, 2, 3, 4, 5, 6, 7], 1000: []})
+        obs = qdb.artifact.Artifact.get_study_artifact_ids(
+            [1], artifact_type='BIOM')
+        self.assertEqual(obs, {1: [4, 5, 6, 7]})
+
     def test_create_type(self):
         obs = qdb.artifact.Artifact.types()
         exp = [['BIOM', 'BIOM table', False, False, True],
@@ -339,6 +377,17 @@ class ArtifactTestsReadOnly(TestCase):
         obs_edges = obs.edges()
         self.assertItemsEqual(obs_edges, [])
 
+    def test_ancestor_ids(self):
+        self.assertEqual(qdb.artifact.Artifact(1).ancestor_ids, set())
+        self.assertEqual(qdb.artifact.Artifact(2).ancestor_ids, {1})
+        self.assertEqual(qdb.artifact.Artifact(4).ancestor_ids, {1, 2})
+
+    def test_descendant_ids(self):
+        self.assertEqual(qdb.artifact.Artifact(1).descendant_ids,
+                         {2, 3, 4, 5, 6})
+        self.assertEqual(qdb.artifact.Artifact(2).descendant_ids, {4, 5, 6})
+        self.assertEqual(qdb.artifact.Artifact(4).descendant_ids, set())
+
     def test_descendants_with_jobs(self):
         A = qdb.artifact.Artifact
         obs = A(1).descendants_with_jobs
@@ -1022,6 +1071,31 @@ class ArtifactTests(TestCase):
         with self.assertRaises(qdb.exceptions.QiitaDBUnknownIDError):
             qdb.artifact.Artifact(test.id)
 
+    def test_lineage_cache(self):
+        key = 'lineage:study:1'
+        r_client.delete(key)
+        self.assertEqual(qdb.artifact.Artifact(1).descendant_ids,
+                         {2, 3, 4, 5, 6})
+        self.assertIsNotNone(r_client.get(key))
+
+        parameters = qdb.software.Parameters.from_default_params(
+            qdb.software.DefaultParameters(1), {'input_data': 4})
+        test = qdb.artifact.Artifact.create(
+            self.filepaths_processed, "Demultiplexed",
+            parents=[qdb.artifact.Artifact(4)],
+            processing_parameters=parameters)
+        self._clean_up_files.extend([fp for _, fp, _ in test.filepaths])
+        # The cache has been invalidated by the new artifact
+        self.assertIsNone(r_client.get(key))
+        self.assertEqual(qdb.artifact.Artifact(1).descendant_ids,
+                         {2, 3, 4, 5, 6, test.id})
+        self.assertEqual(test.ancestor_ids, {1, 2, 4})
+
+        qdb.artifact.Artifact.delete(test.id)
+        self.assertIsNone(r_client.get(key))
+        self.assertEqual(qdb.artifact.Artifact(1).descendant_ids,
+                         {2, 3, 4, 5, 6})
+
     def test_delete_with_html(self):
         fd, html_fp = mkstemp(suffix=".html")
         close(fd)
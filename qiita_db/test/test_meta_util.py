@@ -11,6 +11,7 @@ import numpy.testing as npt
 from tarfile import open as topen
 from os import remove
 from os.path import exists, join
+from itertools import chain
 
 import pandas as pd
 
@@ -225,7 +226,8 @@ class MetaUtilTests(TestCase):
             ('lat_longs', EXP_LAT_LONG, r_client.get),
             ('num_studies_ebi', '1', r_client.get),
             ('num_samples_ebi', '27', r_client.get),
-            ('number_samples_ebi_prep', '54', r_client.get)
+            ('number_samples_ebi_prep', '54', r_client.get),
+            ('job_submission', '{}', r_client.get)
             # not testing img/time for simplicity
             # ('img', r_client.get),
             # ('time', r_client.get)
@@ -392,6 +394,36 @@ class MetaUtilTests(TestCase):
                         "UPDATE settings SET base_data_dir = '%s'" % obdr)
                     bdr = qdb.sql_connection.TRN.execute()
 
+    def test_verify_filepaths(self):
+        n_files = qdb.util.get_count('qiita.filepath')
+
+        # no time to start any batch
+        obs = qdb.meta_util.verify_filepaths(max_seconds=0)
+        self.assertEqual(obs, {'ok': [], 'missing': [], 'mismatch': []})
+
+        # only one file is read if the budget is exhausted
+        obs = qdb.meta_util.verify_filepaths(batch_size=5, max_bytes=1)
+        self.assertEqual(len(obs['ok']) + len(obs['mismatch']), 1)
+        first = set(chain.from_iterable(obs.values()))
+        report = qdb.meta_util.get_filepaths_integrity_report()
+        self.assertEqual(report['summary']['never_verified'],
+                         n_files - len(first))
+
+        # the next run verifies all the files
+        obs = qdb.meta_util.verify_filepaths(batch_size=5)
+        verified = list(chain.from_iterable(obs.values()))
+        self.assertEqual(len(verified), n_files)
+        self.assertEqual(len(set(verified)), n_files)
+
+        report = qdb.meta_util.get_filepaths_integrity_report()
+        self.assertEqual(report['summary']['never_verified'], 0)
+        self.assertEqual(report['summary']['missing'], len(obs['missing']))
+        self.assertEqual(report['summary']['mismatch'], len(obs['mismatch']))
+        self.assertIsNotNone(report['oldest_verification'])
+        self.assertEqual(
+            sorted(p['filepath_id'] for p in report['problems']),
+            sorted(obs['missing'] + obs['mismatch']))
+
 
 EXP_LAT_LONG = (
     '[[60.1102854322, 74.7123248382], [23.1218032799, 42.838497795],'
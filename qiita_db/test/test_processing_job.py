@@ -8,18 +8,20 @@
 
 from unittest import TestCase, main
 from datetime import datetime
-from os.path import join
-from os import close
+from os.path import join, exists
+from os import close, remove
 from tempfile import mkstemp
 from json import dumps, loads
-from time import sleep
+from time import sleep, time
+from multiprocessing import Process
 
+from mock import patch
 import networkx as nx
 import pandas as pd
 
 import qiita_db as qdb
 from qiita_core.util import qiita_test_checker
-from qiita_core.qiita_settings import qiita_config
+from qiita_core.qiita_settings import qiita_config, r_client
 
 
 def _create_job(force=True):
@@ -44,6 +46,14 @@ def _create_job(force=True):
 
 @qiita_test_checker()
 class ProcessingJobUtilTest(TestCase):
+    def setUp(self):
+        self._clean_up_files = []
+
+    def tearDown(self):
+        for fp in self._clean_up_files:
+            if exists(fp):
+                remove(fp)
+
     def test_system_call(self):
         obs_out, obs_err, obs_status = qdb.processing_job._system_call(
             'echo "Test system call stdout"')
@@ -59,6 +69,59 @@ class ProcessingJobUtilTest(TestCase):
         self.assertEqual(obs_err, "Test system call stderr\n")
         self.assertEqual(obs_status, 1)
 
+    def test_system_call_no_shell(self):
+        obs_out, obs_err, obs_status = qdb.processing_job._system_call(
+            ['echo', 'Test system call; exit 1'])
+        self.assertEqual(obs_out, "Test system call; exit 1\n")
+        self.assertEqual(obs_err, "")
+        self.assertEqual(obs_status, 0)
+
+    def test_system_call_log(self):
+        fd, log_fp = mkstemp(suffix='.log')
+        close(fd)
+        self._clean_up_files.extend(
+            [log_fp] + ['%s.%d' % (log_fp, i) for i in range(1, 4)])
+        cmd = ('for i in $(seq 1 100); do echo "line $i"; done; '
+               '>&2 echo "Test system call stderr"; exit 2')
+        with patch('qiita_db.processing_job.SYSTEM_CALL_TAIL_SIZE', 24), \
+                patch('qiita_db.processing_job.SYSTEM_CALL_LOG_SIZE', 100), \
+                patch('qiita_db.processing_job.SYSTEM_CALL_LOG_BACKUPS', 2):
+            obs_out, obs_err, obs_status = qdb.processing_job._system_call(
+                cmd, log_fp=log_fp)
+        # Only the end of the output is kept in memory
+        self.assertEqual(obs_out, "ine 98\nline 99\nline 100\n")
+        self.assertEqual(obs_err, "Test system call stderr\n")
+        self.assertEqual(obs_status, 2)
+        # The log is rotated, keeping the last files
+        self.assertTrue(exists('%s.1' % log_fp))
+        self.assertTrue(exists('%s.2' % log_fp))
+        self.assertFalse(exists('%s.3' % log_fp))
+        obs = ''
+        for fp in ['%s.2' % log_fp, '%s.1' % log_fp, log_fp]:
+            with open(fp) as f:
+                obs += f.read()
+        self.assertIn("line 100\n", obs)
+        self.assertIn("Test system call stderr\n", obs)
+        self.assertNotIn("line 1\n", obs)
+
+    def test_system_call_log_error(self):
+        fd, fp = mkstemp()
+        close(fd)
+        remove(fp)
+        # The command is not run if the log can't be opened
+        with self.assertRaises(IOError):
+            qdb.processing_job._system_call(
+                ['touch', fp], log_fp='/surprised/if/this/path/exists.log')
+        self.assertFalse(exists(fp))
+
+    def test_system_call_timeout(self):
+        obs_out, obs_err, obs_status = qdb.processing_job._system_call(
+            'echo "Test system call stdout"; sleep 10', timeout=1)
+        self.assertEqual(obs_out, "Test system call stdout\n")
+        self.assertEqual(obs_err,
+                         "\nThe command timed out after 1 seconds")
+        self.assertNotEqual(obs_status, 0)
+
     def test_job_submitter(self):
         # The cmd parameter of the function should be the command that
         # actually executes the function. However, in order to avoid executing
@@ -67,7 +130,10 @@ class ProcessingJobUtilTest(TestCase):
         # it doesn't raise an error
         job = _create_job()
         cmd = 'echo "Test system call stdout"'
-        qdb.processing_job._job_submitter(job.id, cmd)
+        self.assertTrue(qdb.processing_job._job_submitter(job.id, cmd))
+        # The log of a successful submission is not kept
+        self.assertFalse(exists(
+            qdb.processing_job._job_submission_log_fp(job.id)))
 
     def test_job_submitter_error(self):
         # Same comment as above, but here we are going to force failure, and
@@ -76,9 +142,216 @@ class ProcessingJobUtilTest(TestCase):
         cmd = '>&2  echo "Test system call stderr"; exit 1'
         qdb.processing_job._job_submitter(job.id, cmd)
         self.assertEqual(job.status, 'error')
+        log_fp = qdb.processing_job._job_submission_log_fp(job.id)
+        self._clean_up_files.append(log_fp)
         exp = ("Error submitting job:\nStd output:\nStd error:"
-               "Test system call stderr\n")
+               "Test system call stderr\n\nComplete output: %s" % log_fp)
         self.assertEqual(job.log.msg, exp)
+        with open(log_fp) as f:
+            self.assertEqual(f.read(), "Test system call stderr\n")
+
+    def test_parameters_fingerprint(self):
+        fingerprint = qdb.processing_job._parameters_fingerprint
+        obs = fingerprint({'opt1': True, 'opt2': 'Golay_12', 'opt3': 1.5})
+        # Values are compared as case insensitive text
+        self.assertEqual(
+            fingerprint({'opt3': '1.5', 'opt2': 'golay_12', 'opt1': 'TRUE'}),
+            obs)
+        self.assertNotEqual(
+            fingerprint({'opt1': False, 'opt2': 'Golay_12', 'opt3': 1.5}),
+            obs)
+        # Null and list values can't be compared
+        self.assertIsNone(fingerprint({'opt1': True, 'opt2': None}))
+        self.assertIsNone(fingerprint({'opt1': True, 'opt2': ['job', 'out']}))
+
+    def test_job_submission_executor(self):
+        executor = qdb.processing_job.JobSubmissionExecutor(
+            2, 2, {'QIIME': 1})
+        job_ok = _create_job()
+        job_error = _create_job()
+        executor.submit(job_ok.id, 'echo "Test system call stdout"', 'QIIME')
+        executor.submit(job_error.id,
+                        '>&2  echo "Test system call stderr"; exit 1',
+                        'QIIME')
+
+        for _ in range(100):
+            obs = executor.stats()['QIIME']
+            if obs['submitted'] + obs['failed'] == 2:
+                break
+            sleep(0.1)
+        exp = {'pending': 0, 'running': 0, 'submitted': 1, 'failed': 1}
+        self.assertEqual(obs, exp)
+        # The failure is recorded in the job
+        self.assertEqual(job_error.status, 'error')
+        self.assertEqual(job_ok.status, 'in_construction')
+        # The metrics are published for the other processes
+        for _ in range(100):
+            obs = qdb.processing_job.submission_stats()
+            if obs == {'QIIME': exp}:
+                break
+            sleep(0.1)
+        self.assertEqual(obs, {'QIIME': exp})
+        executor.shutdown()
+        self.assertEqual(qdb.processing_job.submission_stats(), {})
+
+    def test_job_submission_executor_full(self):
+        executor = qdb.processing_job.JobSubmissionExecutor(1, 1)
+        jobs = [_create_job(), _create_job()]
+        self.assertTrue(executor.submit(jobs[0].id, 'sleep 0.5', 'QIIME'))
+        # The queue is full, and submit doesn't wait for room
+        start = time()
+        self.assertFalse(executor.submit(jobs[1].id, 'true', 'QIIME'))
+        self.assertLess(time() - start, 0.5)
+        executor.shutdown()
+        self.assertEqual(executor.stats()['QIIME']['submitted'], 1)
+
+    def test_schedule_jobs_executor_full(self):
+        job = _create_job()
+        sql = """SELECT dispatched
+                 FROM qiita.processing_job_schedule
+                 WHERE processing_job_id = %s"""
+        with patch('qiita_db.processing_job.get_submission_executor') as ex:
+            ex.return_value.submit.return_value = False
+            job.submit()
+            # The job goes back to the scheduler
+            self.assertEqual(job.status, 'queued')
+            self.assertIsNone(
+                self.conn_handler.execute_fetchone(sql, [job.id])[0])
+            self.assertEqual(qdb.processing_job.schedule_jobs(), [])
+
+            # and it is submitted once there is room
+            ex.return_value.submit.return_value = True
+            self.assertEqual(qdb.processing_job.schedule_jobs(), [job.id])
+            self.assertIsNotNone(
+                self.conn_handler.execute_fetchone(sql, [job.id])[0])
+
+    def test_submission_stats(self):
+        key = qdb.processing_job.JOB_SUBMISSION_STATS_KEY
+        r_client.hset(key, 'host1:1', dumps(
+            {'QIIME': {'pending': 1, 'running': 2, 'submitted': 3,
+                       'failed': 0}}))
+        r_client.hset(key, 'host2:1', dumps(
+            {'QIIME': {'pending': 0, 'running': 1, 'submitted': 1,
+                       'failed': 1},
+             'Qiita': {'pending': 0, 'running': 0, 'submitted': 5,
+                       'failed': 0}}))
+        exp = {'QIIME': {'pending': 1, 'running': 3, 'submitted': 4,
+                         'failed': 1},
+               'Qiita': {'pending': 0, 'running': 0, 'submitted': 5,
+                         'failed': 0}}
+        try:
+            self.assertEqual(qdb.processing_job.submission_stats(), exp)
+        finally:
+            r_client.delete(key)
+
+    def test_job_submission_executor_shutdown(self):
+        executor = qdb.processing_job.JobSubmissionExecutor(
+            1, 3, {'QIIME': 1})
+        jobs = [_create_job() for _ in range(3)]
+        for job in jobs:
+            executor.submit(job.id, 'sleep 0.1; exit 1', 'QIIME')
+        # shutdown waits for all the queued submissions
+        executor.shutdown()
+        exp = {'pending': 0, 'running': 0, 'submitted': 0, 'failed': 3}
+        self.assertEqual(executor.stats()['QIIME'], exp)
+        for job in jobs:
+            self.assertEqual(job.status, 'error')
+        # Shutting down an idle executor does nothing
+        executor.shutdown()
+
+    def test_schedule_jobs(self):
+        sql = """SELECT COUNT(*)
+                 FROM qiita.processing_job
+                    JOIN qiita.processing_job_status
+                        USING (processing_job_status_id)
+                 WHERE processing_job_status IN ('queued', 'running')"""
+        running = self.conn_handler.execute_fetchone(sql)[0]
+        params = _create_job().parameters
+        jobs = [qdb.processing_job.ProcessingJob.create(
+            qdb.user.User('test@foo.bar'), params, force=True)
+            for _ in range(3)]
+        other_job = qdb.processing_job.ProcessingJob.create(
+            qdb.user.User('shared@foo.bar'), params, force=True)
+        private_job = qdb.processing_job.ProcessingJob.create(
+            qdb.user.User('test@foo.bar'),
+            qdb.software.Parameters.load(
+                qdb.software.Software.from_name_and_version(
+                    'Qiita', 'alpha').get_command('delete_study'),
+                values_dict={'study': 1}), force=True)
+        self.assertEqual(jobs[0]._priority(),
+                         qdb.processing_job.JOB_PRIORITY_DEFAULT)
+        self.assertEqual(private_job._priority(),
+                         qdb.processing_job.JOB_PRIORITY_PRIVATE)
+
+        with patch('qiita_db.processing_job.get_submission_executor') as ex, \
+                patch('qiita_db.processing_job.qiita_config.max_running_jobs',
+                      running + 2):
+            for job in jobs + [other_job, private_job]:
+                job.submit()
+            # The private jobs are not limited
+            obs = [c[0][0] for c in ex.return_value.submit.call_args_list]
+            self.assertEqual(obs, [jobs[0].id, jobs[1].id, private_job.id])
+            for job in jobs + [other_job]:
+                self.assertEqual(job.status, 'queued')
+            # The jobs waiting in the scheduler are stored in the DB
+            sql = """SELECT processing_job_id
+                     FROM qiita.processing_job_schedule
+                     WHERE dispatched IS NULL"""
+            obs = [r[0] for r in self.conn_handler.execute_fetchall(sql)]
+            self.assertItemsEqual(obs, [jobs[2].id, other_job.id])
+            self.assertEqual(qdb.processing_job.schedule_jobs(), [])
+
+            # The user with fewer jobs in the cluster goes first, even if
+            # its job is newer
+            jobs[0]._set_status('success')
+            self.assertEqual(qdb.processing_job.schedule_jobs(),
+                             [other_job.id])
+
+            # The limit of the command applies to all the jobs
+            jobs[1]._set_status('success')
+            params.command.max_running_jobs = 1
+            self.assertEqual(qdb.processing_job.schedule_jobs(), [])
+            params.command.max_running_jobs = None
+            self.assertEqual(qdb.processing_job.schedule_jobs(),
+                             [jobs[2].id])
+            obs = [c[0][0] for c in ex.return_value.submit.call_args_list]
+            self.assertEqual(obs, [jobs[0].id, jobs[1].id, private_job.id,
+                                   other_job.id, jobs[2].id])
+
+    def test_schedule_jobs_private_workers(self):
+        job = qdb.processing_job.ProcessingJob.create(
+            qdb.user.User('test@foo.bar'),
+            qdb.software.Parameters.load(
+                qdb.software.Software.from_name_and_version(
+                    'Qiita', 'alpha').get_command('delete_study'),
+                values_dict={'study': 1}), force=True)
+        with patch('qiita_db.processing_job.get_submission_executor') as ex, \
+                patch('qiita_db.processing_job.qiita_config.'
+                      'use_private_workers', True):
+            job.submit()
+        self.assertFalse(ex.return_value.submit.called)
+        queue = qdb.processing_job.PRIVATE_TASK_QUEUE
+        self.assertEqual(r_client.lrange(queue, 0, -1), [job.id])
+        r_client.delete(queue)
+
+    def test_schedule_jobs_private_workers_release_validators(self):
+        # release_validators waits for other private jobs, so it never takes
+        # a private worker
+        job = qdb.processing_job.ProcessingJob.create(
+            qdb.user.User('test@foo.bar'),
+            qdb.software.Parameters.load(
+                qdb.software.Software.from_name_and_version(
+                    'Qiita', 'alpha').get_command('release_validators'),
+                values_dict={'job': 'bcc7ebcd-39c1-43e4-af2d-822e3589f14d'}),
+            force=True)
+        with patch('qiita_db.processing_job.get_submission_executor') as ex, \
+                patch('qiita_db.processing_job.qiita_config.'
+                      'use_private_workers', True):
+            job.submit()
+        self.assertEqual(ex.return_value.submit.call_count, 1)
+        self.assertEqual(ex.return_value.submit.call_args[0][0], job.id)
+        self.assertEqual(
+            r_client.llen(qdb.processing_job.PRIVATE_TASK_QUEUE), 0)
 
 
 @qiita_test_checker()
@@ -290,6 +563,71 @@ class ProcessingJobTest(TestCase):
         with self.assertRaises(qdb.exceptions.QiitaDBStatusError):
             job._set_status('running')
 
+    def test_set_status_validator(self):
+        job = _create_job()
+        validator = _create_job()
+        self.conn_handler.execute(
+            """INSERT INTO qiita.processing_job_validator
+                (processing_job_id, validator_id)
+               VALUES (%s, %s)""", [job.id, validator.id])
+        pubsub = r_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(qdb.processing_job.VALIDATORS_CHANNEL % job.id)
+        # Consume the subscription message
+        pubsub.get_message(timeout=1)
+
+        validator._set_status('running')
+        self.assertIsNone(pubsub.get_message(timeout=0.1))
+        # Once the validator is done, the job is notified
+        validator._set_status('waiting')
+        obs = pubsub.get_message(timeout=1)
+        self.assertEqual(obs['data'], validator.id)
+        pubsub.close()
+
+    def test_set_status_validator_release(self):
+        job = _create_job()
+        validators = [_create_job(), _create_job()]
+        job._set_validator_jobs(validators)
+        release = qdb.processing_job.ProcessingJob.create(
+            qdb.user.User('test@foo.bar'),
+            qdb.software.Parameters.load(
+                qdb.software.Software.from_name_and_version(
+                    'Qiita', 'alpha').get_command('release_validators'),
+                values_dict={'job': job.id}), force=True)
+        validators[0]._set_status('waiting')
+        self.assertEqual(release.status, 'in_construction')
+        # The last validator to finish queues the release
+        validators[1]._set_status('error')
+        self.assertEqual(release.status, 'queued')
+
+    def test_release_validators_wait(self):
+        job = _create_job()
+        job._set_status('running')
+        validator = _create_job()
+        validator._set_status('running')
+        job._set_validator_jobs([validator])
+
+        def complete_validator():
+            # The validator is completed from its own connection to the DB
+            qdb.sql_connection.create_new_transaction()
+            sleep(1)
+            qdb.processing_job.ProcessingJob(validator.id)._set_error(
+                'Validator failure')
+
+        proc = Process(target=complete_validator)
+        start = time()
+        proc.start()
+        try:
+            with patch('qiita_db.processing_job.VALIDATORS_WAIT_TIMEOUT',
+                       600):
+                job.release_validators()
+        finally:
+            proc.join()
+        # release_validators is woken up by the validator, not by the timeout
+        self.assertLess(time() - start, 60)
+        self.assertEqual(proc.exitcode, 0)
+        self.assertEqual(job.status, 'error')
+        self.assertIn('Validator failure', job.log.msg)
+
     def test_submit_error(self):
         job = _create_job()
         job._set_status('queued')
@@ -297,6 +635,116 @@ class ProcessingJobTest(TestCase):
                 qdb.exceptions.QiitaDBOperationNotPermittedError):
             job.submit()
 
+    def test_batch_submit(self):
+        jobs = [_create_job(), _create_job()]
+        jobs[1]._set_status('waiting')
+        with patch('qiita_db.processing_job.get_submission_executor') as ex:
+            qdb.processing_job.ProcessingJob.batch_submit(jobs)
+        for job in jobs:
+            self.assertEqual(job.status, 'queued')
+        obs = [c[0][0] for c in ex.return_value.submit.call_args_list]
+        self.assertItemsEqual(obs, [j.id for j in jobs])
+
+        # If any of the jobs can't be submitted none of them is
+        jobs = [_create_job(), _create_job()]
+        jobs[1]._set_status('queued')
+        with self.assertRaises(
+                qdb.exceptions.QiitaDBOperationNotPermittedError):
+            qdb.processing_job.ProcessingJob.batch_submit(jobs)
+        self.assertEqual(jobs[0].status, 'in_construction')
+
+    def test_submit_memoized(self):
+        previous = qdb.processing_job.ProcessingJob(
+            '3c9991ab-6c14-4368-a48c-841e8837a79c')
+        sql = """SELECT command_output_id
+                 FROM qiita.command_output
+                 WHERE command_id = %s"""
+        out_id = self.conn_handler.execute_fetchone(
+            sql, [previous.command.id])[0]
+        sql = """DELETE FROM qiita.artifact_output_processing_job
+                 WHERE processing_job_id = %s"""
+        self.conn_handler.execute(sql, [previous.id])
+        sql = """INSERT INTO qiita.artifact_output_processing_job
+                    (artifact_id, processing_job_id, command_output_id)
+                 VALUES (%s, %s, %s)"""
+        self.conn_handler.execute(sql, [4, previous.id, out_id])
+        key = previous._memoization_key()
+        self.assertIsNotNone(key)
+        sql = """UPDATE qiita.processing_job SET memoization_key = %s
+                 WHERE processing_job_id = %s"""
+        self.conn_handler.execute(sql, [key, previous.id])
+
+        job = qdb.processing_job.ProcessingJob.create(
+            qdb.user.User('test@foo.bar'),
+            qdb.software.Parameters.load(
+                previous.command, values_dict=previous.parameters.values),
+            force=True)
+        self.assertEqual(job._memoization_key(), key)
+        with patch('qiita_db.processing_job.qiita_config.memoize_jobs',
+                   True):
+            with patch('qiita_db.processing_job.get_submission_executor'):
+                job.submit()
+
+        # The outputs are copied by a private job
+        self.assertEqual(job.status, 'running')
+        self.assertEqual(job.step, 'Reusing the outputs of job %s'
+                         % previous.id)
+        sql = """SELECT processing_job_id
+                 FROM qiita.processing_job
+                    JOIN qiita.software_command USING (command_id)
+                 WHERE name = 'reuse_memoized_job'
+                    AND command_parameters->>'job' = %s"""
+        reuse = qdb.processing_job.ProcessingJob(
+            self.conn_handler.execute_fetchone(sql, [job.id])[0])
+        self.assertEqual(reuse.parameters.values['previous'], previous.id)
+        self.assertEqual(reuse.status, 'queued')
+
+        job._complete_from_memoized_job(previous)
+        self.assertEqual(job.status, 'success')
+        obs = job.outputs
+        self.assertEqual(len(obs), 1)
+        new = list(obs.values())[0]
+        self.assertNotEqual(new, qdb.artifact.Artifact(4))
+        self.assertEqual(new.artifact_type, 'BIOM')
+        self.assertEqual(new.parents, [qdb.artifact.Artifact(2)])
+        self.assertEqual(new.processing_parameters.values,
+                         previous.parameters.values)
+        # The files are copies, including the HTML summary, and their
+        # checksums are not computed again
+        self._clean_up_files.extend(fp for _, fp, _ in new.filepaths)
+        sql = """SELECT filepath_type, checksum
+                 FROM qiita.artifact_filepath
+                    JOIN qiita.filepath USING (filepath_id)
+                    JOIN qiita.filepath_type USING (filepath_type_id)
+                 WHERE artifact_id = %s
+                 ORDER BY filepath_type, checksum"""
+        self.assertEqual(self.conn_handler.execute_fetchall(sql, [new.id]),
+                         self.conn_handler.execute_fetchall(sql, [4]))
+        with patch('qiita_db.util.compute_checksums') as checksums:
+            job = qdb.processing_job.ProcessingJob.create(
+                qdb.user.User('test@foo.bar'),
+                qdb.software.Parameters.load(
+                    previous.command, values_dict=previous.parameters.values),
+                force=True)
+            job._set_status('running')
+            job._complete_from_memoized_job(previous)
+        self.assertEqual(job.status, 'success')
+        self.assertFalse(checksums.called)
+        self._clean_up_files.extend(
+            fp for a in job.outputs.values() for _, fp, _ in a.filepaths)
+
+        # Without memoization the job is submitted as usual
+        job = qdb.processing_job.ProcessingJob.create(
+            qdb.user.User('test@foo.bar'),
+            qdb.software.Parameters.load(
+                previous.command, values_dict=previous.parameters.values),
+            force=True)
+        with patch('qiita_db.processing_job.qiita_config.memoize_jobs',
+                   False):
+            with patch('qiita_db.processing_job.get_submission_executor'):
+                job.submit()
+        self.assertEqual(job.status, 'queued')
+
     def test_complete_multiple_outputs(self):
         # This test performs the test of multiple functions at the same
         # time. "release", "release_validators" and
@@ -624,6 +1072,21 @@ class ProcessingJobTest(TestCase):
                 qdb.exceptions.QiitaDBOperationNotPermittedError):
             self.tester3.update_heartbeat_state()
 
+    def test_flush_heartbeats(self):
+        job = _create_job()
+        job._set_status('running')
+        job.update_heartbeat_state()
+        exp = job.heartbeat
+        # The heartbeat is only buffered
+        sql = """SELECT heartbeat FROM qiita.processing_job
+                 WHERE processing_job_id = %s"""
+        self.assertIsNone(self.conn_handler.execute_fetchone(sql, [job.id])[0])
+
+        self.assertGreaterEqual(qdb.processing_job.flush_heartbeats(), 1)
+        self.assertEqual(
+            self.conn_handler.execute_fetchone(sql, [job.id])[0], exp)
+        self.assertEqual(qdb.processing_job.flush_heartbeats(), 0)
+
     def test_step_setter(self):
         job = _create_job()
         job._set_status('running')
@@ -840,6 +1303,18 @@ class ProcessingWorkflowTests(TestCase):
         exp_pending = {obs_src.id: {'input_data': 'demultiplexed'}}
         self.assertEqual(obs_dst.pending, exp_pending)
 
+    def test_submit_batch(self):
+        wf = qdb.processing_job.ProcessingWorkflow.from_default_workflow(
+            qdb.user.User('test@foo.bar'), qdb.software.DefaultWorkflow(1),
+            {qdb.software.Command(1): {'input_data': 1}}, force=True)
+        root, child = wf.graph.edges()[0]
+        with patch('qiita_db.processing_job.get_submission_executor') as ex:
+            wf.submit()
+        self.assertEqual(root.status, 'queued')
+        self.assertEqual(child.status, 'waiting')
+        obs = [c[0][0] for c in ex.return_value.submit.call_args_list]
+        self.assertEqual(obs, [root.id])
+
     def test_from_default_workflow_error(self):
         with self.assertRaises(qdb.exceptions.QiitaDBError) as err:
             qdb.processing_job.ProcessingWorkflow.from_default_workflow(
@@ -1048,7 +1523,50 @@ class ProcessingJobDuplicated(TestCase):
             jid, status = jobs.split(': ')
             if status != 'success':
                 qdb.processing_job.ProcessingJob(jid)._set_status('error')
-        _create_job(False)
+        job = _create_job(False)
+
+        # The fingerprint of the parameters is stored with the job
+        obs = self.conn_handler.execute_fetchone(
+            """SELECT parameters_fingerprint FROM qiita.processing_job
+               WHERE processing_job_id = %s""", [job.id])[0]
+        self.assertEqual(obs, qdb.processing_job._parameters_fingerprint(
+            job.parameters.values))
+
+    def test_create_duplicated_workflow_child(self):
+        params = qdb.software.Parameters.load(
+            qdb.software.Command(1),
+            json_str='{"input_data": 1, "max_barcode_errors": 1.5, '
+                     '"barcode_type": "golay_12", "max_bad_run_length": 3, '
+                     '"rev_comp": false, "phred_quality_threshold": 3, '
+                     '"rev_comp_barcode": false, '
+                     '"rev_comp_mapping_barcodes": false, '
+                     '"min_per_read_length_fraction": 0.75, '
+                     '"sequence_max_n": 0, "phred_offset": "auto"}')
+        wf = qdb.processing_job.ProcessingWorkflow.from_scratch(
+            qdb.user.User('test@foo.bar'), params, force=True)
+        parent = wf.graph.nodes()[0]
+        dflt_params = qdb.software.DefaultParameters(10)
+        wf.add(dflt_params,
+               connections={parent: {'demultiplexed': 'input_data'}},
+               force=True)
+        child = nx.topological_sort(wf.graph)[1]
+
+        # Once the parent is completed, the child has its actual input
+        parent._update_children({1: 3})
+        obs = self.conn_handler.execute_fetchone(
+            """SELECT parameters_fingerprint FROM qiita.processing_job
+               WHERE processing_job_id = %s""", [child.id])[0]
+        self.assertEqual(obs, qdb.processing_job._parameters_fingerprint(
+            child.parameters.values))
+
+        # and a job with the same parameters is a duplicate of the child
+        with self.assertRaises(ValueError) as context:
+            qdb.processing_job.ProcessingJob.create(
+                qdb.user.User('test@foo.bar'),
+                qdb.software.Parameters.from_default_params(
+                    dflt_params, {'input_data': 3}))
+        self.assertIn('%s: in_construction' % child.id,
+                      context.exception.message)
 
 
 if __name__ == '__main__':
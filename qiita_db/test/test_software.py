@@ -388,6 +388,16 @@ class CommandTests(TestCase):
         tester.activate()
         self.assertTrue(tester.active)
 
+    def test_max_running_jobs(self):
+        tester = qdb.software.Command(3)
+        self.assertIsNone(tester.max_running_jobs)
+        tester.max_running_jobs = 5
+        self.assertEqual(tester.max_running_jobs, 5)
+        tester.max_running_jobs = None
+        self.assertIsNone(tester.max_running_jobs)
+        with self.assertRaises(ValueError):
+            tester.max_running_jobs = 0
+
 
 @qiita_test_checker()
 class SoftwareTests(TestCase):
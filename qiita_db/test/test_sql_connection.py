@@ -668,6 +668,25 @@ class TestTransaction(TestBase):
 
         self.assertEqual(qdb.sql_connection.TRN.index, 0)
 
+    def test_cache(self):
+        with self.assertRaises(RuntimeError):
+            qdb.sql_connection.TRN.cache
+
+        with qdb.sql_connection.TRN:
+            self.assertEqual(qdb.sql_connection.TRN.cache, {})
+            qdb.sql_connection.TRN.cache['key'] = 'value'
+            qdb.sql_connection.TRN.add("SELECT 42")
+            qdb.sql_connection.TRN.execute()
+            self.assertEqual(qdb.sql_connection.TRN.cache, {'key': 'value'})
+            qdb.sql_connection.TRN.rollback()
+            self.assertEqual(qdb.sql_connection.TRN.cache, {})
+
+            qdb.sql_connection.TRN.cache['key'] = 'value'
+            qdb.sql_connection.TRN.add("SELECT 42")
+
+        with qdb.sql_connection.TRN:
+            self.assertEqual(qdb.sql_connection.TRN.cache, {})
+
 
 if __name__ == "__main__":
     main()
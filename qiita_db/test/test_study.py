@@ -309,6 +309,25 @@ class TestStudy(TestCase):
         self.assertFalse(
             self.study.has_access(qdb.user.User("demo@microbio.me"), True))
 
+    def test_has_access_cached(self):
+        self._change_processed_data_status('sandbox')
+        user = qdb.user.User("demo@microbio.me")
+        with qdb.sql_connection.TRN:
+            self.assertFalse(self.study.has_access(user))
+            self.assertEqual(
+                qdb.sql_connection.TRN.cache['study_access'],
+                {(1, 'demo@microbio.me', False): False})
+            # sharing the study invalidates the cached decisions
+            self.study.share(user)
+            self.assertNotIn('study_access', qdb.sql_connection.TRN.cache)
+            self.assertTrue(self.study.has_access(user))
+            self.study.unshare(user)
+            self.assertFalse(self.study.has_access(user))
+            # as well as changing the visibility of its artifacts
+            qdb.artifact.Artifact(1).visibility = 'public'
+            self.assertTrue(self.study.has_access(user))
+            self.assertFalse(self.study.has_access(user, True))
+
     def test_can_edit(self):
         self.assertTrue(self.study.can_edit(qdb.user.User('test@foo.bar')))
         self.assertTrue(self.study.can_edit(qdb.user.User('shared@foo.bar')))
@@ -378,6 +397,20 @@ class TestStudy(TestCase):
 
         qdb.study.Study.delete(s.id)
 
+    def test_get_ids_by_status(self):
+        obs = qdb.study.Study.get_ids_by_status('sandbox')
+        self.assertEqual(obs, set())
+
+        s = qdb.study.Study.create(
+            qdb.user.User('test@foo.bar'),
+            'NOT Identification of the Microbiomes for Cannabis Soils',
+            self.info)
+        self.assertEqual(qdb.study.Study.get_ids_by_status('private'), {1})
+        self.assertEqual(qdb.study.Study.get_ids_by_status('sandbox'), {s.id})
+        self.assertEqual(qdb.study.Study.get_ids_by_status('public'), set())
+
+        qdb.study.Study.delete(s.id)
+
     def test_exists(self):
         self.assertTrue(qdb.study.Study.exists(
             'Identification of the Microbiomes for Cannabis Soils'))
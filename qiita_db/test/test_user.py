@@ -264,6 +264,22 @@ class UserTest(TestCase):
         qiita_config.portal = "EMP"
         self.assertEqual(user.shared_studies, set())
 
+    def test_get_user_study_ids(self):
+        user = qdb.user.User('test@foo.bar')
+        qiita_config.portal = "QIITA"
+        self.assertEqual(user.user_study_ids, {1})
+
+        qiita_config.portal = "EMP"
+        self.assertEqual(user.user_study_ids, set())
+
+    def test_get_shared_study_ids(self):
+        user = qdb.user.User('shared@foo.bar')
+        qiita_config.portal = "QIITA"
+        self.assertEqual(user.shared_study_ids, {1})
+
+        qiita_config.portal = "EMP"
+        self.assertEqual(user.shared_study_ids, set())
+
     def test_get_private_analyses(self):
         user = qdb.user.User('test@foo.bar')
         qiita_config.portal = "QIITA"
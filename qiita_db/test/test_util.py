@@ -7,18 +7,22 @@
 # -----------------------------------------------------------------------------
 
 from unittest import TestCase, main
-from tempfile import mkstemp, NamedTemporaryFile, TemporaryFile
-from os import close, remove, makedirs, mkdir
+from tempfile import (mkstemp, mkdtemp, NamedTemporaryFile,
+                      TemporaryFile)
+from os import close, remove, makedirs, mkdir, stat, utime, walk
 from os.path import join, exists, basename
 from shutil import rmtree
 from datetime import datetime
 from functools import partial
 from string import punctuation
+from binascii import crc32
 import h5py
 from six import StringIO, BytesIO
 import pandas as pd
+from mock import patch
 
 from qiita_core.util import qiita_test_checker
+from qiita_core.qiita_settings import r_client
 import qiita_db as qdb
 
 
@@ -33,11 +37,15 @@ class DBUtilTests(TestCase):
             'study_abstract', 'principal_investigator_id', 'email',
             'number_samples_collected']
         self.files_to_remove = []
+        self._clean_up_dirs = []
 
     def tearDown(self):
         for fp in self.files_to_remove:
             if exists(fp):
                 remove(fp)
+        for dp in self._clean_up_dirs:
+            if exists(dp):
+                rmtree(dp)
 
     def test_params_dict_to_json(self):
         params_dict = {'opt1': '1', 'opt2': [2, '3'], 3: 9}
@@ -164,6 +172,55 @@ class DBUtilTests(TestCase):
         self.assertTrue(qdb.util.check_count('qiita.study_person', 3))
         self.assertFalse(qdb.util.check_count('qiita.study_person', 2))
 
+    def test_select_mountpoint(self):
+        exp = qdb.util.get_mountpoint('raw_data')
+        self.assertEqual(qdb.util.select_mountpoint('raw_data'), exp[0])
+
+        new_dd_id = self.conn_handler.execute_fetchone(
+            """INSERT INTO qiita.data_directory
+                (data_type, mountpoint, subdirectory, active)
+               VALUES ('raw_data', 'raw_data_2', false, true)
+               RETURNING data_directory_id""")[0]
+        mountpoints = qdb.util.get_mountpoint('raw_data')
+        self.assertEqual(len(mountpoints), 2)
+        self.assertEqual(mountpoints[0], exp[0])
+
+        with patch.object(qdb.util.qiita_config, 'mountpoint_placement',
+                          'round_robin'):
+            obs = {qdb.util.select_mountpoint('raw_data')[0]
+                   for _ in range(2)}
+        self.assertEqual(obs, {exp[0][0], new_dd_id})
+
+        # raw_data_2 doesn't exist, so it has no free space
+        with patch.object(qdb.util.qiita_config, 'mountpoint_placement',
+                          'free_space'):
+            obs = {qdb.util.select_mountpoint('raw_data')[0]
+                   for _ in range(5)}
+        self.assertEqual(obs, {exp[0][0]})
+
+    def test_insert_filepaths_mountpoints(self):
+        new_dd_id = self.conn_handler.execute_fetchone(
+            """INSERT INTO qiita.data_directory
+                (data_type, mountpoint, subdirectory, active)
+               VALUES ('raw_data', 'raw_data_2', false, true)
+               RETURNING data_directory_id""")[0]
+        new_mp = join(qdb.util.get_db_files_base_dir(), 'raw_data_2')
+        mkdir(new_mp)
+        self._clean_up_dirs.append(new_mp)
+
+        fd, fp = mkstemp()
+        close(fd)
+        self.files_to_remove.append(fp)
+        with patch.object(qdb.util, 'select_mountpoint',
+                          return_value=(new_dd_id, new_mp, False)):
+            fp_id = qdb.util.insert_filepaths([(fp, 1)], 2, "raw_data")[0]
+
+        # The mountpoint is recorded with the file
+        exp_fp = join(new_mp, "2_%s" % basename(fp))
+        self.assertTrue(exists(exp_fp))
+        self.assertEqual(
+            qdb.util.get_filepath_information(fp_id)['fullpath'], exp_fp)
+
     def test_insert_filepaths(self):
         fd, fp = mkstemp()
         close(fd)
@@ -187,7 +244,7 @@ class DBUtilTests(TestCase):
         obs = self.conn_handler.execute_fetchall(
             "SELECT * FROM qiita.filepath WHERE filepath_id=%d" % exp_new_id)
         exp_fp = "2_%s" % basename(fp)
-        exp = [[exp_new_id, exp_fp, 1, '852952723', 1, 5]]
+        exp = [[exp_new_id, exp_fp, 1, '852952723', 1, 5, None]]
         self.assertEqual(obs, exp)
 
         qdb.util.purge_filepaths()
@@ -217,7 +274,7 @@ class DBUtilTests(TestCase):
         obs = self.conn_handler.execute_fetchall(
             "SELECT * FROM qiita.filepath WHERE filepath_id=%d" % exp_new_id)
         exp_fp = "2_%s" % basename(fp)
-        exp = [[exp_new_id, exp_fp, 1, '852952723', 1, 5]]
+        exp = [[exp_new_id, exp_fp, 1, '852952723', 1, 5, None]]
         self.assertEqual(obs, exp)
 
         qdb.util.purge_filepaths()
@@ -245,11 +302,54 @@ class DBUtilTests(TestCase):
         obs = self.conn_handler.execute_fetchall(
             "SELECT * FROM qiita.filepath WHERE filepath_id=%d" % exp_new_id)
         exp_fp = "2_%s" % basename(fp)
-        exp = [[exp_new_id, exp_fp, 1, '852952723', 1, 5]]
+        exp = [[exp_new_id, exp_fp, 1, '852952723', 1, 5, None]]
         self.assertEqual(obs, exp)
 
         qdb.util.purge_filepaths()
 
+    def test_insert_filepaths_content_addressed(self):
+        self.conn_handler.execute(
+            """UPDATE qiita.data_directory SET content_addressed = true
+               WHERE data_type = 'raw_data'""")
+        fps = []
+        for _ in range(2):
+            fd, fp = mkstemp()
+            close(fd)
+            with open(fp, "w") as f:
+                f.write("Repeated contents\n")
+            self.files_to_remove.append(fp)
+            fps.append(fp)
+
+        obs = qdb.util.insert_filepaths([(fp, 1) for fp in fps], 2,
+                                        "raw_data")
+        self.assertEqual(len(obs), 2)
+
+        # Both files are available in the usual place, sharing the contents
+        mp = join(qdb.util.get_db_files_base_dir(), "raw_data")
+        new_fps = [join(mp, "2_%s" % basename(fp)) for fp in fps]
+        self.files_to_remove.extend(new_fps)
+        for fp, new_fp in zip(fps, new_fps):
+            self.assertFalse(exists(fp))
+            with open(new_fp) as f:
+                self.assertEqual(f.read(), "Repeated contents\n")
+        self.assertEqual(stat(new_fps[0]).st_ino, stat(new_fps[1]).st_ino)
+
+        obs = self.conn_handler.execute_fetchall(
+            """SELECT blob_id, reference_count, checksum
+               FROM qiita.filepath_blob""")
+        self.assertEqual(len(obs), 1)
+        blob_id, ref_count, checksum = obs[0]
+        self.assertEqual(ref_count, 2)
+        blob_fp = qdb.util._blob_path(mp, blob_id, checksum)
+        self.assertEqual(stat(blob_fp).st_ino, stat(new_fps[0]).st_ino)
+
+        # The blob is only removed once it is not referenced
+        qdb.util.purge_filepaths()
+        obs = self.conn_handler.execute_fetchall(
+            "SELECT * FROM qiita.filepath_blob")
+        self.assertEqual(obs, [])
+        self.assertFalse(exists(blob_fp))
+
     def test_retrieve_filepaths(self):
         obs = qdb.util.retrieve_filepaths('artifact_filepath',
                                           'artifact_id', 1)
@@ -371,6 +471,21 @@ class DBUtilTests(TestCase):
     def test_purge_filepaths(self):
         self._common_purge_filepaths_test()
 
+    def test_purge_filepaths_verified(self):
+        fd, fp = mkstemp()
+        close(fd)
+        self.files_to_remove.append(fp)
+        fp_id = qdb.util.insert_filepaths([(fp, 1)], 2, "raw_data")[0]
+        self.conn_handler.execute(
+            """INSERT INTO qiita.filepath_verification
+                (filepath_id, last_verified, status)
+               VALUES (%s, now(), 'ok')""", [fp_id])
+        # having been verified doesn't make the file used
+        qdb.util.purge_filepaths()
+        obs = self.conn_handler.execute_fetchall(
+            "SELECT * FROM qiita.filepath WHERE filepath_id = %s", [fp_id])
+        self.assertEqual(obs, [])
+
     def test_purge_files_from_filesystem(self):
         info = {"timeseries_type_id": 1, "metadata_complete": True,
                 "mixs_compliant": True, "number_samples_collected": 25,
@@ -812,6 +927,12 @@ class UtilTests(TestCase):
         close(fh)
         with open(self.filepath, "w") as f:
             f.write("Some text so we can actually compute a checksum")
+        self._clean_up_dirs = []
+
+    def tearDown(self):
+        remove(self.filepath)
+        for dp in self._clean_up_dirs:
+            rmtree(dp)
 
     def test_compute_checksum(self):
         """Correctly returns the file checksum"""
@@ -819,6 +940,88 @@ class UtilTests(TestCase):
         exp = 1719580229
         self.assertEqual(obs, exp)
 
+    def test_compute_checksum_newlines(self):
+        # line endings are normalized, also across block boundaries
+        with open(self.filepath, "wb") as f:
+            f.write("a\r\nb\rc\n\r\n")
+        with patch.object(qdb.util, 'CHECKSUM_BLOCK_SIZE', 2):
+            obs = qdb.util.compute_checksum(self.filepath)
+        self.assertEqual(obs, crc32("a\nb\nc\n\n") & 0xffffffff)
+
+    def test_compute_checksums(self):
+        dirpath = mkdtemp()
+        self._clean_up_dirs.append(dirpath)
+        mkdir(join(dirpath, 'subdir'))
+        fps = [join(dirpath, 'file_1.txt'),
+               join(dirpath, 'subdir', 'file_2.txt')]
+        for i, fp in enumerate(fps):
+            with open(fp, 'w') as f:
+                f.write("Contents of file %d\n" % i)
+        obs = qdb.util.compute_checksums([dirpath, fps[1]])
+        # the checksum of the directory is the checksum of the concatenation
+        # of all its files
+        contents = ''.join(
+            open(join(d, f)).read() for d, _, files in walk(dirpath)
+            for f in files)
+        exp = [crc32(contents) & 0xffffffff,
+               crc32("Contents of file 1\n") & 0xffffffff]
+        self.assertEqual(obs, exp)
+
+    def test_compute_checksum_cache(self):
+        exp = qdb.util.compute_checksum(self.filepath)
+        self.assertIsNotNone(r_client.get('checksum:%s' % self.filepath))
+        # the cached value is used as long as size and mtime are the same
+        fstat = stat(self.filepath)
+        with open(self.filepath, "w") as f:
+            f.write("Some text so we can actually compute a checksuM")
+        utime(self.filepath, (fstat.st_atime, fstat.st_mtime))
+        self.assertEqual(qdb.util.compute_checksum(self.filepath), exp)
+        # and it is ignored once they change
+        utime(self.filepath, (fstat.st_atime, fstat.st_mtime + 10))
+        self.assertNotEqual(qdb.util.compute_checksum(self.filepath), exp)
+
+    def test_copy_file(self):
+        dirpath = mkdtemp()
+        self._clean_up_dirs.append(dirpath)
+        dst = join(dirpath, 'copy.txt')
+        obs = qdb.util._copy_file(self.filepath, dst)
+        self.assertIn(obs, ['reflink', 'hardlink', 'copy'])
+        with open(dst) as f:
+            self.assertEqual(
+                f.read(), "Some text so we can actually compute a checksum")
+        if obs == 'hardlink':
+            self.assertEqual(stat(dst).st_ino, stat(self.filepath).st_ino)
+
+    def test_copy_file_fallback(self):
+        dirpath = mkdtemp()
+        self._clean_up_dirs.append(dirpath)
+        dst = join(dirpath, 'copy.txt')
+        # files in different filesystems are fully copied
+        with patch.object(qdb.util, 'ioctl', side_effect=IOError), \
+                patch.object(qdb.util, 'link', side_effect=OSError):
+            obs = qdb.util._copy_file(self.filepath, dst)
+        self.assertEqual(obs, 'copy')
+        self.assertNotEqual(stat(dst).st_ino, stat(self.filepath).st_ino)
+        with open(dst) as f:
+            self.assertEqual(
+                f.read(), "Some text so we can actually compute a checksum")
+
+    def test_copy_filepath_directory(self):
+        src = mkdtemp()
+        dst = mkdtemp()
+        self._clean_up_dirs.extend([src, dst])
+        mkdir(join(src, 'subdir'))
+        for fp in ['file_1.txt', join('subdir', 'file_2.txt')]:
+            with open(join(src, fp), 'w') as f:
+                f.write(fp)
+        dst = join(dst, 'copy')
+        qdb.util.copy_filepath(src, dst)
+        for fp in ['file_1.txt', join('subdir', 'file_2.txt')]:
+            with open(join(dst, fp)) as f:
+                self.assertEqual(f.read(), fp)
+        obs = qdb.util.compute_checksums([src, dst], use_cache=False)
+        self.assertEqual(obs[0], obs[1])
+
     def test_scrub_data_nothing(self):
         """Returns the same string without changes"""
         self.assertEqual(qdb.util.scrub_data("nothing_changes"),
@@ -919,6 +1122,86 @@ class UtilTests(TestCase):
         qdb.artifact.Artifact(4).visibility = 'private'
         qdb.study.Study.delete(new_study.id)
 
+    def test_generate_study_list_paging(self):
+        info = {"timeseries_type_id": 1, "metadata_complete": True,
+                "mixs_compliant": True, "number_samples_collected": 25,
+                "number_samples_promised": 28, "study_alias": "TST",
+                "study_description": "Some description of the study goes here",
+                "study_abstract": "Some abstract goes here",
+                "emp_person_id": qdb.study.StudyPerson(1),
+                "principal_investigator_id": qdb.study.StudyPerson(1),
+                "lab_person_id": qdb.study.StudyPerson(1)}
+        new_study = qdb.study.Study.create(
+            qdb.user.User('shared@foo.bar'), 'test_study_1', info=info)
+
+        obs = qdb.util.generate_study_list([1, new_study.id], limit=1)
+        self.assertEqual([s['study_id'] for s in obs], [1])
+        obs = qdb.util.generate_study_list(
+            [1, new_study.id], offset=1, limit=1)
+        self.assertEqual([s['study_id'] for s in obs], [new_study.id])
+        obs = qdb.util.generate_study_list(
+            [1, new_study.id], sort_column='study_id', sort_descending=True)
+        self.assertEqual([s['study_id'] for s in obs], [new_study.id, 1])
+        obs = qdb.util.generate_study_list(
+            [1, new_study.id], sort_column='number_samples_collected')
+        self.assertEqual([s['study_id'] for s in obs], [new_study.id, 1])
+        obs = qdb.util.generate_study_list(
+            [1, new_study.id], sort_column='study_title', offset=5)
+        self.assertEqual(obs, [])
+        self.assertEqual(qdb.util.generate_study_list([]), [])
+
+        with self.assertRaises(ValueError):
+            qdb.util.generate_study_list([1], sort_column='not_a_column')
+
+        qdb.study.Study.delete(new_study.id)
+
+    def test_update_study_listing_summary(self):
+        def _shared():
+            return qdb.util.generate_study_list([1])[0]['shared']
+
+        self.assertEqual(_shared(), [('shared@foo.bar', 'Shared')])
+        # modifying the tables directly doesn't change the listing until
+        # the summary is updated
+        with qdb.sql_connection.TRN:
+            sql = """INSERT INTO qiita.study_users (study_id, email)
+                     VALUES (1, 'demo@microbio.me')"""
+            qdb.sql_connection.TRN.add(sql)
+            qdb.sql_connection.TRN.execute()
+        self.assertEqual(_shared(), [('shared@foo.bar', 'Shared')])
+        qdb.util.update_study_listing_summary([1])
+        self.assertEqual(_shared(), [('demo@microbio.me', 'Demo'),
+                                     ('shared@foo.bar', 'Shared')])
+
+        # the methods that modify the summarized values update it
+        qdb.study.Study(1).unshare(qdb.user.User('demo@microbio.me'))
+        self.assertEqual(_shared(), [('shared@foo.bar', 'Shared')])
+
+        user = qdb.user.User('shared@foo.bar')
+        user.info = {'name': 'Shared renamed'}
+        self.assertEqual(_shared(), [('shared@foo.bar', 'Shared renamed')])
+        user.info = {'name': 'Shared'}
+
+        # non existing ids are ignored
+        qdb.util.update_study_listing_summary([1, 1000])
+        self.assertEqual(_shared(), [('shared@foo.bar', 'Shared')])
+
+    def test_filter_study_list(self):
+        self.assertEqual(qdb.util.filter_study_list([1]), [1])
+        self.assertEqual(qdb.util.filter_study_list([]), [])
+        self.assertEqual(qdb.util.filter_study_list([1], 'cannabis'), [1])
+        self.assertEqual(qdb.util.filter_study_list([1], 'PIDude'), [1])
+        self.assertEqual(qdb.util.filter_study_list([1], 'not there'), [])
+
+        qdb.study.Study(1).update_tags(
+            qdb.user.User('test@foo.bar'), ['tag1'])
+        self.assertEqual(
+            qdb.util.filter_study_list([1], tags=['tag1']), [1])
+        self.assertEqual(
+            qdb.util.filter_study_list([1], tags=['tag1', 'other']), [])
+        self.assertEqual(
+            qdb.util.filter_study_list([1], 'cannabis', ['tag1']), [1])
+        qdb.study.Study(1).update_tags(qdb.user.User('test@foo.bar'), [])
+
     def test_generate_study_list_without_artifacts(self):
         # creating a new study to make sure that empty studies are also
         # returned
@@ -1042,6 +1325,16 @@ class UtilTests(TestCase):
                    WHERE parameter_name = 'reference'""")
             qdb.sql_connection.TRN.execute()
 
+    def test_get_artifacts_information_query_count(self):
+        # the number of queries doesn't depend on the number of artifacts
+        TRN = qdb.sql_connection.TRN
+        with patch.object(TRN, 'add', wraps=TRN.add) as add:
+            qdb.util.get_artifacts_information([4])
+            single = add.call_count
+            add.reset_mock()
+            qdb.util.get_artifacts_information([4, 5, 6, 7, 8])
+            self.assertEqual(add.call_count, single)
+
 
 class TestFilePathOpening(TestCase):
     """Tests adapted from scikit-bio's skbio.io.util tests"""
@@ -47,6 +47,8 @@ class User(qdb.base.QiitaObject):
     info
     user_studies
     shared_studies
+    user_study_ids
+    shared_study_ids
     default_analysis
     private_analyses
     shared_analyses
@@ -397,6 +399,17 @@ class User(qdb.base.QiitaObject):
             qdb.sql_connection.TRN.add(sql, data)
             qdb.sql_connection.TRN.execute()
 
+            # the user name is shown in the listing of the studies that the
+            # user owns or has access to
+            if 'name' in info:
+                sql = """SELECT study_id FROM qiita.study WHERE email = %s
+                         UNION
+                         SELECT study_id FROM qiita.study_users
+                         WHERE email = %s"""
+                qdb.sql_connection.TRN.add(sql, [self._id, self._id])
+                qdb.util.update_study_listing_summary(
+                    qdb.sql_connection.TRN.execute_fetchflatten())
+
     @property
     def default_analysis(self):
         with qdb.sql_connection.TRN:
@@ -410,8 +423,8 @@ class User(qdb.base.QiitaObject):
                 qdb.sql_connection.TRN.execute_fetchlast())
 
     @property
-    def user_studies(self):
-        """Returns a list of study ids owned by the user"""
+    def user_study_ids(self):
+        """Returns the set of ids of the studies owned by the user"""
         with qdb.sql_connection.TRN:
             sql = """SELECT study_id
                      FROM qiita.study
@@ -419,13 +432,11 @@ class User(qdb.base.QiitaObject):
                         JOIN qiita.portal_type USING (portal_type_id)
                      WHERE email = %s AND portal = %s"""
             qdb.sql_connection.TRN.add(sql, [self._id, qiita_config.portal])
-            return set(
-                qdb.study.Study(sid)
-                for sid in qdb.sql_connection.TRN.execute_fetchflatten())
+            return set(qdb.sql_connection.TRN.execute_fetchflatten())
 
     @property
-    def shared_studies(self):
-        """Returns a list of study ids shared with the user"""
+    def shared_study_ids(self):
+        """Returns the set of ids of the studies shared with the user"""
         with qdb.sql_connection.TRN:
             sql = """SELECT study_id
                      FROM qiita.study_users
@@ -433,9 +444,19 @@ class User(qdb.base.QiitaObject):
                         JOIN qiita.portal_type USING (portal_type_id)
                      WHERE email = %s and portal = %s"""
             qdb.sql_connection.TRN.add(sql, [self._id, qiita_config.portal])
-            return set(
-                qdb.study.Study(sid)
-                for sid in qdb.sql_connection.TRN.execute_fetchflatten())
+            return set(qdb.sql_connection.TRN.execute_fetchflatten())
+
+    @property
+    def user_studies(self):
+        """Returns a list of study ids owned by the user"""
+        with qdb.sql_connection.TRN:
+            return set(qdb.study.Study(sid) for sid in self.user_study_ids)
+
+    @property
+    def shared_studies(self):
+        """Returns a list of study ids shared with the user"""
+        with qdb.sql_connection.TRN:
+            return set(qdb.study.Study(sid) for sid in self.shared_study_ids)
 
     @property
     def private_analyses(self):
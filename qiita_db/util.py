@@ -17,8 +17,11 @@ Methods
     exists_table
     get_db_files_base_dir
     compute_checksum
+    compute_checksums
     get_files_from_uploads_folders
     get_mountpoint
+    select_mountpoint
+    copy_filepath
     insert_filepaths
     check_table_cols
     check_required_columns
@@ -31,6 +34,9 @@ Methods
     move_upload_files_to_trash
     add_message
     get_pubmed_ids_from_dois
+    update_study_listing_summary
+    filter_study_list
+    generate_study_list
     generate_analysis_list
 """
 # -----------------------------------------------------------------------------
@@ -43,22 +49,28 @@ Methods
 
 from __future__ import division
 from future.builtins import zip
-from random import SystemRandom
+from random import SystemRandom, random
 from string import ascii_letters, digits, punctuation
 from binascii import crc32
 from bcrypt import hashpw, gensalt
 from functools import partial
-from os.path import join, basename, isdir, exists
-from os import walk, remove, listdir, makedirs, rename
-from shutil import move, rmtree, copy as shutil_copy
-from json import dumps
+from os.path import join, basename, isdir, exists, relpath, dirname
+from os import (walk, remove, listdir, makedirs, rename, stat, link,
+                statvfs)
+from shutil import move, rmtree, copyfileobj, copymode
+from fcntl import ioctl
+from filecmp import cmp as filecmp
+from json import dumps, loads
+from multiprocessing.pool import ThreadPool
 from datetime import datetime
 from itertools import chain
+from collections import defaultdict
 from contextlib import contextmanager
 from future.builtins import bytes, str
 import h5py
 
 from qiita_core.exceptions import IncompetentQiitaDeveloperError
+from qiita_core.qiita_settings import r_client, qiita_config
 import qiita_db as qdb
 
 
@@ -401,6 +413,193 @@ def get_work_base_dir():
         return qdb.sql_connection.TRN.execute_fetchlast()
 
 
+# Size of the blocks read from disk when computing checksums
+CHECKSUM_BLOCK_SIZE = 8 * 1024 * 1024
+# Number of files hashed at the same time when computing several checksums
+CHECKSUM_THREADS = 4
+# Seconds that the checksum of a file is kept in redis. The entries are keyed
+# by path and only used if the size and mtime of the file didn't change
+CHECKSUM_CACHE_TTL = 30 * 24 * 60 * 60
+
+
+def _crc32_combine(crc1, crc2, len2):
+    """Combines the crc32 of two consecutive blocks of data
+
+    Parameters
+    ----------
+    crc1 : int
+        The crc32 of the first block
+    crc2 : int
+        The crc32 of the second block
+    len2 : int
+        The length of the second block
+
+    Returns
+    -------
+    int
+        The crc32 of the concatenation of both blocks
+
+    Notes
+    -----
+    Port of zlib's crc32_combine, which is not exposed by python
+    """
+    def gf2_matrix_times(mat, vec):
+        total = 0
+        i = 0
+        while vec:
+            if vec & 1:
+                total ^= mat[i]
+            vec >>= 1
+            i += 1
+        return total
+
+    def gf2_matrix_square(mat):
+        return [gf2_matrix_times(mat, mat[n]) for n in range(32)]
+
+    if len2 <= 0:
+        return crc1
+
+    # operator for one zero bit, then for two and four zero bits
+    odd = [0xedb88320] + [1 << (n - 1) for n in range(1, 32)]
+    even = gf2_matrix_square(odd)
+    odd = gf2_matrix_square(even)
+    # apply len2 zeros to crc1
+    while True:
+        even = gf2_matrix_square(odd)
+        if len2 & 1:
+            crc1 = gf2_matrix_times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+        odd = gf2_matrix_square(even)
+        if len2 & 1:
+            crc1 = gf2_matrix_times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+    return (crc1 ^ crc2) & 0xffffffff
+
+
+def _file_checksum(fp, use_cache=True):
+    """Returns the crc32 of a file and the number of bytes hashed
+
+    Parameters
+    ----------
+    fp : str
+        The path to the file
+    use_cache : bool, optional
+        Whether to use the cached checksum of the file, if any. Default: True
+
+    Returns
+    -------
+    (int, int)
+        The crc32 of the file and the number of bytes hashed
+
+    Notes
+    -----
+    Line endings are normalized to '\\n' before hashing, as the checksums
+    stored in the database were computed reading the files in universal
+    newline mode.
+    The result is cached in redis and reused while the size and modification
+    time of the file don't change.
+    """
+    key = 'checksum:%s' % fp
+    fstat = stat(fp)
+    cached = r_client.get(key) if use_cache else None
+    if cached is not None:
+        size, mtime, crc, length = loads(cached)
+        if size == fstat.st_size and mtime == fstat.st_mtime:
+            return crc, length
+
+    crc = 0
+    length = 0
+    pending = ''
+    with open(fp, 'rb') as f:
+        while True:
+            block = f.read(CHECKSUM_BLOCK_SIZE)
+            data = pending + block
+            pending = ''
+            # a '\r' at the end of the block could be followed by a '\n'
+            if block and data.endswith('\r'):
+                pending = '\r'
+                data = data[:-1]
+            data = data.replace('\r\n', '\n').replace('\r', '\n')
+            crc = crc32(data, crc) & 0xffffffff
+            length += len(data)
+            if not block:
+                break
+
+    r_client.set(key, dumps([fstat.st_size, fstat.st_mtime, crc, length]),
+                 ex=CHECKSUM_CACHE_TTL)
+    return crc, length
+
+
+def _checksum_files(path):
+    """Returns the files that are hashed to compute the checksum of path
+
+    Parameters
+    ----------
+    path : str
+        The path to a file or a directory
+
+    Returns
+    -------
+    list of str
+        The path itself if it is a file, or all the files in the directory
+        tree, in the order in which they are hashed
+    """
+    if not isdir(path):
+        return [path]
+    filepaths = []
+    for name, dirs, files in walk(path):
+        join_f = partial(join, name)
+        filepaths.extend(list(map(join_f, files)))
+    return filepaths
+
+
+def compute_checksums(paths, use_cache=True):
+    r"""Returns the checksums of the files pointed by paths
+
+    Parameters
+    ----------
+    paths : list of str
+        The paths to compute the checksum
+    use_cache : bool, optional
+        If False, the files are read even if their checksum is cached.
+        Default: True
+
+    Returns
+    -------
+    list of int
+        The checksum of each of the paths, in the same order
+
+    Notes
+    -----
+    All the files, including the ones in the directories, are hashed in
+    parallel
+    """
+    path_files = [_checksum_files(path) for path in paths]
+    files = sorted(set(chain.from_iterable(path_files)))
+    checksum_f = partial(_file_checksum, use_cache=use_cache)
+    if len(files) > 1:
+        pool = ThreadPool(min(CHECKSUM_THREADS, len(files)))
+        try:
+            checksums = dict(zip(files, pool.map(checksum_f, files)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        checksums = {fp: checksum_f(fp) for fp in files}
+
+    result = []
+    for filepaths in path_files:
+        crc = 0
+        for fp in filepaths:
+            crc = _crc32_combine(crc, *checksums[fp])
+        result.append(crc)
+    return result
+
+
 def compute_checksum(path):
     r"""Returns the checksum of the file pointed by path
 
@@ -414,26 +613,233 @@ def compute_checksum(path):
     int
         The file checksum
     """
-    crc = 0
-    filepaths = []
-    if isdir(path):
-        for name, dirs, files in walk(path):
-            join_f = partial(join, name)
-            filepaths.extend(list(map(join_f, files)))
+    return compute_checksums([path])[0]
+
+
+def _transfer_checksum_cache(old_path, new_path):
+    """Reuses the cached checksums of old_path for its copy in new_path
+
+    Parameters
+    ----------
+    old_path : str
+        The path to the original file or directory
+    new_path : str
+        The path to the copied (or moved) file or directory
+    """
+    if isdir(new_path):
+        new_fps = _checksum_files(new_path)
+        old_fps = [join(old_path, relpath(fp, new_path)) for fp in new_fps]
     else:
-        filepaths.append(path)
-
-    for fp in filepaths:
-        with open(fp, "Ub") as f:
-            # Go line by line so we don't need to load the entire file
-            for line in f:
-                if crc is None:
-                    crc = crc32(line)
-                else:
-                    crc = crc32(line, crc)
-    # We need the & 0xffffffff in order to get the same numeric value across
-    # all python versions and platforms
-    return crc & 0xffffffff
+        new_fps = [new_path]
+        old_fps = [old_path]
+    for old_fp, new_fp in zip(old_fps, new_fps):
+        cached = r_client.get('checksum:%s' % old_fp)
+        if cached is None:
+            continue
+        size, _, crc, length = loads(cached)
+        fstat = stat(new_fp)
+        if fstat.st_size == size:
+            r_client.set(
+                'checksum:%s' % new_fp,
+                dumps([size, fstat.st_mtime, crc, length]),
+                ex=CHECKSUM_CACHE_TTL)
+
+
+# The ioctl request used to clone a file (i.e. create a reflink) in linux
+FICLONE = 0x40049409
+# Block size used when the data needs to be actually copied
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def _copy_file(src, dst):
+    """Copies the file src to dst, sharing the data on disk when possible
+
+    Parameters
+    ----------
+    src : str
+        The path to the file to copy
+    dst : str
+        The path of the copy
+
+    Returns
+    -------
+    str
+        How the file was copied: 'reflink', 'hardlink' or 'copy'
+
+    Notes
+    -----
+    If both paths are in the same filesystem, the copy is a reflink (a
+    copy-on-write clone) if the filesystem supports it or a hard link
+    otherwise. Files in different filesystems are copied in large blocks.
+    """
+    if stat(src).st_dev == stat(dirname(dst) or '.').st_dev:
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            copymode(src, dst)
+            return 'reflink'
+        except (IOError, OSError):
+            if exists(dst):
+                remove(dst)
+        try:
+            link(src, dst)
+            return 'hardlink'
+        except OSError:
+            pass
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        copyfileobj(fsrc, fdst, COPY_BLOCK_SIZE)
+    copymode(src, dst)
+    return 'copy'
+
+
+def copy_filepath(src, dst):
+    """Copies the file or directory src to dst
+
+    Parameters
+    ----------
+    src : str
+        The path to the file or directory to copy
+    dst : str
+        The path of the copy
+
+    See Also
+    --------
+    _copy_file
+    """
+    if not isdir(src):
+        _copy_file(src, dst)
+        return
+    for name, dirs, files in walk(src):
+        dst_dir = join(dst, relpath(name, src))
+        if not exists(dst_dir):
+            makedirs(dst_dir)
+        for f in files:
+            _copy_file(join(name, f), join(dst_dir, f))
+
+
+# Directory, inside the content addressed mountpoints, holding the blobs
+BLOBS_DIRNAME = 'blobs'
+
+
+def _blob_path(mountpoint, blob_id, checksum):
+    """Builds the path of a blob
+
+    Parameters
+    ----------
+    mountpoint : str
+        The full path to the mountpoint in which the blob is stored
+    blob_id : int
+        The blob id
+    checksum : int or str
+        The checksum of the contents of the blob
+
+    Returns
+    -------
+    str
+        The path to the blob: mountpoint/blobs/XX/XXXXXXXX_blob_id, where
+        XXXXXXXX is the checksum in hexadecimal
+    """
+    checksum = '%08x' % int(checksum)
+    return join(mountpoint, BLOBS_DIRNAME, checksum[:2],
+                '%s_%d' % (checksum, blob_id))
+
+
+def _store_blobs(TRN, dd_id, mountpoint, filepaths, new_filepaths, checksums,
+                 copy):
+    """Stores files in a content addressed mountpoint
+
+    Parameters
+    ----------
+    TRN : qiita_db.sql_connection.Transaction
+        The transaction in use
+    dd_id : int
+        The id of the content addressed mountpoint
+    mountpoint : str
+        The full path to the mountpoint
+    filepaths : list of (str, int)
+        The paths to the files to store and their filepath type
+    new_filepaths : list of (str, int)
+        The paths in which each file should be available and its filepath type
+    checksums : list of int
+        The checksums of `filepaths`
+    copy : bool
+        Whether to copy the files or move them
+
+    Returns
+    -------
+    list of int or None
+        The blob id of each file, None for directories, which are moved or
+        copied as usual
+
+    Notes
+    -----
+    The contents of each file are stored only once in the mountpoint, as a
+    blob, and the new filepaths are hard links to them. Existing blobs are
+    only reused if their contents are exactly the same as the file's.
+    """
+    sizes = [None if isdir(fp) else stat(fp).st_size for fp, _ in filepaths]
+    blobs = defaultdict(list)
+    if any(size is not None for size in sizes):
+        sql = """SELECT checksum, size, blob_id
+                 FROM qiita.filepath_blob
+                 WHERE data_directory_id = %s AND checksum IN %s"""
+        TRN.add(sql, [dd_id, tuple(str(c) for c in checksums)])
+        for checksum, size, blob_id in TRN.execute_fetchindex():
+            blobs[(checksum, size)].append(blob_id)
+
+    sql = """INSERT INTO qiita.filepath_blob
+                (data_directory_id, checksum, size)
+             VALUES (%s, %s, %s)
+             RETURNING blob_id"""
+    blob_ids = []
+    for (old_fp, _), (new_fp, _), checksum, size in zip(
+            filepaths, new_filepaths, checksums, sizes):
+        if size is None:
+            if copy:
+                copy_filepath(old_fp, new_fp)
+                TRN.add_post_rollback_func(rmtree, new_fp)
+            else:
+                move(old_fp, new_fp)
+                TRN.add_post_rollback_func(move, new_fp, old_fp)
+            blob_ids.append(None)
+            continue
+
+        key = (str(checksum), size)
+        blob_id = None
+        for bid in blobs[key]:
+            blob_fp = _blob_path(mountpoint, bid, checksum)
+            if exists(blob_fp) and filecmp(old_fp, blob_fp, shallow=False):
+                blob_id = bid
+                break
+
+        if blob_id is None:
+            # No blob with the same contents, store the file as a new one
+            TRN.add(sql, [dd_id, str(checksum), size])
+            blob_id = TRN.execute_fetchlast()
+            blobs[key].append(blob_id)
+            blob_fp = _blob_path(mountpoint, blob_id, checksum)
+            if not exists(dirname(blob_fp)):
+                makedirs(dirname(blob_fp))
+            if copy:
+                _copy_file(old_fp, blob_fp)
+                TRN.add_post_rollback_func(remove, blob_fp)
+            else:
+                move(old_fp, blob_fp)
+                TRN.add_post_rollback_func(move, blob_fp, old_fp)
+        elif not copy:
+            # The contents are already stored, the original file is not
+            # needed anymore
+            TRN.add_post_commit_func(remove, old_fp)
+
+        if exists(new_fp):
+            # keep the same behavior as moving the file over new_fp
+            remove(new_fp)
+        link(blob_fp, new_fp)
+        TRN.add_post_rollback_func(remove, new_fp)
+        blob_ids.append(blob_id)
+
+    return blob_ids
 
 
 def get_files_from_uploads_folders(study_id):
@@ -522,6 +928,11 @@ def get_mountpoint(mount_type, retrieve_all=False, retrieve_subdir=False):
     -------
     list
         List of tuple, where: [(id_mountpoint, filepath_of_mountpoint)]
+
+    Notes
+    -----
+    If there are several active mountpoints, the oldest one is returned
+    first. See `select_mountpoint` to distribute the new files among them
     """
     with qdb.sql_connection.TRN:
         if retrieve_all:
@@ -531,7 +942,8 @@ def get_mountpoint(mount_type, retrieve_all=False, retrieve_subdir=False):
         else:
             sql = """SELECT data_directory_id, mountpoint, subdirectory
                      FROM qiita.data_directory
-                     WHERE data_type=%s AND active=true"""
+                     WHERE data_type=%s AND active=true
+                     ORDER BY data_directory_id"""
         qdb.sql_connection.TRN.add(sql, [mount_type])
         db_result = qdb.sql_connection.TRN.execute_fetchindex()
         basedir = get_db_files_base_dir()
@@ -542,6 +954,53 @@ def get_mountpoint(mount_type, retrieve_all=False, retrieve_subdir=False):
         return result
 
 
+def select_mountpoint(mount_type, retrieve_subdir=False):
+    r"""Selects the active mountpoint in which a new file should be stored
+
+    Parameters
+    ----------
+    mount_type : str
+        The data mount type
+    retrieve_subdir : bool, optional
+        Retrieve the subdirectory column. Default: False.
+
+    Returns
+    -------
+    tuple
+        (id_mountpoint, filepath_of_mountpoint), as in `get_mountpoint`
+
+    Notes
+    -----
+    If there is more than one active mountpoint of `mount_type`, the
+    mountpoint is chosen following the MOUNTPOINT_PLACEMENT option:
+    'free_space' chooses at random with a probability proportional to the
+    free space in each mountpoint and 'round_robin' takes them in turns.
+    """
+    mountpoints = get_mountpoint(mount_type, retrieve_subdir=retrieve_subdir)
+    if len(mountpoints) == 1:
+        return mountpoints[0]
+
+    if qiita_config.mountpoint_placement == 'round_robin':
+        turn = r_client.incr('mountpoint_placement:%s' % mount_type)
+        return mountpoints[(turn - 1) % len(mountpoints)]
+
+    weights = []
+    for mp in mountpoints:
+        if exists(mp[1]):
+            fs = statvfs(mp[1])
+            weights.append(fs.f_bavail * fs.f_frsize)
+        else:
+            weights.append(0)
+    if not any(weights):
+        return mountpoints[0]
+    point = random() * sum(weights)
+    for mp, weight in zip(mountpoints, weights):
+        point -= weight
+        if point < 0:
+            return mp
+    return mountpoints[-1]
+
+
 def get_mountpoint_path_by_id(mount_id):
     r""" Returns the mountpoint path for the mountpoint with id = mount_id
 
@@ -563,7 +1022,8 @@ def get_mountpoint_path_by_id(mount_id):
         return join(get_db_files_base_dir(), mountpoint)
 
 
-def insert_filepaths(filepaths, obj_id, table, move_files=True, copy=False):
+def insert_filepaths(filepaths, obj_id, table, move_files=True, copy=False,
+                     checksums=None):
     r"""Inserts `filepaths` in the database.
 
     Since the files live outside the database, the directory in which the files
@@ -585,6 +1045,9 @@ def insert_filepaths(filepaths, obj_id, table, move_files=True, copy=False):
     copy : bool, optional
         If `move_files` is true, whether to actually move the files or just
         copy them
+    checksums : list of int, optional
+        The already known checksums of `filepaths`, in the same order. If not
+        provided, the checksums are computed
 
     Returns
     -------
@@ -594,8 +1057,17 @@ def insert_filepaths(filepaths, obj_id, table, move_files=True, copy=False):
     with qdb.sql_connection.TRN:
         new_filepaths = filepaths
 
-        dd_id, mp, subdir = get_mountpoint(table, retrieve_subdir=True)[0]
+        if checksums is None:
+            # The checksums are computed before moving the files so the
+            # checksums cached for their current location can be used
+            checksums = compute_checksums([path for path, _ in filepaths])
+
+        if move_files:
+            dd_id, mp, subdir = select_mountpoint(table, retrieve_subdir=True)
+        else:
+            dd_id, mp, subdir = get_mountpoint(table, retrieve_subdir=True)[0]
         base_fp = join(get_db_files_base_dir(), mp)
+        blob_ids = [None] * len(checksums)
 
         if move_files:
             db_path = partial(join, base_fp)
@@ -614,29 +1086,50 @@ def insert_filepaths(filepaths, obj_id, table, move_files=True, copy=False):
                 new_filepaths = [
                     (db_path("%s_%s" % (obj_id, basename(path))), id_)
                     for path, id_ in filepaths]
-            # Move the original files to the controlled DB directory
-            transfer_function = shutil_copy if copy else move
+            sql = """SELECT content_addressed
+                     FROM qiita.data_directory
+                     WHERE data_directory_id = %s"""
+            qdb.sql_connection.TRN.add(sql, [dd_id])
+            content_addressed = qdb.sql_connection.TRN.execute_fetchlast()
+
+            if content_addressed:
+                blob_ids = _store_blobs(
+                    qdb.sql_connection.TRN, dd_id, base_fp, filepaths,
+                    new_filepaths, checksums, copy)
+            else:
+                # Move the original files to the controlled DB directory
+                for old_fp, new_fp in zip(filepaths, new_filepaths):
+                    if copy:
+                        copy_filepath(old_fp[0], new_fp[0])
+                        # In case the transaction executes a rollback, we
+                        # need to make sure the copies are removed
+                        qdb.sql_connection.TRN.add_post_rollback_func(
+                            rmtree if isdir(new_fp[0]) else remove,
+                            new_fp[0])
+                    else:
+                        move(old_fp[0], new_fp[0])
+                        # In case the transaction executes a rollback, we
+                        # need to make sure the files have not been moved
+                        qdb.sql_connection.TRN.add_post_rollback_func(
+                            move, new_fp[0], old_fp[0])
             for old_fp, new_fp in zip(filepaths, new_filepaths):
-                    transfer_function(old_fp[0], new_fp[0])
-                    # In case the transaction executes a rollback, we need to
-                    # make sure the files have not been moved
-                    qdb.sql_connection.TRN.add_post_rollback_func(
-                        move, new_fp[0], old_fp[0])
+                _transfer_checksum_cache(old_fp[0], new_fp[0])
 
         def str_to_id(x):
             return (x if isinstance(x, (int, long))
                     else convert_to_id(x, "filepath_type"))
-        paths_w_checksum = [(basename(path), str_to_id(id_),
-                            compute_checksum(path))
-                            for path, id_ in new_filepaths]
+        paths_w_checksum = [(basename(path), str_to_id(id_), checksum)
+                            for (path, id_), checksum in zip(new_filepaths,
+                                                             checksums)]
         # Create the list of SQL values to add
-        values = [[path, pid, checksum, 1, dd_id]
-                  for path, pid, checksum in paths_w_checksum]
+        values = [[path, pid, checksum, 1, dd_id, blob_id]
+                  for (path, pid, checksum), blob_id in zip(paths_w_checksum,
+                                                            blob_ids)]
         # Insert all the filepaths at once and get the filepath_id back
         sql = """INSERT INTO qiita.filepath
                     (filepath, filepath_type_id, checksum,
-                     checksum_algorithm_id, data_directory_id)
-                 VALUES (%s, %s, %s, %s, %s)
+                     checksum_algorithm_id, data_directory_id, blob_id)
+                 VALUES (%s, %s, %s, %s, %s, %s)
                  RETURNING filepath_id"""
         idx = qdb.sql_connection.TRN.index
         qdb.sql_connection.TRN.add(sql, values, many=True)
@@ -766,7 +1259,9 @@ def purge_filepaths(delete_files=True):
                 AND R.CONSTRAINT_NAME = FK.CONSTRAINT_NAME
             WHERE U.COLUMN_NAME = 'filepath_id'
                 AND U.TABLE_SCHEMA = 'qiita'
-                AND U.TABLE_NAME = 'filepath'"""
+                AND U.TABLE_NAME = 'filepath'
+                -- the verification results do not make a file used
+                AND R.TABLE_NAME != 'filepath_verification'"""
         qdb.sql_connection.TRN.add(sql)
 
         union_str = " UNION ".join(
@@ -792,6 +1287,22 @@ def purge_filepaths(delete_files=True):
             else:
                 print fp, fp_type
 
+        # The blobs are only removed once no filepath references them
+        sql = """SELECT blob_id, checksum, data_directory_id
+                 FROM qiita.filepath_blob
+                 WHERE reference_count = 0"""
+        qdb.sql_connection.TRN.add(sql)
+        sql = "DELETE FROM qiita.filepath_blob WHERE blob_id=%s"
+        db_results = qdb.sql_connection.TRN.execute_fetchindex()
+        for blob_id, checksum, dd_id in db_results:
+            fp = _blob_path(
+                get_mountpoint_path_by_id(dd_id), blob_id, checksum)
+            if delete_files:
+                qdb.sql_connection.TRN.add(sql, [blob_id])
+                _rm_files(qdb.sql_connection.TRN, fp)
+            else:
+                print fp, 'blob'
+
         if delete_files:
             qdb.sql_connection.TRN.execute()
 
@@ -845,6 +1356,8 @@ def purge_files_from_filesystem(delete_files=True):
     for pt in paths:
         if isdir(pt):
             for aid in listdir(pt):
+                if aid == BLOBS_DIRNAME:
+                    continue
                 _rm_exists(
                     join(pt, aid), qdb.artifact.Artifact, aid, delete_files)
     # -> subdirectory False
@@ -860,6 +1373,8 @@ def purge_files_from_filesystem(delete_files=True):
         for _, pt in get_mountpoint(dt, True):
             if isdir(pt):
                 for ppt in listdir(pt):
+                    if ppt == BLOBS_DIRNAME:
+                        continue
                     _rm_exists(join(pt, ppt), obj, ppt.split('_')[0],
                                delete_files)
 
@@ -1307,29 +1822,50 @@ def supported_filepath_types(artifact_type):
         return qdb.sql_connection.TRN.execute_fetchindex()
 
 
-def generate_study_list(study_ids, public_only=False):
-    """Get general study information
+# Infers the status of qiita.study.study_id from the visibility of its
+# artifacts, with the same precedence used by infer_status
+STUDY_STATUS_SQL = """
+    (SELECT CASE
+        WHEN bool_or(visibility = 'public') THEN 'public'
+        WHEN bool_or(visibility = 'private') THEN 'private'
+        WHEN bool_or(visibility = 'awaiting_approval')
+            THEN 'awaiting_approval'
+        ELSE 'sandbox' END
+     FROM qiita.study_artifact
+        JOIN qiita.artifact USING (artifact_id)
+        JOIN qiita.visibility USING (visibility_id)
+     WHERE study_id = qiita.study.study_id)"""
+
+# Columns of the study listing that can be used to sort it in the database.
+# Keyed by the name used in the listing (and in the datatables columns)
+# and valued by the column of the generate_study_list SELECT
+STUDY_LIST_SORT_COLUMNS = {
+    'study_id': 'study_id',
+    'study_title': 'study_title',
+    'study_alias': 'study_alias',
+    'study_abstract': 'study_abstract',
+    'metadata_complete': 'metadata_complete',
+    'number_samples_collected': 'number_samples_collected',
+    'pi': 'pi_name',
+    'ebi_info': 'ebi_submission_status',
+    'ebi_submission_status': 'ebi_submission_status',
+    'status': 'status'}
+
+
+def update_study_listing_summary(study_ids):
+    """Recomputes the study listing summary of the given studies
 
     Parameters
     ----------
     study_ids : list of ints
-        The study ids to look for. Non-existing ids will be ignored
-    public_only : bool, optional
-        If true, return only public BIOM artifacts. Default: false.
-
-    Returns
-    -------
-    list of dict
-        The list of studies and their information
+        The ids of the studies whose summary should be recomputed. Ids of
+        studies that no longer exist are removed from the summary
 
     Notes
     -----
-    The main select might look scary but it's pretty simple:
-    - We select the requiered fields from qiita.study and qiita.study_person
-        SELECT metadata_complete, study_abstract, study_id, study_alias,
-            study_title, ebi_study_accession, ebi_submission_status,
-            qiita.study_person.name AS pi_name,
-            qiita.study_person.email AS pi_email,
+    This should be called, within the same transaction, by every method that
+    modifies any of the summarized values, so generate_study_list doesn't
+    need to compute them on every listing. The summary holds:
     - the total number of samples collected by counting sample_ids
             (SELECT COUNT(sample_id) FROM qiita.study_sample
                 WHERE study_id=qiita.study.study_id)
@@ -1360,40 +1896,173 @@ def generate_study_list(study_ids, public_only=False):
             (SELECT name FROM qiita.qiita_user
                 WHERE email=qiita.study.email) AS owner
     """
+    if not study_ids:
+        return
+
     with qdb.sql_connection.TRN:
+        sql_args = [tuple(study_ids)]
+        sql = """DELETE FROM qiita.study_listing_summary
+                 WHERE study_id IN %s"""
+        qdb.sql_connection.TRN.add(sql, sql_args)
         sql = """
-            SELECT metadata_complete, study_abstract, study_id, study_alias,
-                study_title, ebi_study_accession, ebi_submission_status,
-                qiita.study_person.name AS pi_name,
-                qiita.study_person.email AS pi_email,
+            INSERT INTO qiita.study_listing_summary (
+                study_id, number_samples_collected, artifact_biom_ids,
+                publications, shared_with_name, shared_with_email,
+                study_tags, owner)
+            SELECT study_id,
                 (SELECT COUNT(sample_id) FROM qiita.study_sample
-                    WHERE study_id=qiita.study.study_id)
-                    AS number_samples_collected,
+                    WHERE study_id=qiita.study.study_id),
                 (SELECT array_agg(artifact_id ORDER BY artifact_id)
                     FROM qiita.study_artifact
                     LEFT JOIN qiita.artifact USING (artifact_id)
                     LEFT JOIN qiita.artifact_type USING (artifact_type_id)
                     WHERE artifact_type='BIOM' AND
-                        study_id = qiita.study.study_id) AS artifact_biom_ids,
+                        study_id = qiita.study.study_id),
                 (SELECT array_agg(row_to_json((publication, is_doi), true))
                     FROM qiita.study_publication
-                    WHERE study_id=qiita.study.study_id) AS publications,
+                    WHERE study_id=qiita.study.study_id),
                 (SELECT array_agg(name ORDER BY email) FROM qiita.study_users
                     LEFT JOIN qiita.qiita_user USING (email)
-                    WHERE study_id=qiita.study.study_id) AS shared_with_name,
+                    WHERE study_id=qiita.study.study_id),
                 (SELECT array_agg(email ORDER BY email) FROM qiita.study_users
                     LEFT JOIN qiita.qiita_user USING (email)
-                    WHERE study_id=qiita.study.study_id) AS shared_with_email,
+                    WHERE study_id=qiita.study.study_id),
                 (SELECT array_agg(study_tag) FROM qiita.per_study_tags
-                    WHERE study_id=qiita.study.study_id) AS study_tags,
+                    WHERE study_id=qiita.study.study_id),
                 (SELECT name FROM qiita.qiita_user
-                    WHERE email=qiita.study.email) AS owner
+                    WHERE email=qiita.study.email)
+            FROM qiita.study
+            WHERE study_id IN %s"""
+        qdb.sql_connection.TRN.add(sql, sql_args)
+        qdb.sql_connection.TRN.execute()
+
+
+def filter_study_list(study_ids, text=None, tags=None):
+    """Filters the study ids by free text and study tags
+
+    Parameters
+    ----------
+    study_ids : list of ints
+        The study ids to filter
+    text : str, optional
+        Only keep the studies that contain this text (case insensitive) in
+        their title, alias, abstract, id or PI name. Default: no filtering
+    tags : list of str, optional
+        Only keep the studies that have all these tags. Default: no filtering
+
+    Returns
+    -------
+    list of int
+        The filtered study ids, sorted
+    """
+    if not study_ids:
+        return []
+
+    with qdb.sql_connection.TRN:
+        sql = """SELECT study_id
+                 FROM qiita.study
+                    LEFT JOIN qiita.study_person ON (
+                        study_person_id=principal_investigator_id)
+                 WHERE study_id IN %s"""
+        sql_args = [tuple(study_ids)]
+        if text:
+            sql += """ AND (study_title ILIKE %s OR study_alias ILIKE %s
+                            OR study_abstract ILIKE %s
+                            OR study_id::varchar ILIKE %s
+                            OR qiita.study_person.name ILIKE %s)"""
+            like = '%%%s%%' % text
+            sql_args.extend([like] * 5)
+        if tags:
+            sql += """ AND study_id IN (
+                            SELECT study_id FROM qiita.per_study_tags
+                            WHERE study_tag IN %s
+                            GROUP BY study_id
+                            HAVING COUNT(DISTINCT study_tag) = %s)"""
+            sql_args.extend([tuple(tags), len(set(tags))])
+        sql += " ORDER BY study_id"
+        qdb.sql_connection.TRN.add(sql, sql_args)
+        return qdb.sql_connection.TRN.execute_fetchflatten()
+
+
+def generate_study_list(study_ids, public_only=False, sort_column=None,
+                        sort_descending=False, offset=None, limit=None):
+    """Get general study information
+
+    Parameters
+    ----------
+    study_ids : list of ints
+        The study ids to look for. Non-existing ids will be ignored
+    public_only : bool, optional
+        If true, return only public BIOM artifacts. Default: false.
+    sort_column : str, optional
+        The listing column used to sort the studies, one of
+        STUDY_LIST_SORT_COLUMNS. Default: sort by study id
+    sort_descending : bool, optional
+        Whether to sort in descending order. Default: false.
+    offset : int, optional
+        The number of studies to skip, after sorting. Default: none
+    limit : int, optional
+        The maximum number of studies to return, after sorting.
+        Default: all of them
+
+    Returns
+    -------
+    list of dict
+        The list of studies and their information
+
+    Notes
+    -----
+    The fields that need aggregating other tables (number of samples, BIOM
+    artifacts, publications, shared users, tags and owner) are read from
+    qiita.study_listing_summary, see update_study_listing_summary. The
+    study status is inferred from its artifacts' visibilities as in
+    infer_status (see STUDY_STATUS_SQL).
+
+    The studies are always sorted by study_id after the sort_column, so the
+    pages returned by offset/limit are stable; only the requested page is
+    computed.
+
+    Raises
+    ------
+    ValueError
+        If sort_column is not one of STUDY_LIST_SORT_COLUMNS
+    """
+    if sort_column is None:
+        sort_column = 'study_id'
+    if sort_column not in STUDY_LIST_SORT_COLUMNS:
+        raise ValueError('Unknown sort column: %s' % sort_column)
+    if not study_ids:
+        return []
+
+    direction = 'DESC' if sort_descending else 'ASC'
+    order_by = '%s %s, study_id %s' % (
+        STUDY_LIST_SORT_COLUMNS[sort_column], direction, direction)
+
+    with qdb.sql_connection.TRN:
+        sql = """
+            SELECT metadata_complete, study_abstract, study_id, study_alias,
+                study_title, ebi_study_accession, ebi_submission_status,
+                qiita.study_person.name AS pi_name,
+                qiita.study_person.email AS pi_email,
+                COALESCE(qiita.study_listing_summary.number_samples_collected,
+                         0) AS number_samples_collected,
+                artifact_biom_ids, publications, shared_with_name,
+                shared_with_email, study_tags, owner,
+                {1} AS status
                 FROM qiita.study
                 LEFT JOIN qiita.study_person ON (
                     study_person_id=principal_investigator_id)
+                LEFT JOIN qiita.study_listing_summary USING (study_id)
                 WHERE study_id IN %s
-                ORDER BY study_id"""
-        qdb.sql_connection.TRN.add(sql, [tuple(study_ids)])
+                ORDER BY {0}""".format(order_by, STUDY_STATUS_SQL)
+        sql_args = [tuple(study_ids)]
+        if limit is not None:
+            sql += " LIMIT %s"
+            sql_args.append(limit)
+        if offset:
+            sql += " OFFSET %s"
+            sql_args.append(offset)
+        qdb.sql_connection.TRN.add(sql, sql_args)
         infolist = []
         for info in qdb.sql_connection.TRN.execute_fetchindex():
             info = dict(info)
@@ -1428,7 +2097,6 @@ def generate_study_list(study_ids, public_only=False):
             del info["shared_with_name"]
             del info["shared_with_email"]
 
-            info['status'] = qdb.study.Study(info['study_id']).status
             infolist.append(info)
     return infolist
 
@@ -1450,20 +2118,10 @@ def generate_study_list_without_artifacts(study_ids, public_only=False):
 
     Notes
     -----
-    The main select might look scary but it's pretty simple:
-    - We select the requiered fields from qiita.study and qiita.study_person
-        SELECT metadata_complete, study_abstract, study_id, study_alias,
-            study_title, ebi_study_accession, ebi_submission_status,
-            qiita.study_person.name AS pi_name,
-            qiita.study_person.email AS pi_email,
-    - the total number of samples collected by counting sample_ids
-            (SELECT COUNT(sample_id) FROM qiita.study_sample
-                WHERE study_id=qiita.study.study_id)
-                AS number_samples_collected]
-    - all the publications that belong to the study
-            (SELECT array_agg((publication, is_doi)))
-                FROM qiita.study_publication
-                WHERE study_id=qiita.study.study_id) AS publications
+    The number of samples and the publications are read from
+    qiita.study_listing_summary, see update_study_listing_summary. The study
+    status is inferred from its artifacts' visibilities as in infer_status
+    (see STUDY_STATUS_SQL).
     """
     with qdb.sql_connection.TRN:
         sql = """
@@ -1471,17 +2129,16 @@ def generate_study_list_without_artifacts(study_ids, public_only=False):
                 study_title, ebi_study_accession, ebi_submission_status,
                 qiita.study_person.name AS pi_name,
                 qiita.study_person.email AS pi_email,
-                (SELECT COUNT(sample_id) FROM qiita.study_sample
-                    WHERE study_id=qiita.study.study_id)
-                    AS number_samples_collected,
-                (SELECT array_agg(row_to_json((publication, is_doi), true))
-                    FROM qiita.study_publication
-                    WHERE study_id=qiita.study.study_id) AS publications
+                COALESCE(qiita.study_listing_summary.number_samples_collected,
+                         0) AS number_samples_collected,
+                publications,
+                {0} AS status
                 FROM qiita.study
                 LEFT JOIN qiita.study_person ON (
                     study_person_id=principal_investigator_id)
+                LEFT JOIN qiita.study_listing_summary USING (study_id)
                 WHERE study_id IN %s
-                ORDER BY study_id"""
+                ORDER BY study_id""".format(STUDY_STATUS_SQL)
         qdb.sql_connection.TRN.add(sql, [tuple(study_ids)])
         infolist = []
         for info in qdb.sql_connection.TRN.execute_fetchindex():
@@ -1506,7 +2163,6 @@ def generate_study_list_without_artifacts(study_ids, public_only=False):
             del info["pi_email"]
             del info["pi_name"]
 
-            info['status'] = qdb.study.Study(info['study_id']).status
             infolist.append(info)
     return infolist
 
@@ -1563,19 +2219,11 @@ def get_artifacts_information(artifact_ids, only_biom=True):
                 GROUP BY a.artifact_id, a.name, a.command_id, sc.name,
                          a.generated_timestamp, dt.data_type, parent_id,
                          parent_info.command_id, parent_info.name
-                ORDER BY a.command_id, artifact_id),
-              has_target_subfragment AS (
-                SELECT main_query.*, CASE WHEN (
-                        SELECT true FROM information_schema.columns
-                        WHERE table_name = 'prep_' || CAST(
-                            prep_template_id AS TEXT)
-                        AND column_name='target_subfragment')
-                    THEN prep_template_id ELSE NULL END, prep_template_id
-                FROM main_query
-                LEFT JOIN qiita.prep_template pt ON (
-                    main_query.root_id = pt.artifact_id)
-            )
-            SELECT * FROM has_target_subfragment
+                ORDER BY a.command_id, artifact_id)
+            SELECT main_query.*, prep_template_id
+            FROM main_query
+            LEFT JOIN qiita.prep_template pt ON (
+                main_query.root_id = pt.artifact_id)
             ORDER BY cid, data_type, artifact_id
             """
 
@@ -1584,28 +2232,80 @@ def get_artifacts_information(artifact_ids, only_biom=True):
                         WHERE parameter_type = 'artifact'
                         GROUP BY command_id"""
 
-        sql_ts = """SELECT DISTINCT target_subfragment FROM qiita.prep_%s"""
+        # the merging schemes of all the commands, see Command.merging_scheme
+        sql_ms_params = """SELECT command_id,
+                                  array_agg(parameter_name
+                                            ORDER BY parameter_name)
+                           FROM qiita.command_parameter
+                           WHERE check_biom_merge = TRUE
+                           GROUP BY command_id"""
+        sql_ms_outputs = """SELECT command_id, array_agg(name ORDER BY name)
+                            FROM qiita.command_output
+                            WHERE check_biom_merge = TRUE
+                            GROUP BY command_id"""
+
+        sql_has_ts = """SELECT table_name
+                        FROM information_schema.columns
+                        WHERE table_schema = 'qiita'
+                            AND table_name IN %s
+                            AND column_name = 'target_subfragment'"""
+
+        sql_ts = """SELECT DISTINCT {0}, target_subfragment
+                    FROM qiita.prep_{0}"""
+
+        sql_ps = """SELECT prep_template_id, COUNT(sample_id)
+                    FROM qiita.prep_template_sample
+                    WHERE prep_template_id IN %s
+                    GROUP BY prep_template_id"""
 
         with qdb.sql_connection.TRN:
             results = []
 
             # getting all commands and their artifact parameters so we can
             # delete from the results below
-            commands = {}
+            commands = defaultdict(lambda: {
+                'params': [],
+                'merging_scheme': {'parameters': [], 'outputs': []}})
             qdb.sql_connection.TRN.add(sql_params)
             for cid, params in qdb.sql_connection.TRN.execute_fetchindex():
-                commands[cid] = {
-                    'params': params,
-                    'merging_scheme': qdb.software.Command(cid).merging_scheme}
+                commands[cid]['params'] = params
+            qdb.sql_connection.TRN.add(sql_ms_params)
+            for cid, params in qdb.sql_connection.TRN.execute_fetchindex():
+                commands[cid]['merging_scheme']['parameters'] = params
+            qdb.sql_connection.TRN.add(sql_ms_outputs)
+            for cid, outputs in qdb.sql_connection.TRN.execute_fetchindex():
+                commands[cid]['merging_scheme']['outputs'] = outputs
 
             # now let's get the actual artifacts
+            qdb.sql_connection.TRN.add(sql, [tuple(artifact_ids)])
+            rows = qdb.sql_connection.TRN.execute_fetchindex()
+
+            # the target subfragments and number of samples of all the preps,
+            # retrieved at once; only the preps that have a
+            # target_subfragment column are present in ts
             ts = {}
             ps = {}
-            PT = qdb.metadata_template.prep_template.PrepTemplate
-            qdb.sql_connection.TRN.add(sql, [tuple(artifact_ids)])
-            for row in qdb.sql_connection.TRN.execute_fetchindex():
+            prep_ids = tuple({row[-1] for row in rows if row[-1] is not None})
+            if prep_ids:
+                qdb.sql_connection.TRN.add(
+                    sql_has_ts, [tuple('prep_%d' % pid for pid in prep_ids)])
+                ts_ids = sorted(
+                    int(tn[len('prep_'):])
+                    for tn in qdb.sql_connection.TRN.execute_fetchflatten())
+                if ts_ids:
+                    ts = {pid: [] for pid in ts_ids}
+                    qdb.sql_connection.TRN.add(' UNION '.join(
+                        sql_ts.format(pid) for pid in ts_ids))
+                    for pid, target in sorted(
+                            qdb.sql_connection.TRN.execute_fetchindex()):
+                        ts[pid].append(target)
+
+                qdb.sql_connection.TRN.add(sql_ps, [prep_ids])
+                ps = dict(qdb.sql_connection.TRN.execute_fetchindex())
+
+            for row in rows:
                 aid, name, cid, cname, gt, aparams, dt, pid, pcid, pname, \
-                    pparams, filepaths, _, target, prep_template_id = row
+                    pparams, filepaths, _, prep_template_id = row
 
                 # cleaning up aparams
                 # - [0] due to the array_agg
@@ -1623,10 +2323,6 @@ def get_artifacts_information(artifact_ids, only_biom=True):
                 else:
                     filepaths = [fp for fp in filepaths if fp.endswith('biom')]
 
-                # - ignoring empty target
-                if target == [None]:
-                    target = []
-
                 # generating algorithm, by default is ''
                 algorithm = ''
                 if cid is not None:
@@ -1652,22 +2348,8 @@ def get_artifacts_information(artifact_ids, only_biom=True):
 
                     algorithm = '%s | %s' % (cname, palgorithm)
 
-                if target is None:
-                    target = []
-                else:
-                    if target not in ts:
-                        qdb.sql_connection.TRN.add(sql_ts, [target])
-                        ts[target] = \
-                            qdb.sql_connection.TRN.execute_fetchflatten()
-                    target = ts[target]
-
-                if prep_template_id is None:
-                    prep_samples = 0
-                else:
-                    if prep_template_id not in ps:
-                        ps[prep_template_id] = len(list(
-                            PT(prep_template_id).keys()))
-                    prep_samples = ps[prep_template_id]
+                target = ts.get(prep_template_id, [])
+                prep_samples = ps.get(prep_template_id, 0)
 
                 results.append({
                     'artifact_id': aid,
@@ -17,6 +17,7 @@ from datetime import datetime
 from .base_handlers import BaseHandler
 from qiita_pet.handlers.api_proxy.util import check_access
 from qiita_db.study import Study
+from qiita_db.artifact import Artifact
 from qiita_db.util import (filepath_id_to_rel_path, get_db_files_base_dir,
                            get_filepath_information, get_mountpoint)
 from qiita_db.meta_util import validate_filepath_access_by_user
@@ -72,13 +73,16 @@ class BaseHandlerDownload(BaseHandler):
                 to_download.append((fullpath, spath, spath))
         return to_download
 
-    def _list_artifact_files_nginx(self, artifact):
+    def _list_artifact_files_nginx(self, artifact_id, artifact_info):
         """Generates a nginx list of files for the given artifact
 
         Parameters
         ----------
-        artifact : qiita_db.artifact.Artifact
-            The artifact to retrieve the files
+        artifact_id : int
+            The id of the artifact
+        artifact_info : dict
+            The 'filepaths' and 'prep_template_ids' of the artifact, as
+            returned by qiita_db.artifact.Artifact.get_info
 
         Returns
         -------
@@ -88,7 +92,8 @@ class BaseHandlerDownload(BaseHandler):
         basedir = get_db_files_base_dir()
         basedir_len = len(basedir) + 1
         to_download = []
-        for i, (fid, path, data_type) in enumerate(artifact.filepaths):
+        for i, (fid, path, data_type) in enumerate(
+                artifact_info['filepaths']):
             # ignore if tgz as they could create problems and the
             # raw data is in the folder
             if data_type == 'tgz':
@@ -104,15 +109,15 @@ class BaseHandlerDownload(BaseHandler):
             else:
                 to_download.append((path, path, path))
 
-        for pt in artifact.prep_templates:
-            qmf = pt.qiime_map_fp
+        for pt_id in artifact_info['prep_template_ids']:
+            qmf = PrepTemplate(pt_id).qiime_map_fp
             if qmf is not None:
                 sqmf = qmf
                 if qmf.startswith(basedir):
                     sqmf = qmf[basedir_len:]
                 to_download.append(
                     (qmf, sqmf, 'mapping_files/%s_mapping_file.txt'
-                                % artifact.id))
+                                % artifact_id))
         return to_download
 
     def _write_nginx_file_list(self, to_download):
@@ -212,9 +217,14 @@ class DownloadStudyBIOMSHandler(BaseHandlerDownload):
             ((self.current_user == study.owner) |
              (self.current_user in study.shared_with)))
 
-        for a in study.artifacts(artifact_type='BIOM'):
-            if full_access or a.visibility == 'public':
-                to_download.extend(self._list_artifact_files_nginx(a))
+        artifact_ids = Artifact.get_study_artifact_ids(
+            [study_id], artifact_type='BIOM')[study_id]
+        infos = Artifact.get_info(
+            artifact_ids, ['visibility', 'filepaths', 'prep_template_ids'])
+        for a_id in artifact_ids:
+            if full_access or infos[a_id]['visibility'] == 'public':
+                to_download.extend(
+                    self._list_artifact_files_nginx(a_id, infos[a_id]))
 
         self._write_nginx_file_list(to_download)
 
@@ -259,9 +269,13 @@ class DownloadRawData(BaseHandlerDownload):
 
         # loop over artifacts and retrieve raw data (no parents)
         to_download = []
-        for a in study.artifacts():
-            if not a.parents:
-                to_download.extend(self._list_artifact_files_nginx(a))
+        artifact_ids = Artifact.get_study_artifact_ids([study_id])[study_id]
+        infos = Artifact.get_info(
+            artifact_ids, ['parent_ids', 'filepaths', 'prep_template_ids'])
+        for a_id in artifact_ids:
+            if not infos[a_id]['parent_ids']:
+                to_download.extend(
+                    self._list_artifact_files_nginx(a_id, infos[a_id]))
 
         self._write_nginx_file_list(to_download)
 
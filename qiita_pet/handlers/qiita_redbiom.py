@@ -18,7 +18,7 @@ from tornado.gen import coroutine, Task
 
 from qiita_core.util import execute_as_transaction
 from qiita_db.util import generate_study_list_without_artifacts
-from qiita_db.study import Study
+from qiita_db.artifact import Artifact
 
 from .base_handlers import BaseHandler
 
@@ -46,10 +46,11 @@ class RedbiomPublicSearch(BaseHandler):
             study_samples = defaultdict(list)
             for s in samples:
                 study_samples[s.split('.', 1)[0]].append(s)
+            artifact_ids = Artifact.get_study_artifact_ids(
+                [int(sid) for sid in study_samples], artifact_type='BIOM')
             for sid, samps in viewitems(study_samples):
                 study_artifacts[sid] = {
-                    a.id: samps for a in Study(sid).artifacts(
-                        artifact_type='BIOM')}
+                    aid: samps for aid in artifact_ids[int(sid)]}
 
         return message, study_artifacts
 
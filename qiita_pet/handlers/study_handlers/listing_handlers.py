@@ -6,7 +6,7 @@
 # The full license is in the file LICENSE, distributed with this software.
 # -----------------------------------------------------------------------------
 from __future__ import division
-from json import dumps
+from json import dumps, loads
 from future.utils import viewitems
 from collections import defaultdict
 
@@ -23,7 +23,8 @@ from qiita_db.study import Study
 from qiita_db.search import QiitaStudySearch
 from qiita_db.logger import LogEntry
 from qiita_db.exceptions import QiitaDBIncompatibleDatatypeError
-from qiita_db.util import (add_message, generate_study_list)
+from qiita_db.util import (add_message, generate_study_list,
+                           filter_study_list, STUDY_LIST_SORT_COLUMNS)
 from qiita_pet.util import EBI_LINKIFIER
 from qiita_pet.handlers.base_handlers import BaseHandler
 from qiita_pet.handlers.util import (
@@ -32,8 +33,8 @@ from qiita_pet.handlers.util import (
 
 
 @execute_as_transaction
-def _build_study_info(user, search_type, study_proc=None, proc_samples=None):
-    """Builds list of dicts for studies table, with all HTML formatted
+def _get_study_ids(user, search_type, study_proc=None, proc_samples=None):
+    """Gets the ids of the studies to list in the studies table
 
     Parameters
     ----------
@@ -50,9 +51,8 @@ def _build_study_info(user, search_type, study_proc=None, proc_samples=None):
 
     Returns
     -------
-    infolist: list of dict of lists and dicts
-        study and processed data info for JSON serialiation for datatables
-        Each dict in the list is a single study, and contains the text
+    list of int
+        The sorted study ids
 
     Notes
     -----
@@ -67,26 +67,58 @@ def _build_study_info(user, search_type, study_proc=None, proc_samples=None):
             'Must pass study_proc when proc_samples given')
 
     # get list of studies for table
-    user_study_set = user.user_studies.union(user.shared_studies)
+    user_study_set = user.user_study_ids.union(user.shared_study_ids)
     if search_type == 'user':
         if user.level == 'admin':
             user_study_set = (user_study_set |
-                              Study.get_by_status('sandbox') |
-                              Study.get_by_status('private') |
-                              Study.get_by_status('awaiting_approval') -
-                              Study.get_by_status('public'))
+                              Study.get_ids_by_status('sandbox') |
+                              Study.get_ids_by_status('private') |
+                              Study.get_ids_by_status('awaiting_approval') -
+                              Study.get_ids_by_status('public'))
         study_set = user_study_set
     elif search_type == 'public':
-        study_set = Study.get_by_status('public') - user_study_set
+        study_set = Study.get_ids_by_status('public') - user_study_set
     else:
         raise ValueError('Not a valid search type')
     if study_proc is not None:
         study_set = study_set.intersection(study_proc)
-    if not study_set:
+
+    return sorted(study_set)
+
+
+@execute_as_transaction
+def _build_study_info(user, search_type, study_proc=None, proc_samples=None):
+    """Builds list of dicts for studies table, with all HTML formatted
+
+    Parameters
+    ----------
+    user : User object
+        logged in user
+    search_type : choice, ['user', 'public']
+        what kind of search to perform
+    study_proc : dict of lists, optional
+        Dictionary keyed on study_id that lists all processed data associated
+        with that study. Required if proc_samples given.
+    proc_samples : dict of lists, optional
+        Dictionary keyed on proc_data_id that lists all samples associated with
+        that processed data. Required if study_proc given.
+
+    Returns
+    -------
+    infolist: list of dict of lists and dicts
+        study and processed data info for JSON serialiation for datatables
+        Each dict in the list is a single study, and contains the text
+
+    Notes
+    -----
+    Both study_proc and proc_samples must be passed, or neither passed.
+    """
+    study_ids = _get_study_ids(user, search_type, study_proc, proc_samples)
+    if not study_ids:
         # No studies left so no need to continue
         return []
 
-    return generate_study_list([s.id for s in study_set],
+    return generate_study_list(study_ids,
                                public_only=(search_type == 'public'))
 
 
@@ -216,11 +248,35 @@ class SearchStudiesAJAX(BaseHandler):
                 return
         else:
             study_proc = proc_samples = None
-        info = _build_study_info(self.current_user, search_type, study_proc,
-                                 proc_samples)
+
+        # datatables server-side processing: only the requested page is
+        # retrieved from the database
+        start = int(self.get_argument('iDisplayStart', 0))
+        length = int(self.get_argument('iDisplayLength', -1))
+        sort_column = None
+        sort_col_idx = self.get_argument('iSortCol_0', None)
+        if sort_col_idx is not None:
+            sort_column = self.get_argument('mDataProp_%s' % sort_col_idx,
+                                            None)
+            if sort_column not in STUDY_LIST_SORT_COLUMNS:
+                sort_column = None
+        sort_descending = self.get_argument('sSortDir_0', 'asc') == 'desc'
+        filter_text = self.get_argument('sSearch', '')
+        tags = loads(self.get_argument('tags', '[]'))
+
+        study_ids = _get_study_ids(self.current_user, search_type,
+                                   study_proc, proc_samples)
+        total_records = len(study_ids)
+        if study_ids and (filter_text or tags):
+            study_ids = filter_study_list(study_ids, filter_text, tags)
+        total_display_records = len(study_ids)
+
+        info = generate_study_list(
+            study_ids, public_only=(search_type == 'public'),
+            sort_column=sort_column, sort_descending=sort_descending,
+            offset=start, limit=length if length >= 0 else None)
         # linkifying data
-        len_info = len(info)
-        for i in range(len_info):
+        for i in range(len(info)):
             info[i]['shared'] = ", ".join([study_person_linkifier(element)
                                            for element in info[i]['shared']])
 
@@ -243,8 +299,8 @@ class SearchStudiesAJAX(BaseHandler):
         # build the table json
         results = {
             "sEcho": echo,
-            "iTotalRecords": len_info,
-            "iTotalDisplayRecords": len_info,
+            "iTotalRecords": total_records,
+            "iTotalDisplayRecords": total_display_records,
             "aaData": info
         }
 
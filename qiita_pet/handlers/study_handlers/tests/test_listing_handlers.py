@@ -351,6 +351,51 @@ class TestSearchStudiesAJAX(TestHandlerBase):
         # make sure responds properly
         self.assertEqual(loads(response.body), self.empty)
 
+    def test_get_paging(self):
+        response = self.get('/study/search/', {
+            'user': 'test@foo.bar',
+            'search_type': 'user',
+            'query': '',
+            'sEcho': '1021',
+            'iDisplayStart': '0',
+            'iDisplayLength': '10',
+            'iSortCol_0': '1',
+            'sSortDir_0': 'desc',
+            'mDataProp_1': 'study_title',
+            'sSearch': 'cannabis'
+            })
+        self.assertEqual(response.code, 200)
+        self.assertEqual(loads(response.body), self.json)
+
+        response = self.get('/study/search/', {
+            'user': 'test@foo.bar',
+            'search_type': 'user',
+            'query': '',
+            'sEcho': '1021',
+            'iDisplayStart': '1',
+            'iDisplayLength': '10'
+            })
+        self.assertEqual(response.code, 200)
+        exp = {'aaData': [],
+               'iTotalDisplayRecords': 1,
+               'iTotalRecords': 1,
+               'sEcho': 1021}
+        self.assertEqual(loads(response.body), exp)
+
+        response = self.get('/study/search/', {
+            'user': 'test@foo.bar',
+            'search_type': 'user',
+            'query': '',
+            'sEcho': '1021',
+            'sSearch': 'not a study'
+            })
+        self.assertEqual(response.code, 200)
+        exp = {'aaData': [],
+               'iTotalDisplayRecords': 0,
+               'iTotalRecords': 1,
+               'sEcho': 1021}
+        self.assertEqual(loads(response.body), exp)
+
     def test_get_failure_malformed_query(self):
         response = self.get('/study/search/', {
             'user': 'test@foo.bar',
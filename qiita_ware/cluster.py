@@ -0,0 +1,120 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+
+import re
+from os.path import basename
+from subprocess import check_output
+
+from qiita_core.qiita_settings import qiita_config
+
+
+JOB_ID_RE = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+class ClusterBackend(object):
+    """Base class of the backends where the Qiita jobs are executed"""
+    def job_ids(self):
+        """Returns the ids of all the Qiita jobs known by the backend
+
+        Returns
+        -------
+        set of str
+            The ids of the Qiita jobs queued or running in the backend
+        """
+        raise NotImplementedError()
+
+
+class TorqueBackend(ClusterBackend):
+    """Torque (PBS) cluster, in which the jobs are named after their id
+
+    Parameters
+    ----------
+    owner : str, optional
+        The user submitting the Qiita jobs to the cluster. Default: qiita
+    """
+    def __init__(self, owner='qiita'):
+        self.owner = owner
+
+    def job_ids(self):
+        """Returns the ids of all the Qiita jobs known by the backend
+
+        Returns
+        -------
+        set of str
+            The ids of the Qiita jobs queued or running in the backend
+
+        Notes
+        -----
+        The information of all the jobs is retrieved with a single qstat
+        call. The array jobs (i.e. the ipython workers), the private jobs and
+        the completed jobs are ignored
+        """
+        return self._parse_qstat(check_output(['qstat', '-f']))
+
+    def _parse_qstat(self, output):
+        """Parses the output of `qstat -f`
+
+        Parameters
+        ----------
+        output : str
+            The output of `qstat -f`
+
+        Returns
+        -------
+        set of str
+            The ids of the Qiita jobs in `output`
+        """
+        job_ids = set()
+        jobs = []
+        for line in output.splitlines():
+            if line.startswith('Job Id:'):
+                jobs.append({'id': line.split(':', 1)[1].strip()})
+            elif jobs and ' = ' in line:
+                key, value = line.split(' = ', 1)
+                jobs[-1][key.strip()] = value.strip()
+        for job in jobs:
+            name = job.get('Job_Name', '')
+            if ('[]' in job['id'] or 'private' in name or
+                    job.get('job_state') == 'C' or
+                    job.get('Job_Owner', '').split('@')[0] != self.owner):
+                continue
+            # The name of the job is its id followed by an extension
+            job_ids.add(name.split('.')[0])
+        return job_ids
+
+
+class LocalBackend(ClusterBackend):
+    """The local machine, in which the jobs run as launcher processes
+
+    Parameters
+    ----------
+    launcher : str, optional
+        The name of the launcher executing the jobs. Default: the plugin
+        launcher of the configuration
+    """
+    def __init__(self, launcher=None):
+        if launcher is None:
+            launcher = basename(qiita_config.plugin_launcher.split()[0])
+        self.launcher = launcher
+
+    def job_ids(self):
+        """Returns the ids of all the Qiita jobs known by the backend
+
+        Returns
+        -------
+        set of str
+            The ids of the Qiita jobs running in the local machine
+        """
+        output = check_output(['ps', '-eo', 'args'])
+        return {job_id for line in output.splitlines()
+                if self.launcher in line
+                for job_id in JOB_ID_RE.findall(line)}
+
+
+CLUSTER_BACKENDS = {'torque': TorqueBackend, 'local': LocalBackend}
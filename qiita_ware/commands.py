@@ -62,13 +62,14 @@ def submit_EBI(preprocessed_data_id, action, send):
                             ("Submitting sequences for pre_processed_id: "
                              "%d" % preprocessed_data_id))
             for cmd in ebi_submission.generate_send_sequences_cmd():
-                stdout, stderr, rv = system_call(cmd)
+                # The output of ascp is written to the reply file while the
+                # sequences are sent, only its end is kept in memory
+                stdout, stderr, rv = system_call(
+                    cmd, log_fp=ebi_submission.ascp_reply)
                 if rv != 0:
                     error_msg = ("Error:\nStd output:%s\nStd error:%s" % (
                         stdout, stderr))
                     raise ComputeError(error_msg)
-                open(ebi_submission.ascp_reply, 'a').write(
-                    'stdout:\n%s\n\nstderr: %s' % (stdout, stderr))
             environ['ASPERA_SCP_PASS'] = old_ascp_pass
             LogEntry.create('Runtime',
                             ('Submission of sequences of pre_processed_id: '
@@ -175,11 +176,10 @@ def submit_VAMPS(artifact_id):
     targz.close()
 
     # submitting
-    cmd = ("curl -F user=%s -F pass='%s' -F uploadFile=@%s -F "
-           "press=UploadFile %s" % (qiita_config.vamps_user,
-                                    qiita_config.vamps_pass,
-                                    targz_fp,
-                                    qiita_config.vamps_url))
+    cmd = ['curl', '-F', 'user=%s' % qiita_config.vamps_user,
+           '-F', 'pass=%s' % qiita_config.vamps_pass,
+           '-F', 'uploadFile=@%s' % targz_fp,
+           '-F', 'press=UploadFile', qiita_config.vamps_url]
     obs, stderr, rv = system_call(cmd)
     if rv != 0:
         error_msg = ("Error:\nStd output:%s\nStd error:%s" % (obs, stderr))
@@ -813,8 +813,9 @@ class EBISubmission(object):
 
         Returns
         -------
-        ascp_command
-            The ascp command to be executed
+        list of list of str
+            The ascp commands to be executed, as lists of arguments so they
+            are executed without a shell
 
         Notes
         -----
@@ -824,14 +825,14 @@ class EBISubmission(object):
         fastqs = [sfp for _, sfp in viewitems(self.sample_demux_fps)]
         # divide all the fastqs in groups of 10
         fastqs_div = [fastqs[i::10] for i in range(10) if fastqs[i::10]]
+        destination = '{0}@{1}:./{2}/'.format(
+            qiita_config.ebi_seq_xfer_user, qiita_config.ebi_seq_xfer_url,
+            self.ebi_dir)
         ascp_commands = []
         for f in fastqs_div:
-            ascp_commands.append('ascp --ignore-host-key -d -QT -k2 '
-                                 '{0} {1}@{2}:./{3}/'.format(
-                                     ' '.join(f),
-                                     qiita_config.ebi_seq_xfer_user,
-                                     qiita_config.ebi_seq_xfer_url,
-                                     self.ebi_dir))
+            ascp_commands.append(
+                ['ascp', '--ignore-host-key', '-d', '-QT', '-k2'] + f +
+                [destination])
 
         return ascp_commands
 
@@ -9,7 +9,9 @@
 from json import dumps, loads
 from sys import exc_info
 from time import sleep
-from os import remove
+from os import remove, getpid
+from multiprocessing import Process
+from signal import signal, SIGTERM, SIG_DFL
 import traceback
 import warnings
 
@@ -60,17 +62,21 @@ def build_analysis_files(job):
 
 
 def release_validators(job):
-    """Waits until all the validators of a job are completed
+    """Releases the validators of a job, once all of them are completed
 
     Parameters
     ----------
     job : qiita_db.processing_job.ProcessingJob
         The processing job with the information of the parent job
+
+    Notes
+    -----
+    This is not run within a transaction, so no transaction is kept open if
+    release_validators has to wait for the validators
     """
-    with qdb.sql_connection.TRN:
-        qdb.processing_job.ProcessingJob(
-            job.parameters.values['job']).release_validators()
-        job._set_status('success')
+    qdb.processing_job.ProcessingJob(
+        job.parameters.values['job']).release_validators()
+    job._set_status('success')
 
 
 def submit_to_VAMPS(job):
@@ -342,6 +348,24 @@ def complete_job(job):
         # here we should call the method from the command to archive
 
 
+def reuse_memoized_job(job):
+    """Completes a job with the outputs of a previous job
+
+    Parameters
+    ----------
+    job : qiita_db.processing_job.ProcessingJob
+        The processing job performing the task
+    """
+    param_vals = job.parameters.values
+    r_job = qdb.processing_job.ProcessingJob(param_vals['job'])
+    try:
+        r_job._complete_from_memoized_job(
+            qdb.processing_job.ProcessingJob(param_vals['previous']))
+    except Exception:
+        r_job._set_error(''.join(traceback.format_exception(*exc_info())))
+    job._set_status('success')
+
+
 def delete_analysis(job):
     """Deletes a full analysis
 
@@ -380,6 +404,7 @@ TASK_DICT = {'build_analysis_files': build_analysis_files,
              'delete_sample_or_column': delete_sample_or_column,
              'delete_study': delete_study,
              'complete_job': complete_job,
+             'reuse_memoized_job': reuse_memoized_job,
              'delete_analysis': delete_analysis}
 
 
@@ -406,3 +431,176 @@ def private_task(job_id):
             job.id, ''.join(traceback.format_exception(*exc_info())))
         le = qdb.logger.LogEntry.create('Runtime', log_msg)
         job.complete(False, error="Error (log id: %d): %s" % (le.id, e))
+
+    # The task finished at least one job (e.g. complete_job finishes two), so
+    # there may be room in the scheduler for the jobs waiting there
+    qdb.processing_job.schedule_jobs()
+
+
+# Seconds that a private worker waits for a job before asking again
+PRIVATE_WORKER_TIMEOUT = 5
+
+
+def private_worker(max_tasks):
+    """Runs the private jobs queued in redis
+
+    Parameters
+    ----------
+    max_tasks : int
+        The number of jobs to run before exiting, so the memory used by the
+        worker is returned to the system
+
+    Notes
+    -----
+    The job being run is kept in a redis list of the worker, so the pool can
+    complete it with an error if the worker dies while running it. The
+    process of the worker exits without running the atexit functions, so the
+    jobs submitted by the tasks are flushed before returning and after a
+    task fails
+    """
+    key = qdb.processing_job.PRIVATE_WORKER_KEY % getpid()
+    tasks = 0
+    while tasks < max_tasks:
+        job_id = r_client.brpoplpush(qdb.processing_job.PRIVATE_TASK_QUEUE,
+                                     key, PRIVATE_WORKER_TIMEOUT)
+        if job_id is None:
+            continue
+        tasks += 1
+        try:
+            private_task(job_id)
+        except Exception:
+            # private_task already completes the job if the task fails, this
+            # is an error outside of the task and the worker can continue
+            qdb.logger.LogEntry.create(
+                'Runtime', 'Error running private job %s: %s'
+                % (job_id, traceback.format_exc()), info={'job_id': job_id})
+            qdb.processing_job.get_submission_executor().shutdown()
+        r_client.delete(key)
+    qdb.processing_job.get_submission_executor().shutdown()
+
+
+def private_worker_job_ids():
+    """Returns the ids of the jobs queued or running in the private workers
+
+    Returns
+    -------
+    set of str
+        The job ids
+    """
+    job_ids = set(r_client.lrange(
+        qdb.processing_job.PRIVATE_TASK_QUEUE, 0, -1))
+    # SCAN doesn't block redis while going through the keys, as KEYS does
+    for key in r_client.scan_iter(
+            match=qdb.processing_job.PRIVATE_WORKER_KEY % '*'):
+        job_ids.update(r_client.lrange(key, 0, -1))
+    return job_ids
+
+
+def _private_worker_main(max_tasks):
+    # The worker is forked from the pool, so it can't share its connection to
+    # the DB
+    qdb.sql_connection.create_new_transaction()
+    # The pool stops the workers with SIGTERM, which it handles itself
+    signal(SIGTERM, SIG_DFL)
+    private_worker(max_tasks)
+
+
+class PrivateWorkerPool(object):
+    """Keeps a number of private workers running
+
+    Parameters
+    ----------
+    workers : int
+        The number of worker processes
+    max_tasks : int
+        The number of jobs run by a worker before it is replaced
+
+    Notes
+    -----
+    Each job runs in one of the worker processes, so a job crashing its
+    worker doesn't affect the other jobs. The worker is replaced and the job
+    it was running is completed with an error. The workers are not daemonic,
+    as the jobs they run can submit new jobs through the pool of
+    qiita_db.processing_job.get_submission_executor, and daemonic processes
+    can't have children.
+    """
+    def __init__(self, workers, max_tasks):
+        self.workers = workers
+        self.max_tasks = max_tasks
+        self._procs = []
+
+    def _start_worker(self):
+        proc = Process(target=_private_worker_main, args=(self.max_tasks,))
+        proc.start()
+        return proc
+
+    def _release(self, proc):
+        """Completes with an error the job of a worker that exited
+
+        Parameters
+        ----------
+        proc : multiprocessing.Process
+            The worker that exited
+        """
+        key = qdb.processing_job.PRIVATE_WORKER_KEY % proc.pid
+        for job_id in r_client.lrange(key, 0, -1):
+            error = ("The private worker running the job exited "
+                     "unexpectedly (exit code: %s)" % proc.exitcode)
+            try:
+                qdb.processing_job.ProcessingJob(job_id).complete(
+                    False, error=error)
+            except Exception:
+                qdb.logger.LogEntry.create(
+                    'Runtime', 'Error completing private job %s: %s'
+                    % (job_id, traceback.format_exc()),
+                    info={'job_id': job_id})
+        r_client.delete(key)
+
+    def check(self):
+        """Replaces the workers that exited
+
+        Returns
+        -------
+        int
+            The number of workers started
+        """
+        started = 0
+        while len(self._procs) < self.workers:
+            self._procs.append(self._start_worker())
+            started += 1
+        for i, proc in enumerate(self._procs):
+            if proc.is_alive():
+                continue
+            self._release(proc)
+            self._procs[i] = self._start_worker()
+            started += 1
+        return started
+
+    def stop(self):
+        """Stops the workers, completing their jobs with an error"""
+        for proc in self._procs:
+            proc.terminate()
+        for proc in self._procs:
+            proc.join()
+            self._release(proc)
+        self._procs = []
+
+    def run(self, interval=1):
+        """Starts the workers and keeps them running
+
+        Parameters
+        ----------
+        interval : int, optional
+            Seconds between checks of the workers. Default: 1
+
+        Notes
+        -----
+        The workers are stopped when this method exits (e.g. on a
+        KeyboardInterrupt), as they are not daemonic and would keep running
+        """
+        try:
+            while True:
+                self.check()
+                sleep(interval)
+        finally:
+            self.stop()
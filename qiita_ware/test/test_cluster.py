@@ -0,0 +1,103 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+
+from unittest import TestCase, main
+from subprocess import Popen
+from time import sleep
+
+from mock import patch
+
+from qiita_ware.cluster import TorqueBackend, LocalBackend
+
+
+QSTAT_OUTPUT = """Job Id: 1001.cluster.example.org
+    Job_Name = 063e553b-327c-4818-ab4a-adfe58e49860.txt
+    Job_Owner = qiita@head.example.org
+    job_state = R
+    queue = batch
+
+Job Id: 1002.cluster.example.org
+    Job_Name = bcc7ebcd-39c1-43e4-af2d-822e3589f14d.txt
+    Job_Owner = qiita@head.example.org
+    job_state = Q
+    queue = batch
+
+Job Id: 1003.cluster.example.org
+    Job_Name = b72369f9-a886-4193-8d3d-f7b504168e75.txt
+    Job_Owner = qiita@head.example.org
+    job_state = C
+    queue = batch
+
+Job Id: 1004.cluster.example.org
+    Job_Name = private_d19f76ee-274e-4c1b-b3a2-a12d73507c55.txt
+    Job_Owner = qiita@head.example.org
+    job_state = R
+    queue = batch
+
+Job Id: 1005[].cluster.example.org
+    Job_Name = ipengine
+    Job_Owner = qiita@head.example.org
+    job_state = R
+    queue = batch
+
+Job Id: 1006.cluster.example.org
+    Job_Name = ac653cb5-76a6-4a45-929e-eb9b2dee6b63.txt
+    Job_Owner = someone@head.example.org
+    job_state = R
+    queue = batch
+
+Job Id: 1007.cluster.example.org
+    Job_Name = 3c9991ab-6c14-4368-a48c-841e8837a79c.txt
+    Job_Owner = qiitadev@head.example.org
+    job_state = R
+    queue = batch
+"""
+
+
+class TorqueBackendTests(TestCase):
+    def test_job_ids(self):
+        with patch('qiita_ware.cluster.check_output',
+                   return_value=QSTAT_OUTPUT) as qstat:
+            obs = TorqueBackend().job_ids()
+        # A single call retrieves all the jobs
+        qstat.assert_called_once_with(['qstat', '-f'])
+        exp = {'063e553b-327c-4818-ab4a-adfe58e49860',
+               'bcc7ebcd-39c1-43e4-af2d-822e3589f14d'}
+        self.assertEqual(obs, exp)
+
+    def test_job_ids_owner(self):
+        with patch('qiita_ware.cluster.check_output',
+                   return_value=QSTAT_OUTPUT):
+            obs = TorqueBackend(owner='someone').job_ids()
+        self.assertEqual(obs, {'ac653cb5-76a6-4a45-929e-eb9b2dee6b63'})
+
+    def test_job_ids_empty(self):
+        with patch('qiita_ware.cluster.check_output', return_value=''):
+            self.assertEqual(TorqueBackend().job_ids(), set())
+
+
+class LocalBackendTests(TestCase):
+    def test_job_ids(self):
+        job_id = '063e553b-327c-4818-ab4a-adfe58e49860'
+        backend = LocalBackend(launcher='qiita-test-launcher')
+        self.assertNotIn(job_id, backend.job_ids())
+
+        proc = Popen(['bash', '-c', 'sleep 10; true qiita-test-launcher %s'
+                      % job_id])
+        try:
+            # Give some time to the process to start
+            sleep(0.5)
+            self.assertIn(job_id, backend.job_ids())
+        finally:
+            proc.kill()
+            proc.wait()
+        self.assertNotIn(job_id, backend.job_ids())
+
+
+if __name__ == '__main__':
+    main()
@@ -767,34 +767,18 @@ class TestEBISubmission(TestCase):
         e.generate_xml_files()
         obs = e.generate_send_sequences_cmd()
         _, base_fp = get_mountpoint("preprocessed_data")[0]
-        exp = ('ascp --ignore-host-key -d -QT -k2 '
-               '%(ebi_dir)s/1.SKB2.640194.fastq.gz '
-               'Webin-41528@webin.ebi.ac.uk:./%(aid)d_ebi_submission/\n'
-               'ascp --ignore-host-key -d -QT -k2 '
-               '%(ebi_dir)s/1.SKM4.640180.fastq.gz '
-               'Webin-41528@webin.ebi.ac.uk:./%(aid)d_ebi_submission/\n'
-               'ascp --ignore-host-key -d -QT -k2 '
-               '%(ebi_dir)s/1.SKB3.640195.fastq.gz '
-               'Webin-41528@webin.ebi.ac.uk:./%(aid)d_ebi_submission/\n'
-               'ascp --ignore-host-key -d -QT -k2 '
-               '%(ebi_dir)s/1.SKB6.640176.fastq.gz '
-               'Webin-41528@webin.ebi.ac.uk:./%(aid)d_ebi_submission/\n'
-               'ascp --ignore-host-key -d -QT -k2 '
-               '%(ebi_dir)s/1.SKD6.640190.fastq.gz '
-               'Webin-41528@webin.ebi.ac.uk:./%(aid)d_ebi_submission/\n'
-               'ascp --ignore-host-key -d -QT -k2 '
-               '%(ebi_dir)s/1.SKM6.640187.fastq.gz '
-               'Webin-41528@webin.ebi.ac.uk:./%(aid)d_ebi_submission/\n'
-               'ascp --ignore-host-key -d -QT -k2 '
-               '%(ebi_dir)s/1.SKD9.640182.fastq.gz '
-               'Webin-41528@webin.ebi.ac.uk:./%(aid)d_ebi_submission/\n'
-               'ascp --ignore-host-key -d -QT -k2 '
-               '%(ebi_dir)s/1.SKM8.640201.fastq.gz '
-               'Webin-41528@webin.ebi.ac.uk:./%(aid)d_ebi_submission/\n'
-               'ascp --ignore-host-key -d -QT -k2 '
-               '%(ebi_dir)s/1.SKM2.640199.fastq.gz '
-               'Webin-41528@webin.ebi.ac.uk:./%(aid)d_ebi_submission/' % {
-                   'ebi_dir': e.full_ebi_dir, 'aid': artifact.id}).split('\n')
+        dest = 'Webin-41528@webin.ebi.ac.uk:./%d_ebi_submission/' % artifact.id
+        exp = [['ascp', '--ignore-host-key', '-d', '-QT', '-k2',
+                '%s/%s.fastq.gz' % (e.full_ebi_dir, sample), dest]
+               for sample in ['1.SKB2.640194',
+                              '1.SKM4.640180',
+                              '1.SKB3.640195',
+                              '1.SKB6.640176',
+                              '1.SKD6.640190',
+                              '1.SKM6.640187',
+                              '1.SKD9.640182',
+                              '1.SKM8.640201',
+                              '1.SKM2.640199']]
         self.assertEqual(obs, exp)
 
     def test_parse_EBI_reply(self):
@@ -8,18 +8,22 @@
 
 from unittest import TestCase, main
 from os.path import join, dirname, abspath, exists
-from os import close, remove
+from os import close, remove, getpid
 from tempfile import mkstemp
 from json import loads, dumps
 
 import pandas as pd
 import numpy.testing as npt
-from time import time
+from time import time, sleep
+from multiprocessing import Process
+
+from mock import patch
 
 from qiita_core.util import qiita_test_checker
 from qiita_core.qiita_settings import r_client
 from qiita_db.software import Software, Parameters, Command
-from qiita_db.processing_job import ProcessingJob
+from qiita_db.processing_job import (
+    ProcessingJob, PRIVATE_TASK_QUEUE, PRIVATE_WORKER_KEY)
 from qiita_db.user import User
 from qiita_db.study import Study, StudyPerson
 from qiita_db.metadata_template.sample_template import SampleTemplate
@@ -31,7 +35,8 @@ from qiita_db.util import get_count
 from qiita_db.logger import LogEntry
 from qiita_db.sql_connection import TRN
 from qiita_db.analysis import Analysis
-from qiita_ware.private_plugin import private_task
+from qiita_ware.private_plugin import (
+    private_task, private_worker, private_worker_job_ids, PrivateWorkerPool)
 
 
 class BaseTestPrivatePlugin(TestCase):
@@ -379,6 +384,23 @@ class TestPrivatePlugin(BaseTestPrivatePlugin):
         self.assertEqual(c_job.status, 'error')
         self.assertIn('No such file or directory', c_job.log.msg)
 
+    def test_reuse_memoized_job(self):
+        previous = ProcessingJob('3c9991ab-6c14-4368-a48c-841e8837a79c')
+        r_job = ProcessingJob.create(
+            User('test@foo.bar'),
+            Parameters.load(previous.command,
+                            values_dict=previous.parameters.values), True)
+        r_job._set_status('running')
+        # The outputs of a job that doesn't exist can't be reused
+        job = self._create_job(
+            'reuse_memoized_job',
+            {'job': r_job.id,
+             'previous': '00000000-0000-0000-0000-000000000000'})
+        private_task(job.id)
+        self.assertEqual(job.status, 'success')
+        self.assertEqual(r_job.status, 'error')
+        self.assertIn('QiitaDBUnknownIDError', r_job.log.msg)
+
 
 @qiita_test_checker()
 class TestPrivatePluginDeleteStudy(BaseTestPrivatePlugin):
@@ -446,5 +468,118 @@ class TestPrivatePluginDeleteAnalysis(BaseTestPrivatePlugin):
             Analysis(1)
 
 
+@qiita_test_checker()
+class TestPrivateWorker(BaseTestPrivatePlugin):
+    def setUp(self):
+        self._clean_up_files = []
+
+    def tearDown(self):
+        r_client.delete(PRIVATE_TASK_QUEUE)
+        for fp in self._clean_up_files:
+            if exists(fp):
+                remove(fp)
+
+    def test_private_worker(self):
+        job = self._create_job('delete_artifact', {'artifact': 1})
+        r_client.lpush(PRIVATE_TASK_QUEUE, job.id)
+        r_client.lpush(PRIVATE_TASK_QUEUE, 'register')
+        self.assertEqual(private_worker_job_ids(), {job.id, 'register'})
+        with patch('qiita_ware.private_plugin.private_task') as task, \
+                patch('qiita_db.processing_job.get_submission_executor') as ex:
+            private_worker(2)
+        # The submissions of the tasks are flushed before exiting
+        ex.return_value.shutdown.assert_called_once_with()
+        # The jobs are run in arrival order
+        self.assertEqual([c[0][0] for c in task.call_args_list],
+                         [job.id, 'register'])
+        self.assertEqual(private_worker_job_ids(), set())
+        self.assertFalse(r_client.exists(PRIVATE_WORKER_KEY % getpid()))
+
+    def test_private_worker_error(self):
+        r_client.lpush(PRIVATE_TASK_QUEUE, 'not-a-job')
+        exp = get_count('qiita.logging') + 1
+        # The worker is not stopped by the error
+        with patch('qiita_db.processing_job.get_submission_executor') as ex:
+            private_worker(1)
+        self.assertEqual(get_count('qiita.logging'), exp)
+        # After the failed task and before exiting
+        self.assertEqual(ex.return_value.shutdown.call_count, 2)
+        self.assertEqual(private_worker_job_ids(), set())
+
+    def test_private_worker_pool_crash(self):
+        job = self._create_job('delete_artifact', {'artifact': 1})
+        pool = PrivateWorkerPool(1, 10)
+        # A worker that died while running the job
+        proc = Process(target=sleep, args=(0,))
+        proc.start()
+        proc.join()
+        r_client.lpush(PRIVATE_WORKER_KEY % proc.pid, job.id)
+        pool._procs = [proc]
+        with patch.object(pool, '_start_worker') as start:
+            self.assertEqual(pool.check(), 1)
+        start.assert_called_once_with()
+        self.assertEqual(pool._procs, [start.return_value])
+        self.assertEqual(job.status, 'error')
+        self.assertIn('exited unexpectedly', job.log.msg)
+        self.assertFalse(r_client.exists(PRIVATE_WORKER_KEY % proc.pid))
+
+    def test_private_worker_pool_complete_job(self):
+        # Completing the job submits its validators, which needs the pool of
+        # the submission executor to be created in the worker process
+        c_job = ProcessingJob.create(
+            User('test@foo.bar'),
+            Parameters.load(
+                Command(2),
+                values_dict={"min_seq_len": 100, "max_seq_len": 1000,
+                             "trim_seq_length": False, "min_qual_score": 25,
+                             "max_ambig": 6, "max_homopolymer": 6,
+                             "max_primer_mismatch": 0,
+                             "barcode_type": "golay_12",
+                             "max_barcode_errors": 1.5,
+                             "disable_bc_correction": False,
+                             "qual_score_window": 0, "disable_primers": False,
+                             "reverse_primers": "disable",
+                             "reverse_primer_mismatches": 0,
+                             "truncate_ambi_bases": False, "input_data": 1}),
+            True)
+        c_job._set_status('running')
+        fd, fp = mkstemp(suffix='_table.biom')
+        close(fd)
+        with open(fp, 'w') as f:
+            f.write('\n')
+        self._clean_up_files.append(fp)
+        payload = dumps(
+            {'success': True, 'error': '',
+             'artifacts': {'demultiplexed': {'filepaths': [(fp, 'biom')],
+                                             'artifact_type': 'BIOM'}}})
+        job = self._create_job('complete_job', {'job_id': c_job.id,
+                                                'payload': payload})
+        r_client.lpush(PRIVATE_TASK_QUEUE, job.id)
+
+        pool = PrivateWorkerPool(1, 1)
+        proc = pool._start_worker()
+        self.assertFalse(proc.daemon)
+        proc.join(60)
+        self.assertFalse(proc.is_alive())
+        self.assertEqual(proc.exitcode, 0)
+        self.assertEqual(job.status, 'success')
+        self.assertNotEqual(c_job.status, 'error')
+        self.assertTrue(c_job.step.startswith('Validating outputs') or
+                        c_job.status == 'success')
+
+    def test_private_worker_pool_stop(self):
+        job = self._create_job('delete_artifact', {'artifact': 1})
+        pool = PrivateWorkerPool(1, 10)
+        pool.check()
+        proc = pool._procs[0]
+        # The worker is stopped while running the job
+        r_client.lpush(PRIVATE_WORKER_KEY % proc.pid, job.id)
+        pool.stop()
+        self.assertEqual(pool._procs, [])
+        self.assertFalse(proc.is_alive())
+        self.assertEqual(job.status, 'error')
+        self.assertFalse(r_client.exists(PRIVATE_WORKER_KEY % proc.pid))
+
+
 if __name__ == '__main__':
     main()